@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, Query, Path
+from fastapi import APIRouter, Body, Depends, Query, Path
 
 from app.controllers.conversation_controller import ConversationController
 from app.schemas.conversation import (
     ConversationResponse,
-    PaginatedConversationResponse
+    ConversationSyncResponse,
+    PaginatedConversationResponse,
+    ReadMarkerCreate,
+    ReadMarkerResponse
 )
 
+from datetime import datetime
+from typing import Optional
 import uuid
 
 router = APIRouter(prefix="/api/conversations", tags=["Conversations"])
@@ -13,8 +18,9 @@ router = APIRouter(prefix="/api/conversations", tags=["Conversations"])
 @router.get("/user/{user_id}", response_model=PaginatedConversationResponse)
 async def get_user_conversations(
     user_id: int = Path(..., description="ID of the user"),
-    page: int = Query(1, description="Page number"),
-    limit: int = Query(20, description="Number of conversations per page"),
+    page: int = Query(1, ge=1, description="Page number"),
+    limit: int = Query(20, ge=1, le=100, description="Number of conversations per page"),
+    include_total: bool = Query(True, description="Compute the total number of conversations"),
     conversation_controller: ConversationController = Depends()
 ) -> PaginatedConversationResponse:
     """
@@ -23,12 +29,47 @@ async def get_user_conversations(
     return await conversation_controller.get_user_conversations(
         user_id=user_id,
         page=page,
-        limit=limit
+        limit=limit,
+        include_total=include_total
+    )
+
+@router.get("/user/{user_id}/sync", response_model=ConversationSyncResponse)
+async def sync_user_conversations(
+    user_id: int = Path(..., description="ID of the user"),
+    since: datetime = Query(..., description="Return activity after this timestamp"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of conversations"),
+    messages_limit: int = Query(20, ge=1, le=1000, description="Maximum number of new messages per conversation"),
+    cursor: Optional[str] = Query(None, description="Cursor returned with the previous page of this sync"),
+    conversation_controller: ConversationController = Depends()
+) -> ConversationSyncResponse:
+    """
+    Get the conversations of a user that changed since a timestamp, with
+    their new messages
+    """
+    return await conversation_controller.sync_user_conversations(
+        user_id=user_id,
+        since=since,
+        limit=limit,
+        messages_limit=messages_limit,
+        cursor=cursor
+    )
+
+@router.post("/{conversation_id}/read", response_model=ReadMarkerResponse)
+async def mark_conversation_read(
+    conversation_id: uuid.UUID = Path(..., description="ID of the conversation"),
+    marker: ReadMarkerCreate = Body(...),
+    conversation_controller: ConversationController = Depends()
+) -> ReadMarkerResponse:
+    """
+    Mark a conversation read by a participant up to a message
+    """
+    return await conversation_controller.mark_conversation_read(
+        conversation_id=conversation_id,
+        marker=marker
     )
 
 @router.get("/{conversation_id}", response_model=ConversationResponse)
 async def get_conversation(
-    # conversation_id: int = Path(..., description="ID of the conversation"),
     conversation_id: uuid.UUID = Path(..., description="ID of the conversation"),
     conversation_controller: ConversationController = Depends()
 ) -> ConversationResponse:
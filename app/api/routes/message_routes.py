@@ -1,24 +1,23 @@
-from fastapi import APIRouter, Depends, Query, Path, Body
-from typing import Optional
+from fastapi import APIRouter, Depends, Query, Path, Body, WebSocket
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from datetime import datetime
 
 from app.controllers.message_controller import MessageController
+from app.services.pubsub import conversation_channel, user_channel
+from app.services.search import MAX_QUERY_TERMS
 from app.schemas.message import (
+    MessageBatchCreate,
+    MessageBatchResponse,
     MessageCreate, 
+    LatestMessagesResponse,
+    MessageDeltaResponse,
     MessageResponse, 
+    MessageSearchResponse,
     PaginatedMessageResponse
 )
 
-
 import uuid
-import logging
-# Configure logger
-logger = logging.getLogger("message_routes")
-logger.setLevel(logging.INFO)
-handler = logging.StreamHandler()
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-handler.setFormatter(formatter)
-logger.addHandler(handler)
 
 
 router = APIRouter(prefix="/api/messages", tags=["Messages"])
@@ -27,37 +26,114 @@ router = APIRouter(prefix="/api/messages", tags=["Messages"])
 async def send_message(
     message: MessageCreate = Body(...),
     message_controller: MessageController = Depends()
-): # -> MessageResponse:
-    # return {"sux": 12}
+) -> MessageResponse:
     """
     Send a message from one user to another
     """
     return await message_controller.send_message(message)
 
+@router.post("/batch", response_model=MessageBatchResponse)
+async def send_messages(
+    batch: MessageBatchCreate = Body(...),
+    message_controller: MessageController = Depends()
+) -> MessageBatchResponse:
+    """
+    Send many messages in one request, with a result per message
+    """
+    return await message_controller.send_messages(batch)
+
+@router.get("/search", response_model=MessageSearchResponse)
+async def search_messages(
+    user_id: int = Query(..., description="ID of the user whose messages are searched"),
+    q: str = Query(..., min_length=1, max_length=256, description=f"Search terms, at most {MAX_QUERY_TERMS} of them"),
+    page: int = Query(1, ge=1, description="Page number"),
+    limit: int = Query(20, ge=1, le=100, description="Number of results per page"),
+    message_controller: MessageController = Depends()
+) -> MessageSearchResponse:
+    """
+    Search the messages a user sent or received, best match first
+    """
+    return await message_controller.search_messages(
+        user_id=user_id,
+        query=q,
+        page=page,
+        limit=limit
+    )
+
+@router.get("/latest", response_model=LatestMessagesResponse)
+async def get_latest_messages(
+    conversation_id: List[uuid.UUID] = Query(..., max_length=100, description="IDs of the conversations, repeated, at most 100"),
+    limit: int = Query(1, ge=1, le=50, description="Number of messages per conversation"),
+    message_controller: MessageController = Depends()
+) -> LatestMessagesResponse:
+    """
+    Get the latest messages of several conversations in one request
+    """
+    return await message_controller.get_latest_messages(
+        conversation_ids=conversation_id,
+        limit=limit
+    )
+
 @router.get("/conversation/{conversation_id}", response_model=PaginatedMessageResponse)
 async def get_conversation_messages(
     conversation_id: uuid.UUID = Path(..., description="ID of the conversation"),
-    page: int = Query(1, description="Page number"),
-    limit: int = Query(20, description="Number of messages per page"),
+    page: int = Query(1, ge=1, description="Page number"),
+    limit: int = Query(20, ge=1, le=100, description="Number of messages per page"),
+    cursor: Optional[str] = Query(None, description="Cursor returned with the previous page, overrides page"),
+    include_total: bool = Query(True, description="Compute the total number of messages"),
     message_controller: MessageController = Depends()
 ) -> PaginatedMessageResponse:
     """
     Get all messages in a conversation with pagination
     """
-    logger.info("MESSAGEROUTE - CONVERSATION")
     return await message_controller.get_conversation_messages(
         conversation_id=conversation_id,
         page=page,
-        limit=limit
+        limit=limit,
+        cursor=cursor,
+        include_total=include_total
+    )
+
+@router.get("/conversation/{conversation_id}/after", response_model=MessageDeltaResponse)
+async def get_messages_after_timestamp(
+    conversation_id: uuid.UUID = Path(..., description="ID of the conversation"),
+    after_timestamp: datetime = Query(..., description="Get messages after this timestamp"),
+    limit: int = Query(50, ge=1, le=1000, description="Number of messages per page"),
+    cursor: Optional[str] = Query(None, description="Cursor returned with the previous page"),
+    message_controller: MessageController = Depends()
+) -> MessageDeltaResponse:
+    """
+    Get messages in a conversation newer than a timestamp, oldest first
+    """
+    return await message_controller.get_messages_after_timestamp(
+        conversation_id=conversation_id,
+        after_timestamp=after_timestamp,
+        limit=limit,
+        cursor=cursor
+    )
+
+@router.get("/conversation/{conversation_id}/export", response_class=StreamingResponse)
+async def export_conversation_messages(
+    conversation_id: uuid.UUID = Path(..., description="ID of the conversation"),
+    fetch_size: int = Query(500, ge=1, le=5000, description="Messages read from storage per round trip"),
+    message_controller: MessageController = Depends()
+) -> StreamingResponse:
+    """
+    Stream the whole history of a conversation as NDJSON, newest first
+    """
+    return await message_controller.export_conversation_messages(
+        conversation_id=conversation_id,
+        fetch_size=fetch_size
     )
 
 @router.get("/conversation/{conversation_id}/before", response_model=PaginatedMessageResponse)
 async def get_messages_before_timestamp(
-    # conversation_id: int = Path(..., description="ID of the conversation"),
     conversation_id: uuid.UUID = Path(..., description="ID of the conversation"),
     before_timestamp: datetime = Query(..., description="Get messages before this timestamp"),
-    page: int = Query(1, description="Page number"),
-    limit: int = Query(20, description="Number of messages per page"),
+    page: int = Query(1, ge=1, description="Page number"),
+    limit: int = Query(20, ge=1, le=100, description="Number of messages per page"),
+    cursor: Optional[str] = Query(None, description="Cursor returned with the previous page, overrides page"),
+    include_total: bool = Query(True, description="Compute the total number of messages"),
     message_controller: MessageController = Depends()
 ) -> PaginatedMessageResponse:
     """
@@ -67,5 +143,29 @@ async def get_messages_before_timestamp(
         conversation_id=conversation_id,
         before_timestamp=before_timestamp,
         page=page,
-        limit=limit
-    ) 
\ No newline at end of file
+        limit=limit,
+        cursor=cursor,
+        include_total=include_total
+    ) 
+
+@router.websocket("/ws/user/{user_id}")
+async def stream_user_messages(
+    websocket: WebSocket,
+    user_id: int = Path(..., description="ID of the user"),
+    message_controller: MessageController = Depends()
+):
+    """
+    Receive every new message sent or received by a user as JSON frames
+    """
+    await message_controller.stream_messages(websocket, user_channel(user_id))
+
+@router.websocket("/ws/conversation/{conversation_id}")
+async def stream_conversation_messages(
+    websocket: WebSocket,
+    conversation_id: uuid.UUID = Path(..., description="ID of the conversation"),
+    message_controller: MessageController = Depends()
+):
+    """
+    Receive every new message in a conversation as JSON frames
+    """
+    await message_controller.stream_messages(websocket, conversation_channel(conversation_id))
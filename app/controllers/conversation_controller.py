@@ -1,23 +1,30 @@
+from datetime import datetime
+from typing import Optional
 from fastapi import HTTPException, status
 
-from app.schemas.conversation import ConversationResponse, PaginatedConversationResponse
+from app.schemas.conversation import (
+    ConversationResponse,
+    ConversationSyncResponse,
+    PaginatedConversationResponse,
+    ReadMarkerCreate,
+    ReadMarkerResponse,
+)
 
 from app.models.cassandra_models import ConversationModel
 
 import uuid
-# from logging import logger
 
 class ConversationController:
     """
     Controller for handling conversation operations
-    This is a stub that students will implement
     """
     
     async def get_user_conversations(
         self, 
         user_id: int, 
         page: int = 1, 
-        limit: int = 20
+        limit: int = 20,
+        include_total: bool = True
     ) -> PaginatedConversationResponse:
         """
         Get all conversations for a user with pagination
@@ -26,6 +33,7 @@ class ConversationController:
             user_id: ID of the user
             page: Page number
             limit: Number of conversations per page
+            include_total: Whether to compute the total number of conversations
             
         Returns:
             Paginated list of conversations
@@ -35,21 +43,98 @@ class ConversationController:
         """
         
         try:
-            conversations = await ConversationModel.get_user_conversations(user_id, page, limit)
+            conversations = await ConversationModel.get_user_conversations(user_id, page, limit, include_total)
             return PaginatedConversationResponse(**conversations)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=str(e)
             )
-
+    
+    async def sync_user_conversations(
+        self,
+        user_id: int,
+        since: datetime,
+        limit: int = 50,
+        messages_limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> ConversationSyncResponse:
+        """
+        Get the conversations of a user that changed since a timestamp,
+        with their new messages
         
+        Args:
+            user_id: ID of the user
+            since: Return activity after this timestamp
+            limit: Maximum number of conversations
+            messages_limit: Maximum number of new messages per conversation
+            cursor: Cursor returned with the previous page of this sync
+            
+        Returns:
+            Changed conversations, with the cursor of the next page and the
+            since value for the next sync
+        """
         
-        # This is a stub - students will implement the actual logic
-        raise HTTPException(
-            status_code=status.HTTP_501_NOT_IMPLEMENTED,
-            detail="Method not implemented"
-        )
+        try:
+            delta = await ConversationModel.sync_user_conversations(user_id, since, limit, messages_limit, cursor)
+            return ConversationSyncResponse(**delta)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=str(e)
+            )
+    
+    async def mark_conversation_read(
+        self,
+        conversation_id: uuid.UUID,
+        marker: ReadMarkerCreate
+    ) -> ReadMarkerResponse:
+        """
+        Mark a conversation read by one of its participants up to a message
+        
+        Args:
+            conversation_id: ID of the conversation
+            marker: The reader and the last message they read
+            
+        Returns:
+            The read marker after the update and the remaining unread count
+            
+        Raises:
+            HTTPException: If conversation not found, the user is not a participant
+                or the message is not in the conversation
+        """
+        
+        try:
+            result = await ConversationModel.mark_conversation_read(
+                conversation_id, marker.user_id, marker.message_id, marker.created_at
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=str(e)
+            )
+        
+        if result is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Conversation not found"
+            )
+        return ReadMarkerResponse(**result)
     
     async def get_conversation(self, conversation_id: uuid.UUID) -> ConversationResponse:
         """
@@ -73,9 +158,3 @@ class ConversationController:
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=str(e)
             )
-            
-        # This is a stub - students will implement the actual logic
-        raise HTTPException(
-            status_code=status.HTTP_501_NOT_IMPLEMENTED,
-            detail="Method not implemented"
-        ) 
\ No newline at end of file
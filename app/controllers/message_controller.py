@@ -1,26 +1,45 @@
-from typing import Optional
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
-from fastapi import HTTPException, status
+from fastapi import HTTPException, WebSocket, status
+from fastapi.responses import Response, StreamingResponse
 
-from app.schemas.message import MessageCreate, MessageResponse, PaginatedMessageResponse
+from app.schemas.message import (
+    MessageBatchCreate,
+    MessageBatchItemResult,
+    MessageBatchResponse,
+    MessageCreate,
+    LatestMessagesResponse,
+    MessageDeltaResponse,
+    MessageResponse,
+    MessageSearchResponse,
+    paginated_message_adapter,
+)
 
 import uuid
 
 from app.models.cassandra_models import ConversationModel, MessageModel
+from app.services.message_ingestion import QueueFullError, message_ingestion_queue
+from app.services.pubsub import conversation_channel, pubsub_hub, user_channel
 import logging
 
-# Configure logger
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-handler = logging.StreamHandler()
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+
+
+def message_page_response(page: Dict[str, Any]) -> Response:
+    """
+    Serialize a page from paginate_messages straight to a JSON response.
+
+    The page is validated against PaginatedMessageResponse and encoded in a
+    single pydantic-core pass; FastAPI sends a returned Response as is, so
+    the rows are not validated again for the route's response_model.
+    """
+    body = paginated_message_adapter.dump_json(paginated_message_adapter.validate_python(page))
+    return Response(content=body, media_type="application/json")
 
 class MessageController:
     """
     Controller for handling message operations
-    This is a stub that students will implement
     """
     
     async def send_message(self, message_data: MessageCreate) -> MessageResponse:
@@ -39,47 +58,220 @@ class MessageController:
         
         try:
             # Retrieve or create a conversation between sender and receiver.
-            
-            logger.info("S1 - Entered send_message method")
             conversation = await ConversationModel.create_or_get_conversation(
                 message_data.sender_id, message_data.receiver_id
             )
             
-            logger.info("S2 - Entered send_message method")
-
-            
             conversation_id = conversation.get("conversation_id")
-            logger.info(f"Conversation id - {conversation_id}")
             
-            res = await MessageModel.create_message(
-                conversation_id, message_data.sender_id, message_data.receiver_id, message_data.content
-            )
-            
-            logger.info("S3 - Entered send_message method")
+            if message_ingestion_queue.enabled:
+                # Write-behind: acknowledge once queued; the flusher writes
+                # it and only then pushes it to subscribers.
+                res = MessageModel.build_message(
+                    conversation_id, message_data.sender_id, message_data.receiver_id, message_data.content
+                )
+                message = MessageResponse(**res)
+                message_ingestion_queue.enqueue(res, on_written=lambda: self.publish_message(message))
+            else:
+                res = await MessageModel.create_message(
+                    conversation_id, message_data.sender_id, message_data.receiver_id, message_data.content
+                )
+                message = MessageResponse(**res)
+                await self.publish_message(message)
             
-            logger.info(f"Message created: {res} - MESSAGECONTROLLER")
-            return MessageResponse(**res)
+            logger.debug("Message %s sent in conversation %s", res["id"], conversation_id)
+            return message
 
+        except QueueFullError as e:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=str(e)
+            )
         except Exception as e:
-            logger.error(f"CHECK CHECK - - - - Error in send_message: {str(e)}")
+            logger.error(f"Error in send_message: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                # detail=str(e)
                 detail="Error creating conversation"
             )
+    
+    async def send_messages(self, batch: MessageBatchCreate) -> MessageBatchResponse:
+        """
+        Send many messages in one request
+        
+        Each distinct user pair is resolved once and messages are written
+        with one write per conversation partition, concurrently. Items fail
+        independently.
+        
+        Args:
+            batch: The messages to send
+            
+        Returns:
+            One result per item, in request order
+        """
+        
+        items = [(m.sender_id, m.receiver_id, m.content) for m in batch.messages]
+        built = await MessageModel.build_messages(items)
+        
+        results: List[MessageBatchItemResult] = []
+        sent: List[Tuple[MessageBatchItemResult, Dict[str, Any]]] = []
+        for index, message in enumerate(built):
+            result = MessageBatchItemResult(index=index, status_code=status.HTTP_201_CREATED)
+            results.append(result)
+            if isinstance(message, Exception):
+                logger.error(f"Error resolving conversation for batch item {index}: {str(message)}")
+                result.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+                result.error = "Error creating conversation"
+                continue
+            if message_ingestion_queue.enabled:
+                queued = MessageResponse(**message)
+                try:
+                    message_ingestion_queue.enqueue(
+                        message, on_written=lambda queued=queued: self.publish_message(queued)
+                    )
+                except QueueFullError as e:
+                    result.status_code = status.HTTP_429_TOO_MANY_REQUESTS
+                    result.error = str(e)
+                    continue
+                result.message = queued
+                continue
+            sent.append((result, message))
+        
+        errors = await MessageModel.write_message_batch([message for _, message in sent])
+        
+        published = []
+        for (result, message), error in zip(sent, errors):
+            if error is not None:
+                logger.error(f"Error writing batch item {result.index}: {str(error)}")
+                result.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+                result.error = "Error writing message"
+                continue
+            result.message = MessageResponse(**message)
+            published.append(self.publish_message(result.message))
+        await asyncio.gather(*published)
+        
+        return MessageBatchResponse(results=results)
+    
+    async def publish_message(self, message: MessageResponse) -> None:
+        """
+        Push a stored message to the real-time subscribers of its
+        conversation and of both participants. Delivery is best effort and
+        never fails the send.
+        """
+        
+        payload = message.model_dump(mode="json")
+        channels = {
+            conversation_channel(message.conversation_id),
+            user_channel(message.sender_id),
+            user_channel(message.receiver_id),
+        }
+        try:
+            await asyncio.gather(*(pubsub_hub.publish(channel, payload) for channel in channels))
+        except Exception as e:
+            logger.warning(f"Failed to publish message {message.id}: {str(e)}")
+    
+    async def stream_messages(self, websocket: WebSocket, channel: str) -> None:
+        """
+        Forward messages published on channel to a WebSocket until either
+        side closes it
+        
+        Args:
+            websocket: The client connection, not yet accepted
+            channel: Pub/sub channel to subscribe to
+        """
+        
+        await websocket.accept()
+        subscription = await pubsub_hub.subscribe(channel)
+        
+        async def forward():
+            while True:
+                message = await subscription.get()
+                if message is None:
+                    # Closed by the hub; a subscriber that fell behind should
+                    # resync before subscribing again.
+                    await websocket.close(code=1013 if subscription.overflowed else 1001)
+                    return
+                await websocket.send_json(message)
+        
+        async def wait_for_disconnect():
+            # Client frames carry nothing; reading them surfaces the close.
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        
+        tasks = [asyncio.create_task(forward()), asyncio.create_task(wait_for_disconnect())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await pubsub_hub.unsubscribe(subscription)
+    
+    async def search_messages(
+        self,
+        user_id: int,
+        query: str,
+        page: int = 1,
+        limit: int = 20
+    ) -> MessageSearchResponse:
+        """
+        Search the messages a user sent or received
+        
+        Args:
+            user_id: ID of the user
+            query: Search terms
+            page: Page number
+            limit: Number of results per page
+            
+        Returns:
+            Ranked page of matching messages
+        """
+        
+        try:
+            results = await MessageModel.search_messages(user_id, query, page, limit)
+            return MessageSearchResponse(**results)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=str(e)
+            )
+    
+    async def get_latest_messages(
+        self,
+        conversation_ids: List[uuid.UUID],
+        limit: int = 1
+    ) -> LatestMessagesResponse:
+        """
+        Get the latest messages of several conversations at once
+        
+        Args:
+            conversation_ids: IDs of the conversations
+            limit: Number of messages per conversation
             
-        # This is a stub - students will implement the actual logic
-        # raise HTTPException(
-        #     status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        #     detail="Method not implemented"
-        # )
+        Returns:
+            Latest messages per conversation, in request order
+        """
+        
+        try:
+            latest = await MessageModel.get_latest_messages(conversation_ids, limit)
+            return LatestMessagesResponse(**latest)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=str(e)
+            )
     
     async def get_conversation_messages(
         self, 
         conversation_id: uuid.UUID, 
         page: int = 1, 
-        limit: int = 20
-    ) -> PaginatedMessageResponse:
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        include_total: bool = True
+    ) -> Response:
         """
         Get all messages in a conversation with pagination
         
@@ -87,6 +279,8 @@ class MessageController:
             conversation_id: ID of the conversation
             page: Page number
             limit: Number of messages per page
+            cursor: Cursor returned with the previous page, overrides page
+            include_total: Whether to compute the total number of messages
             
         Returns:
             Paginated list of messages
@@ -96,27 +290,104 @@ class MessageController:
         """
         
         try:
-            logger.info("Enters get conversation message - message controller")
-            paginated_content = await MessageModel.get_conversation_messages(conversation_id, page, limit)
-            return PaginatedMessageResponse(**paginated_content)
+            paginated_content = await MessageModel.get_conversation_messages(conversation_id, page, limit, cursor, include_total)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=str(e)
             )
-        # This is a stub - students will implement the actual logic
-        raise HTTPException(
-            status_code=status.HTTP_501_NOT_IMPLEMENTED,
-            detail="Method not implemented"
-        )
+
+        return message_page_response(paginated_content)
+    
+    async def get_messages_after_timestamp(
+        self,
+        conversation_id: uuid.UUID,
+        after_timestamp: datetime,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> MessageDeltaResponse:
+        """
+        Get messages in a conversation newer than a timestamp, oldest first
+        
+        Args:
+            conversation_id: ID of the conversation
+            after_timestamp: Get messages after this timestamp
+            limit: Number of messages per page
+            cursor: Cursor returned with the previous page
+            
+        Returns:
+            Page of new messages
+            
+        Raises:
+            HTTPException: If the cursor is invalid
+        """
+        
+        try:
+            messages = await MessageModel.get_messages_after_timestamp(conversation_id, after_timestamp, limit, cursor)
+            return MessageDeltaResponse(**messages)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=str(e)
+            )
+    
+    async def export_conversation_messages(
+        self,
+        conversation_id: uuid.UUID,
+        fetch_size: int = 500
+    ) -> StreamingResponse:
+        """
+        Stream every message in a conversation as NDJSON, newest first
+        
+        Args:
+            conversation_id: ID of the conversation
+            fetch_size: Number of messages read from storage per round trip
+            
+        Returns:
+            Streaming response with one JSON message per line
+            
+        Raises:
+            HTTPException: If conversation not found
+        """
+        
+        conversation = await ConversationModel.get_conversation(conversation_id)
+        if conversation is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Conversation not found"
+            )
+        
+        async def ndjson():
+            # The status line is already sent once streaming starts, so a
+            # failure can only end the stream early.
+            try:
+                async for rows in MessageModel.iter_conversation_messages(conversation_id, fetch_size):
+                    yield "".join(MessageResponse(**row).model_dump_json() + "\n" for row in rows)
+            except Exception as e:
+                logger.error(f"Export of conversation {conversation_id} failed: {str(e)}")
+                raise
+        
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
     
     async def get_messages_before_timestamp(
         self, 
         conversation_id: uuid.UUID, 
         before_timestamp: datetime,
         page: int = 1, 
-        limit: int = 20
-    ) -> PaginatedMessageResponse:
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        include_total: bool = True
+    ) -> Response:
         """
         Get messages in a conversation before a specific timestamp with pagination
         
@@ -125,6 +396,8 @@ class MessageController:
             before_timestamp: Get messages before this timestamp
             page: Page number
             limit: Number of messages per page
+            cursor: Cursor returned with the previous page, overrides page
+            include_total: Whether to compute the total number of messages
             
         Returns:
             Paginated list of messages
@@ -134,17 +407,16 @@ class MessageController:
         """
         
         try:
-            messages_paginated = await MessageModel.get_messages_before_timestamp(conversation_id, before_timestamp, page, limit)
-            return PaginatedMessageResponse(**messages_paginated)
+            messages_paginated = await MessageModel.get_messages_before_timestamp(conversation_id, before_timestamp, page, limit, cursor, include_total)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=str(e)
             )
-        
-        
-        # This is a stub - students will implement the actual logic
-        raise HTTPException(
-            status_code=status.HTTP_501_NOT_IMPLEMENTED,
-            detail="Method not implemented"
-        ) 
\ No newline at end of file
+
+        return message_page_response(messages_paginated)
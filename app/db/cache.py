@@ -0,0 +1,91 @@
+"""
+In-process caches for the Messenger application.
+This provides bounded, TTL-aware LRU caches for hot Cassandra lookups.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class LRUCache:
+    """Bounded LRU cache whose entries expire after a fixed TTL."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # Values with their expiry time, least recently used first.
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a cached value, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Cache a value, evicting the least recently used entry when full."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop a cached value."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every cached value."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache size and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Conversation rows by conversation_id, kept current by MessageModel writes.
+conversation_cache = LRUCache(
+    max_size=int(os.getenv("CONVERSATION_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("CONVERSATION_CACHE_TTL_SECONDS", "60")),
+)
+
+# (user_low, user_high) -> conversation_id; the mapping never changes.
+conversation_pair_cache = LRUCache(
+    max_size=int(os.getenv("CONVERSATION_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("CONVERSATION_PAIR_CACHE_TTL_SECONDS", "3600")),
+)
+
+# conversation_id -> latest message timestamp issued by this process, so the
+# next message of a conversation is stamped after it even before it is stored.
+message_clock_cache = LRUCache(
+    max_size=int(os.getenv("CONVERSATION_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("CONVERSATION_CACHE_TTL_SECONDS", "60")),
+)
@@ -1,132 +1,49 @@
-# """
-# Cassandra client for the Messenger application.
-# This provides a connection to the Cassandra database.
-# """
-# import os
-# import uuid
-# from typing import List, Dict, Any, Optional
-# from datetime import datetime
-# import logging
-
-# from cassandra.cluster import Cluster, Session
-# from cassandra.auth import PlainTextAuthProvider
-# from cassandra.query import SimpleStatement, dict_factory
-
-# logger = logging.getLogger(__name__)
-# # 
-# class CassandraClient:
-#     """Singleton Cassandra client for the application."""
-    
-#     _instance = None
-    
-#     def __new__(cls):
-#         if cls._instance is None:
-#             cls._instance = super(CassandraClient, cls).__new__(cls)
-#             cls._instance._initialized = False
-#         return cls._instance
-    
-#     def __init__(self):
-#         """Initialize the Cassandra connection."""
-#         if self._initialized:
-#             return
-        
-#         self.host = os.getenv("CASSANDRA_HOST", "localhost")
-#         self.port = int(os.getenv("CASSANDRA_PORT", "9042"))
-#         self.keyspace = os.getenv("CASSANDRA_KEYSPACE", "messenger")
-        
-#         self.cluster = None
-#         self.session = None
-#         self.connect()
-        
-#         self._initialized = True
-    
-#     def connect(self) -> None:
-#         """Connect to the Cassandra cluster."""
-#         try:
-#             self.cluster = Cluster([self.host])
-#             self.session = self.cluster.connect(self.keyspace)
-#             self.session.row_factory = dict_factory
-#             logger.info(f"Connected to Cassandra at {self.host}:{self.port}, keyspace: {self.keyspace}")
-#         except Exception as e:
-#             logger.error(f"Failed to connect to Cassandra: {str(e)}")
-#             raise
-    
-#     def close(self) -> None:
-#         """Close the Cassandra connection."""
-#         if self.cluster:
-#             self.cluster.shutdown()
-#             logger.info("Cassandra connection closed")
-    
-#     def execute(self, query: str, params: dict = None) -> List[Dict[str, Any]]:
-#         """
-#         Execute a CQL query.
-        
-#         Args:
-#             query: The CQL query string
-#             params: The parameters for the query
-            
-#         Returns:
-#             List of rows as dictionaries
-#         """
-#         if not self.session:
-#             self.connect()
-        
-#         try:
-#             statement = SimpleStatement(query)
-#             result = self.session.execute(statement, params or {})
-#             return list(result)
-#         except Exception as e:
-#             logger.error(f"Query execution failed: {str(e)}")
-#             raise
-    
-#     def execute_async(self, query: str, params: dict = None):
-#         """
-#         Execute a CQL query asynchronously.
-        
-#         Args:
-#             query: The CQL query string
-#             params: The parameters for the query
-            
-#         Returns:
-#             Async result object
-#         """
-#         if not self.session:
-#             self.connect()
-        
-#         try:
-#             statement = SimpleStatement(query)
-#             return self.session.execute_async(statement, params or {})
-#         except Exception as e:
-#             logger.error(f"Async query execution failed: {str(e)}")
-#             raise
-    
-#     def get_session(self) -> Session:
-#         """Get the Cassandra session."""
-#         if not self.session:
-#             self.connect()
-#         return self.session
-
-# # Create a global instance
-# cassandra_client = CassandraClient() 
-
 
 """
 Cassandra client for the Messenger application.
 This provides a connection to the Cassandra database.
 """
+import asyncio
 import os
 import uuid
 import time  # Added import
-from typing import List, Dict, Any, Optional, Sequence, Union
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Union
 from datetime import datetime
 import logging
 
-from cassandra.cluster import Cluster, Session
+from cassandra.cluster import EXEC_PROFILE_DEFAULT, Cluster, ExecutionProfile, Session
 from cassandra.auth import PlainTextAuthProvider
-from cassandra.query import SimpleStatement, dict_factory
+from cassandra.policies import (
+    ConstantSpeculativeExecutionPolicy,
+    DCAwareRoundRobinPolicy,
+    TokenAwarePolicy,
+)
+from cassandra.query import BatchStatement, BatchType, PreparedStatement, dict_factory, tuple_factory
+
+from app.metrics import record_query
 
 logger = logging.getLogger(__name__)
 
+# Row shapes a query can ask for, each served by its own execution profile.
+# Rows are dicts by default; reads of many rows ask for tuples and unpack
+# them positionally, which saves building a dict per row.
+ROW_FACTORIES = {"dict": dict_factory, "tuple": tuple_factory}
+
+
+def _resolve(future: asyncio.Future, result: Any) -> None:
+    """Complete an asyncio future unless its awaiter has gone away."""
+    if not future.done():
+        future.set_result(result)
+
+
+def _reject(future: asyncio.Future, exc: BaseException) -> None:
+    """Fail an asyncio future unless its awaiter has gone away."""
+    if not future.done():
+        future.set_exception(exc)
+
+
 class CassandraClient:
     """Singleton Cassandra client for the application."""
     
@@ -146,23 +63,50 @@ class CassandraClient:
         self.host = os.getenv("CASSANDRA_HOST", "localhost")
         self.port = int(os.getenv("CASSANDRA_PORT", "9042"))
         self.keyspace = os.getenv("CASSANDRA_KEYSPACE", "messenger")
+        self.prepared_cache_size = int(os.getenv("CASSANDRA_PREPARED_CACHE_SIZE", "512"))
+        
+        # Cluster profile: contact points, routing, timeouts and driver threads.
+        self.hosts = [h.strip() for h in os.getenv("CASSANDRA_HOSTS", self.host).split(",") if h.strip()]
+        self.local_dc = os.getenv("CASSANDRA_LOCAL_DC") or None
+        self.remote_hosts_per_dc = int(os.getenv("CASSANDRA_REMOTE_HOSTS_PER_DC", "0"))
+        self.username = os.getenv("CASSANDRA_USERNAME")
+        self.password = os.getenv("CASSANDRA_PASSWORD")
+        self.protocol_version = int(os.getenv("CASSANDRA_PROTOCOL_VERSION", "0")) or None
+        self.connect_timeout = float(os.getenv("CASSANDRA_CONNECT_TIMEOUT", "5"))
+        self.request_timeout = float(os.getenv("CASSANDRA_REQUEST_TIMEOUT", "10"))
+        self.speculative_delay = float(os.getenv("CASSANDRA_SPECULATIVE_DELAY_MS", "0")) / 1000
+        self.speculative_executions = int(os.getenv("CASSANDRA_SPECULATIVE_EXECUTIONS", "2"))
+        self.executor_threads = int(os.getenv("CASSANDRA_EXECUTOR_THREADS", "2"))
         
         self.cluster = None
         self.session = None
-        self.connect()
         
+        # Prepared statements keyed by CQL text, least recently used first.
+        self._prepared: "OrderedDict[str, PreparedStatement]" = OrderedDict()
+        self._prepared_lock = threading.Lock()
+        self.prepared_cache_hits = 0
+        self.prepared_cache_misses = 0
+        
+        # Connect lazily, on startup or first use, so importing this module
+        # does not require a reachable cluster.
         self._initialized = True
     
     def connect(self) -> None:
         """Connect to the Cassandra cluster with retries."""
+        options = self.cluster_options()
         max_retries = 5
         retry_delay = 5  # seconds
         for attempt in range(max_retries):
             try:
-                self.cluster = Cluster([self.host], port=self.port)
+                self.cluster = Cluster(execution_profiles=self.execution_profiles(), **options)
                 self.session = self.cluster.connect(self.keyspace)
-                self.session.row_factory = dict_factory
-                logger.info(f"Connected to Cassandra at {self.host}:{self.port}, keyspace: {self.keyspace}")
+                # Statements prepared on a previous session are not valid here.
+                with self._prepared_lock:
+                    self._prepared.clear()
+                logger.info(
+                    f"Connected to Cassandra at {','.join(self.hosts)}:{self.port}, keyspace: {self.keyspace}, "
+                    f"local DC: {self.local_dc or 'from contact points'}"
+                )
                 return
             except Exception as e:
                 logger.warning(f"Failed to connect to Cassandra (attempt {attempt + 1}/{max_retries}): {str(e)}")
@@ -172,41 +116,224 @@ class CassandraClient:
         logger.error("Failed to connect to Cassandra after multiple attempts.")
         raise RuntimeError("Could not connect to Cassandra")
     
+    def cluster_options(self) -> Dict[str, Any]:
+        """
+        Build the Cluster arguments from the environment.
+        
+        There are no per-host pool sizes: from protocol v3 the driver
+        multiplexes up to 32768 requests over one connection per host and
+        rejects pool settings. The executor threads run the driver's
+        background work, such as opening connections and refreshing
+        metadata after topology changes.
+        """
+        options: Dict[str, Any] = {
+            "contact_points": self.hosts,
+            "port": self.port,
+            "connect_timeout": self.connect_timeout,
+            "executor_threads": self.executor_threads,
+        }
+        if self.protocol_version is not None:
+            options["protocol_version"] = self.protocol_version
+        if self.username:
+            options["auth_provider"] = PlainTextAuthProvider(username=self.username, password=self.password)
+        return options
+    
+    def execution_profiles(self) -> Dict[Any, ExecutionProfile]:
+        """
+        Build one execution profile per row factory; dict rows are the default.
+        
+        Every profile routes token-aware over DC-aware round robin, so a
+        statement with a routing key goes straight to a local replica, and
+        with CASSANDRA_SPECULATIVE_DELAY_MS set, idempotent statements are
+        retried on the next replica when the first is slow to answer.
+        """
+        speculative_execution_policy = None
+        if self.speculative_delay > 0:
+            speculative_execution_policy = ConstantSpeculativeExecutionPolicy(
+                self.speculative_delay, self.speculative_executions
+            )
+        # Policies keep per-cluster host state, so each profile gets its own.
+        return {
+            self.profile(name): ExecutionProfile(
+                load_balancing_policy=TokenAwarePolicy(
+                    DCAwareRoundRobinPolicy(
+                        local_dc=self.local_dc, used_hosts_per_remote_dc=self.remote_hosts_per_dc
+                    ),
+                    shuffle_replicas=True,
+                ),
+                request_timeout=self.request_timeout,
+                speculative_execution_policy=speculative_execution_policy,
+                row_factory=factory,
+            )
+            for name, factory in ROW_FACTORIES.items()
+        }
+    
+    @staticmethod
+    def profile(row_factory: str) -> Any:
+        """Get the execution profile key serving a row factory name."""
+        if row_factory not in ROW_FACTORIES:
+            raise ValueError(f"Unknown row factory: {row_factory}")
+        return EXEC_PROFILE_DEFAULT if row_factory == "dict" else row_factory
+    
     def close(self) -> None:
         """Close the Cassandra connection."""
         if self.cluster:
             self.cluster.shutdown()
             logger.info("Cassandra connection closed")
     
-    def execute(self, query: str, params = None) -> List[Dict[str, Any]]:
+    def prepare(self, query: str) -> PreparedStatement:
+        """
+        Return the prepared statement for a CQL string, preparing it once.
+        
+        Statements are kept in a bounded LRU cache keyed by the query text,
+        so each distinct query is parsed by Cassandra only once per session.
+        A miss waits for a round trip to Cassandra; coroutines use aprepare.
+        
+        Args:
+            query: The CQL query string, using ? placeholders
+            
+        Returns:
+            The cached or newly prepared statement
+        """
+        if not self.session:
+            self.connect()
+        
+        prepared = self._cached_statement(query)
+        if prepared is None:
+            prepared = self._cache_statement(query, self.session.prepare(query))
+        return prepared
+    
+    async def aprepare(self, query: str) -> PreparedStatement:
+        """
+        Return the prepared statement for a CQL string without blocking the
+        event loop: a cache miss is prepared on the default executor.
+        
+        Args:
+            query: The CQL query string, using ? placeholders
+            
+        Returns:
+            The cached or newly prepared statement
+        """
+        if not self.session:
+            self.connect()
+        
+        prepared = self._cached_statement(query)
+        if prepared is None:
+            loop = asyncio.get_running_loop()
+            prepared = self._cache_statement(
+                query, await loop.run_in_executor(None, self.session.prepare, query)
+            )
+        return prepared
+    
+    def _cached_statement(self, query: str) -> Optional[PreparedStatement]:
+        with self._prepared_lock:
+            prepared = self._prepared.get(query)
+            if prepared is not None:
+                self._prepared.move_to_end(query)
+                self.prepared_cache_hits += 1
+                return prepared
+            self.prepared_cache_misses += 1
+            return None
+    
+    def _cache_statement(self, query: str, prepared: PreparedStatement) -> PreparedStatement:
+        # Prepared outside the lock; a concurrent miss on the same text just
+        # prepares it twice and the driver returns the same statement ID.
+        # Only idempotent statements are executed speculatively; reads are,
+        # while counter updates and lightweight transactions are not.
+        prepared.is_idempotent = query.lstrip().upper().startswith("SELECT")
+        
+        with self._prepared_lock:
+            self._prepared[query] = prepared
+            self._prepared.move_to_end(query)
+            while len(self._prepared) > self.prepared_cache_size:
+                self._prepared.popitem(last=False)
+        return prepared
+    
+    def prepared_cache_stats(self) -> Dict[str, int]:
+        """Get prepared statement cache size and hit/miss counters."""
+        with self._prepared_lock:
+            return {
+                "size": len(self._prepared),
+                "max_size": self.prepared_cache_size,
+                "hits": self.prepared_cache_hits,
+                "misses": self.prepared_cache_misses,
+            }
+    
+    def execute(self, query: str, params = None, row_factory: str = "dict") -> List[Any]:
             """
             Execute a CQL query.
             
             Args:
-                query: The CQL query string
+                query: The CQL query string, using ? placeholders
                 params: The parameters for the query
+                row_factory: "dict" or "tuple" rows, see ROW_FACTORIES
                 
             Returns:
-                List of rows as dictionaries
+                List of rows
             """
             if not self.session:
                 self.connect()
             
+            started = time.perf_counter()
             try:
-                statement = SimpleStatement(query)
-                result = self.session.execute(statement, params or {})
-                return list(result)
+                statement = self.prepare(query)
+                result = self.session.execute(
+                    statement, params or (), execution_profile=self.profile(row_factory)
+                )
+                rows = list(result)
             except Exception as e:
+                record_query(query, started, failed=True)
                 logger.error(f"Query execution failed: {str(e)}")
                 raise
+            record_query(query, started, len(rows))
+            return rows
         
-    def execute_async(self, query: str, params = None):
+    def execute_page(
+        self,
+        query: str,
+        params = None,
+        fetch_size: int = 20,
+        paging_state: Optional[bytes] = None,
+        row_factory: str = "dict",
+    ) -> Tuple[List[Any], Optional[bytes]]:
+        """
+        Execute a CQL query and return a single page of results.
+        
+        Args:
+            query: The CQL query string, using ? placeholders
+            params: The parameters for the query
+            fetch_size: Maximum number of rows to fetch
+            paging_state: Paging state returned with the previous page
+            row_factory: "dict" or "tuple" rows, see ROW_FACTORIES
+            
+        Returns:
+            Tuple of (rows, paging state of the next page or None)
+        """
+        if not self.session:
+            self.connect()
+        
+        started = time.perf_counter()
+        try:
+            statement = self.prepare(query).bind(params or ())
+            statement.fetch_size = fetch_size
+            result = self.session.execute(
+                statement, paging_state=paging_state, execution_profile=self.profile(row_factory)
+            )
+        except Exception as e:
+            record_query(query, started, failed=True)
+            logger.error(f"Paged query execution failed: {str(e)}")
+            raise
+        record_query(query, started, len(result.current_rows))
+        return result.current_rows, result.paging_state
+        
+    def execute_async(self, query: str, params = None, row_factory: str = "dict"):
         """
         Execute a CQL query asynchronously.
         
         Args:
-            query: The CQL query string
+            query: The CQL query string, using ? placeholders
             params: The parameters for the query
+            row_factory: "dict" or "tuple" rows, see ROW_FACTORIES
             
         Returns:
             Async result object
@@ -215,12 +342,161 @@ class CassandraClient:
             self.connect()
         
         try:
-            statement = SimpleStatement(query)
-            return self.session.execute_async(statement, params or {})
+            statement = self.prepare(query)
+            return self.session.execute_async(
+                statement, params or (), execution_profile=self.profile(row_factory)
+            )
         except Exception as e:
             logger.error(f"Async query execution failed: {str(e)}")
             raise
         
+    async def aexecute(self, query: str, params = None, row_factory: str = "dict") -> List[Any]:
+        """
+        Execute a CQL query without blocking the event loop.
+        
+        The driver's ResponseFuture callbacks run on its I/O threads and are
+        handed back to the loop, so the coroutine only suspends while the
+        query is in flight. All result pages are fetched.
+        
+        Args:
+            query: The CQL query string, using ? placeholders
+            params: The parameters for the query
+            row_factory: "dict" or "tuple" rows, see ROW_FACTORIES
+            
+        Returns:
+            List of rows
+        """
+        if not self.session:
+            self.connect()
+        
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        rows: List[Any] = []
+        
+        started = time.perf_counter()
+        statement = await self.aprepare(query)
+        response_future = self.session.execute_async(
+            statement, params or (), execution_profile=self.profile(row_factory)
+        )
+        
+        def on_page(page):
+            rows.extend(page)
+            if response_future.has_more_pages:
+                response_future.start_fetching_next_page()
+            else:
+                record_query(query, started, len(rows))
+                loop.call_soon_threadsafe(_resolve, done, rows)
+        
+        def on_error(exc):
+            record_query(query, started, failed=True)
+            loop.call_soon_threadsafe(_reject, done, exc)
+        
+        response_future.add_callbacks(on_page, on_error)
+        
+        try:
+            return await done
+        except Exception as e:
+            logger.error(f"Query execution failed: {str(e)}")
+            raise
+    
+    async def aexecute_page(
+        self,
+        query: str,
+        params = None,
+        fetch_size: int = 20,
+        paging_state: Optional[bytes] = None,
+        row_factory: str = "dict",
+    ) -> Tuple[List[Any], Optional[bytes]]:
+        """
+        Execute a CQL query without blocking the event loop and return a
+        single page of results.
+        
+        Args:
+            query: The CQL query string, using ? placeholders
+            params: The parameters for the query
+            fetch_size: Maximum number of rows to fetch
+            paging_state: Paging state returned with the previous page
+            row_factory: "dict" or "tuple" rows, see ROW_FACTORIES
+            
+        Returns:
+            Tuple of (rows, paging state of the next page or None)
+        """
+        if not self.session:
+            self.connect()
+        
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        
+        started = time.perf_counter()
+        statement = (await self.aprepare(query)).bind(params or ())
+        statement.fetch_size = fetch_size
+        response_future = self.session.execute_async(
+            statement, paging_state=paging_state, execution_profile=self.profile(row_factory)
+        )
+        
+        def on_page(page):
+            # The callback runs after the result is set, so this never blocks.
+            result = response_future.result()
+            record_query(query, started, len(page))
+            loop.call_soon_threadsafe(_resolve, done, (page, result.paging_state))
+        
+        def on_error(exc):
+            record_query(query, started, failed=True)
+            loop.call_soon_threadsafe(_reject, done, exc)
+        
+        response_future.add_callbacks(on_page, on_error)
+        
+        try:
+            return await done
+        except Exception as e:
+            logger.error(f"Paged query execution failed: {str(e)}")
+            raise
+        
+    async def aexecute_batch(
+        self,
+        statements: Sequence[Tuple[str, Any]],
+        logged: bool = True,
+    ) -> None:
+        """
+        Execute several CQL statements as one batch without blocking the
+        event loop.
+        
+        Args:
+            statements: (query, params) pairs, using ? placeholders
+            logged: Use a logged batch, applying all statements or none even
+                across partitions; unlogged batches only save round trips
+        """
+        if not self.session:
+            self.connect()
+        
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        
+        # Batches are timed as a whole, labelled by their type.
+        label = "BATCH LOGGED" if logged else "BATCH UNLOGGED"
+        started = time.perf_counter()
+        batch = BatchStatement(batch_type=BatchType.LOGGED if logged else BatchType.UNLOGGED)
+        prepared = await asyncio.gather(*(self.aprepare(query) for query, _ in statements))
+        for statement, (_, params) in zip(prepared, statements):
+            batch.add(statement, params or ())
+        response_future = self.session.execute_async(batch)
+        
+        def on_done(_):
+            record_query(label, started)
+            loop.call_soon_threadsafe(_resolve, done, None)
+        
+        def on_error(exc):
+            record_query(label, started, failed=True)
+            loop.call_soon_threadsafe(_reject, done, exc)
+        
+        response_future.add_callbacks(on_done, on_error)
+        
+        try:
+            await done
+        except Exception as e:
+            logger.error(f"Batch execution failed: {str(e)}")
+            raise
+        
     def get_session(self) -> Session:
         """Get the Cassandra session."""
         if not self.session:
@@ -0,0 +1,911 @@
+"""
+Cassandra storage backend for the Messenger application.
+See SCHEMA.MD for the tables used here.
+"""
+import asyncio
+import calendar
+import os
+import struct
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import logging
+
+from app.db.cassandra_client import cassandra_client
+from app.db.storage import StorageBackend, naive_utc
+
+logger = logging.getLogger(__name__)
+
+
+def message_from_row(row: Tuple) -> Dict[str, Any]:
+    """
+    Map a tuple row of conversation_id, message_timestamp, message_id,
+    sender_id, recipient_id, content, the column order every message read
+    selects, to a message dict.
+    """
+    conversation_id, created_at, message_id, sender_id, receiver_id, content = row
+    return {
+        "id": message_id,
+        "conversation_id": conversation_id,
+        "created_at": created_at,
+        "sender_id": sender_id,
+        "receiver_id": receiver_id,
+        "content": content,
+    }
+
+
+def write_timestamp(timestamp: datetime) -> int:
+    """
+    Get the write timestamp, in microseconds since the epoch, of a write
+    made on behalf of a message at a naive UTC timestamp. Conversation
+    writes use it so the one for the newest message wins, whatever order
+    they are applied in.
+    """
+    return calendar.timegm(timestamp.utctimetuple()) * 1_000_000 + timestamp.microsecond
+
+
+def stored_millisecond(timestamp: datetime) -> datetime:
+    """Truncate a timestamp to the millisecond Cassandra stores it at."""
+    return timestamp.replace(microsecond=timestamp.microsecond // 1000 * 1000)
+
+
+# MESSAGE_BUCKET granularities, as the strftime format of the bucket number.
+BUCKET_FORMATS = {"day": "%Y%m%d", "month": "%Y%m"}
+
+# Bucket numbers read per round trip while walking a conversation's buckets.
+BUCKET_FETCH_SIZE = 32
+
+
+def message_bucket(timestamp: datetime, granularity: str) -> int:
+    """
+    Get the bucket of a message timestamp, e.g. 202610 for month buckets.
+    Buckets are UTC dates, whatever the timezone of the timestamp.
+    """
+    return int(naive_utc(timestamp).strftime(BUCKET_FORMATS[granularity]))
+
+
+def encode_bucket_state(bucket: int, paging_state: Optional[bytes]) -> bytes:
+    """
+    Pack the bucket being read with the driver's paging state inside it.
+    An empty paging state means the bucket was read to the end.
+    """
+    return struct.pack(">I", bucket) + (paging_state or b"")
+
+
+def decode_bucket_state(paging_state: bytes) -> Tuple[int, Optional[bytes]]:
+    if len(paging_state) < 4:
+        raise ValueError("Invalid pagination cursor")
+    (bucket,) = struct.unpack(">I", paging_state[:4])
+    return bucket, paging_state[4:] or None
+
+
+def encode_inbox_state(last_message_at: datetime, conversation_id: uuid.UUID) -> bytes:
+    """Pack the key of the last inbox row returned, to resume after it."""
+    return struct.pack(">q", write_timestamp(last_message_at)) + conversation_id.bytes
+
+
+def decode_inbox_state(paging_state: bytes) -> Tuple[datetime, uuid.UUID]:
+    if len(paging_state) != 24:
+        raise ValueError("Invalid pagination cursor")
+    (micros,) = struct.unpack(">q", paging_state[:8])
+    return datetime.utcfromtimestamp(0) + timedelta(microseconds=micros), uuid.UUID(bytes=paging_state[8:])
+
+
+class CassandraStorage(StorageBackend):
+    """
+    StorageBackend on top of the global CassandraClient.
+
+    With MESSAGE_BUCKET set to "day" or "month", messages are stored in
+    messages_by_conversation_bucket, partitioned by conversation and time
+    bucket, so partition size stays bounded however old a conversation is.
+    The default "none" keeps one messages_by_conversation partition per
+    conversation.
+    """
+
+    def __init__(self):
+        self.bucket_granularity = os.getenv("MESSAGE_BUCKET", "none")
+        if self.bucket_granularity != "none" and self.bucket_granularity not in BUCKET_FORMATS:
+            raise ValueError(f"Unknown MESSAGE_BUCKET: {self.bucket_granularity}")
+        self.count_scan_limit = int(os.getenv("MESSAGE_COUNT_SCAN_LIMIT", "10000"))
+
+    @property
+    def bucketed(self) -> bool:
+        return self.bucket_granularity != "none"
+
+    def connect(self) -> None:
+        cassandra_client.get_session()
+
+    def close(self) -> None:
+        cassandra_client.close()
+
+    async def insert_messages(self, conversation_id: uuid.UUID, messages: List[Dict[str, Any]]) -> None:
+        """
+        Insert messages into messages_by_conversation.
+
+        Messages of one conversation share a partition, so several of them
+        are written as a single unlogged batch.
+        """
+        if self.bucketed:
+            writes = self.bucketed_message_writes(conversation_id, messages)
+        else:
+            query = """
+            insert into messages_by_conversation
+            (conversation_id, message_timestamp, message_id, sender_id, recipient_id, content)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """
+            inserts = [
+                (query, (conversation_id, m["created_at"], m["id"], m["sender_id"], m["receiver_id"], m["content"]))
+                for m in messages
+            ]
+            writes = [self.partition_write(inserts)]
+        await asyncio.gather(*writes)
+
+    async def count_new_messages(self, conversation_id: uuid.UUID, messages: List[Dict[str, Any]]) -> None:
+        """
+        Add messages to message_counts and unread_counts. Counters cannot
+        share a batch with regular writes, so these are separate updates.
+        """
+        counts = [cassandra_client.aexecute(
+            """
+            UPDATE message_counts
+            SET message_count = message_count + ?
+            WHERE conversation_id = ?
+            """,
+            (len(messages), conversation_id),
+        )]
+        received = Counter(m["receiver_id"] for m in messages)
+        counts.extend(
+            cassandra_client.aexecute(
+                """
+                UPDATE unread_counts
+                SET unread_count = unread_count + ?
+                WHERE user_id = ? AND conversation_id = ?
+                """,
+                (count, receiver_id, conversation_id),
+            )
+            for receiver_id, count in received.items()
+        )
+        await asyncio.gather(*counts)
+
+    @staticmethod
+    def partition_write(inserts: List[Tuple[str, tuple]]):
+        """Write inserts of one partition as a single statement or unlogged batch."""
+        if len(inserts) == 1:
+            return cassandra_client.aexecute(*inserts[0])
+        return cassandra_client.aexecute_batch(inserts, logged=False)
+
+    def bucketed_message_writes(self, conversation_id: uuid.UUID, messages: List[Dict[str, Any]]) -> list:
+        """
+        Build the writes of messages into messages_by_conversation_bucket: one
+        per bucket partition, plus registering each bucket in message_buckets
+        so reads can find it.
+        """
+        query = """
+        insert into messages_by_conversation_bucket
+        (conversation_id, bucket, message_timestamp, message_id, sender_id, recipient_id, content)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """
+        bucket_query = """
+        INSERT INTO message_buckets (conversation_id, bucket)
+        VALUES (?, ?)
+        """
+        by_bucket: Dict[int, List[Tuple[str, tuple]]] = {}
+        for m in messages:
+            bucket = message_bucket(m["created_at"], self.bucket_granularity)
+            by_bucket.setdefault(bucket, []).append((query, (
+                conversation_id, bucket, m["created_at"], m["id"], m["sender_id"], m["receiver_id"], m["content"]
+            )))
+
+        writes = []
+        for bucket, inserts in by_bucket.items():
+            writes.append(self.partition_write(inserts))
+            writes.append(cassandra_client.aexecute(bucket_query, (conversation_id, bucket)))
+        return writes
+
+    async def message_buckets(
+        self,
+        conversation_id: uuid.UUID,
+        newest: Optional[int] = None,
+        oldest: Optional[int] = None,
+    ) -> AsyncIterator[int]:
+        """
+        Yield the buckets holding messages of a conversation, newest first,
+        starting at newest if given; or oldest first, starting at oldest.
+        Buckets are read lazily, a few at a time, so a page served from
+        recent buckets never lists old ones.
+        """
+        if oldest is not None:
+            query = """
+            SELECT bucket FROM message_buckets
+            WHERE conversation_id = ? AND bucket >= ?
+            ORDER BY bucket ASC
+            """
+            params = (conversation_id, oldest)
+        elif newest is None:
+            query = """
+            SELECT bucket FROM message_buckets
+            WHERE conversation_id = ?
+            """
+            params = (conversation_id,)
+        else:
+            query = """
+            SELECT bucket FROM message_buckets
+            WHERE conversation_id = ? AND bucket <= ?
+            """
+            params = (conversation_id, newest)
+
+        paging_state = None
+        while True:
+            rows, paging_state = await cassandra_client.aexecute_page(
+                query, params, fetch_size=BUCKET_FETCH_SIZE, paging_state=paging_state
+            )
+            for row in rows:
+                yield row["bucket"]
+            if paging_state is None:
+                return
+
+    async def get_messages_page(
+        self,
+        conversation_id: uuid.UUID,
+        limit: int,
+        before_timestamp: Optional[datetime] = None,
+        paging_state: Optional[bytes] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[bytes]]:
+        """
+        Read one page of a messages_by_conversation partition using the
+        driver's paging state. The timestamp is a clustering-column range,
+        so only rows older than before_timestamp are read.
+        """
+        if self.bucketed:
+            return await self.get_bucketed_messages_page(
+                conversation_id, limit, before_timestamp, paging_state
+            )
+
+        if before_timestamp is None:
+            query = """
+            SELECT conversation_id, message_timestamp, message_id, sender_id, recipient_id, content
+            FROM messages_by_conversation
+            WHERE conversation_id = ?
+            """
+            params = (conversation_id,)
+        else:
+            query = """
+            SELECT conversation_id, message_timestamp, message_id, sender_id, recipient_id, content
+            FROM messages_by_conversation
+            WHERE conversation_id = ? AND message_timestamp < ?
+            """
+            params = (conversation_id, before_timestamp)
+
+        rows, next_paging_state = await cassandra_client.aexecute_page(
+            query, params, fetch_size=limit, paging_state=paging_state, row_factory="tuple"
+        )
+        return [message_from_row(row) for row in rows], next_paging_state
+
+    async def get_bucketed_messages_page(
+        self,
+        conversation_id: uuid.UUID,
+        limit: int,
+        before_timestamp: Optional[datetime] = None,
+        paging_state: Optional[bytes] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[bytes]]:
+        """
+        Read one page of messages walking the bucket partitions newest first
+        until the page is filled. The paging state carries the bucket the
+        page ended in along with the driver's paging state inside it.
+        """
+        if before_timestamp is None:
+            query = """
+            SELECT conversation_id, message_timestamp, message_id, sender_id, recipient_id, content
+            FROM messages_by_conversation_bucket
+            WHERE conversation_id = ? AND bucket = ?
+            """
+        else:
+            query = """
+            SELECT conversation_id, message_timestamp, message_id, sender_id, recipient_id, content
+            FROM messages_by_conversation_bucket
+            WHERE conversation_id = ? AND bucket = ? AND message_timestamp < ?
+            """
+
+        resume_bucket, resume_state = None, None
+        if paging_state is not None:
+            resume_bucket, resume_state = decode_bucket_state(paging_state)
+            # A bucket that was read to the end resumes with the one before it.
+            newest = resume_bucket if resume_state else resume_bucket - 1
+        elif before_timestamp is not None:
+            newest = message_bucket(before_timestamp, self.bucket_granularity)
+        else:
+            newest = None
+
+        def params(bucket):
+            if before_timestamp is None:
+                return (conversation_id, bucket)
+            return (conversation_id, bucket, before_timestamp)
+
+        return await self.fill_page_from_buckets(
+            self.message_buckets(conversation_id, newest=newest),
+            query, params, limit, resume_bucket, resume_state,
+        )
+
+    @staticmethod
+    async def fill_page_from_buckets(
+        buckets: AsyncIterator[int],
+        query: str,
+        params,
+        limit: int,
+        resume_bucket: Optional[int],
+        resume_state: Optional[bytes],
+    ) -> Tuple[List[Dict[str, Any]], Optional[bytes]]:
+        """
+        Read bucket partitions in the order buckets yields them until limit
+        messages are read, resuming resume_bucket from resume_state.
+
+        Returns:
+            Tuple of (messages, bucket paging state of the next page or None)
+        """
+        messages: List[Dict[str, Any]] = []
+        async for bucket in buckets:
+            bucket_state = resume_state if bucket == resume_bucket else None
+            while True:
+                rows, bucket_state = await cassandra_client.aexecute_page(
+                    query, params(bucket), fetch_size=limit - len(messages), paging_state=bucket_state,
+                    row_factory="tuple",
+                )
+                messages.extend(message_from_row(row) for row in rows)
+                if len(messages) >= limit:
+                    return messages, encode_bucket_state(bucket, bucket_state)
+                if bucket_state is None:
+                    break
+        return messages, None
+
+    async def get_messages_after_page(
+        self,
+        conversation_id: uuid.UUID,
+        after_timestamp: datetime,
+        limit: int,
+        paging_state: Optional[bytes] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[bytes]]:
+        """
+        Read messages newer than after_timestamp, oldest first: a slice of
+        the clustering order read in reverse, so only the delta is read.
+        With bucketing, buckets are walked oldest first from the one
+        holding after_timestamp.
+        """
+        if not self.bucketed:
+            query = """
+            SELECT conversation_id, message_timestamp, message_id, sender_id, recipient_id, content
+            FROM messages_by_conversation
+            WHERE conversation_id = ? AND message_timestamp > ?
+            ORDER BY message_timestamp ASC
+            """
+            rows, next_paging_state = await cassandra_client.aexecute_page(
+                query, (conversation_id, after_timestamp), fetch_size=limit, paging_state=paging_state,
+                row_factory="tuple",
+            )
+            return [message_from_row(row) for row in rows], next_paging_state
+
+        query = """
+        SELECT conversation_id, message_timestamp, message_id, sender_id, recipient_id, content
+        FROM messages_by_conversation_bucket
+        WHERE conversation_id = ? AND bucket = ? AND message_timestamp > ?
+        ORDER BY message_timestamp ASC
+        """
+        resume_bucket, resume_state = None, None
+        if paging_state is not None:
+            resume_bucket, resume_state = decode_bucket_state(paging_state)
+            # A bucket that was read to the end resumes with the one after it.
+            oldest = resume_bucket if resume_state else resume_bucket + 1
+        else:
+            oldest = message_bucket(after_timestamp, self.bucket_granularity)
+
+        return await self.fill_page_from_buckets(
+            self.message_buckets(conversation_id, oldest=oldest),
+            query, lambda bucket: (conversation_id, bucket, after_timestamp),
+            limit, resume_bucket, resume_state,
+        )
+
+    async def count_messages(
+        self,
+        conversation_id: uuid.UUID,
+        before_timestamp: Optional[datetime] = None,
+    ) -> Optional[int]:
+        """
+        Count messages from the message_counts counter.
+
+        Counters cannot answer ranges, so a count before a timestamp is the
+        total minus the messages at or after it. Those are read as keys and
+        at most MESSAGE_COUNT_SCAN_LIMIT of them, so paging back through a
+        long history costs a bounded read per page; past the limit the
+        count is None.
+        """
+        query = """
+        SELECT message_count
+        FROM message_counts
+        WHERE conversation_id = ?
+        """
+        rows = await cassandra_client.aexecute(query, (conversation_id,))
+        total = rows[0]["message_count"] if rows else 0
+        if before_timestamp is None:
+            return total
+
+        if not self.bucketed:
+            query = """
+            SELECT message_timestamp
+            FROM messages_by_conversation
+            WHERE conversation_id = ? AND message_timestamp >= ?
+            LIMIT ?
+            """
+            rows = await cassandra_client.aexecute(
+                query, (conversation_id, before_timestamp, self.count_scan_limit + 1), row_factory="tuple"
+            )
+            newer = len(rows)
+        else:
+            query = """
+            SELECT message_timestamp
+            FROM messages_by_conversation_bucket
+            WHERE conversation_id = ? AND bucket = ? AND message_timestamp >= ?
+            LIMIT ?
+            """
+            oldest = message_bucket(before_timestamp, self.bucket_granularity)
+            newer = 0
+            async for bucket in self.message_buckets(conversation_id):
+                if bucket < oldest or newer > self.count_scan_limit:
+                    break
+                rows = await cassandra_client.aexecute(
+                    query,
+                    (conversation_id, bucket, before_timestamp, self.count_scan_limit + 1 - newer),
+                    row_factory="tuple",
+                )
+                newer += len(rows)
+
+        if newer > self.count_scan_limit:
+            return None
+        return max(0, total - newer)
+
+    async def count_user_conversations(self, user_id: int) -> int:
+        query = """
+        SELECT conversation_count
+        FROM conversation_counts
+        WHERE user_id = ?
+        """
+        rows = await cassandra_client.aexecute(query, (user_id,))
+        return rows[0]["conversation_count"] if rows else 0
+
+    async def get_unread_counts(self, user_id: int) -> Dict[uuid.UUID, int]:
+        """Read the user's unread_counts partition: every badge of the inbox in one read."""
+        query = """
+        SELECT conversation_id, unread_count
+        FROM unread_counts
+        WHERE user_id = ?
+        """
+        rows = await cassandra_client.aexecute(query, (user_id,))
+        return {row["conversation_id"]: row["unread_count"] for row in rows}
+
+    async def mark_conversation_read(
+        self,
+        user_id: int,
+        conversation_id: uuid.UUID,
+        message_at: datetime,
+        message_id: uuid.UUID,
+    ) -> Dict[str, Any]:
+        """
+        Move the read marker with a lightweight transaction conditioned on
+        its previous value, so of concurrent calls only one adjusts the
+        counter. The winner reads the counter and the received messages
+        after the marker, then applies the difference, which also repairs
+        any drift the counter had accumulated.
+
+        A transaction that is not applied returns only the columns of its
+        condition, so the loser re-reads the marker and tries again while
+        its message is still newer.
+
+        When more than MESSAGE_COUNT_SCAN_LIMIT messages follow the new
+        marker, the counter is left as maintained on write rather than
+        reading them all.
+        """
+        # The driver returns naive UTC timestamps; the request may carry an offset.
+        message_at = naive_utc(message_at)
+        applied = False
+        while True:
+            query = """
+            SELECT last_read_at, last_read_message_id
+            FROM read_markers
+            WHERE user_id = ? AND conversation_id = ?
+            """
+            rows = await cassandra_client.aexecute(query, (user_id, conversation_id))
+            marker = rows[0] if rows else None
+
+            if marker is None:
+                query = """
+                INSERT INTO read_markers (user_id, conversation_id, last_read_at, last_read_message_id)
+                VALUES (?, ?, ?, ?)
+                IF NOT EXISTS
+                """
+                result = await cassandra_client.aexecute(query, (user_id, conversation_id, message_at, message_id))
+            elif message_at > marker["last_read_at"]:
+                query = """
+                UPDATE read_markers
+                SET last_read_at = ?, last_read_message_id = ?
+                WHERE user_id = ? AND conversation_id = ?
+                IF last_read_at = ?
+                """
+                result = await cassandra_client.aexecute(
+                    query, (message_at, message_id, user_id, conversation_id, marker["last_read_at"])
+                )
+            else:
+                break
+
+            if result[0]["[applied]"]:
+                applied = True
+                marker = {"last_read_at": message_at, "last_read_message_id": message_id}
+                break
+
+        query = """
+        SELECT unread_count
+        FROM unread_counts
+        WHERE user_id = ? AND conversation_id = ?
+        """
+        rows = await cassandra_client.aexecute(query, (user_id, conversation_id))
+        unread = rows[0]["unread_count"] if rows else 0
+        remaining = None
+        if applied:
+            remaining = await self.count_received_after(user_id, conversation_id, message_at)
+        if remaining is not None:
+            if unread != remaining:
+                query = """
+                UPDATE unread_counts
+                SET unread_count = unread_count - ?
+                WHERE user_id = ? AND conversation_id = ?
+                """
+                await cassandra_client.aexecute(query, (unread - remaining, user_id, conversation_id))
+            unread = remaining
+
+        return {
+            "last_read_at": marker["last_read_at"],
+            "last_read_message_id": marker["last_read_message_id"],
+            "unread_count": max(0, unread),
+        }
+
+    async def count_received_after(
+        self,
+        user_id: int,
+        conversation_id: uuid.UUID,
+        after: datetime,
+    ) -> Optional[int]:
+        """
+        Count the messages of a conversation received by user_id after a
+        timestamp. Only the slice after the read marker is read, which is
+        empty when the conversation is read up to its latest message, and
+        at most MESSAGE_COUNT_SCAN_LIMIT messages of it; past that the
+        count is None.
+        """
+        count = 0
+        scanned = 0
+        paging_state = None
+        while True:
+            messages, paging_state = await self.get_messages_after_page(
+                conversation_id, after, 500, paging_state
+            )
+            scanned += len(messages)
+            if scanned > self.count_scan_limit:
+                return None
+            count += sum(1 for m in messages if m["receiver_id"] == user_id)
+            if paging_state is None:
+                return count
+
+    async def index_messages(self, postings: List[Tuple[int, str, Dict[str, Any]]]) -> None:
+        """
+        Write postings to message_search_index, one single-partition
+        unlogged batch per (user_id, term), all concurrently.
+        """
+        query = """
+        INSERT INTO message_search_index
+        (user_id, term, message_timestamp, message_id, conversation_id)
+        VALUES (?, ?, ?, ?, ?)
+        """
+        by_partition: Dict[Tuple[int, str], List[Tuple[str, tuple]]] = {}
+        for user_id, term, message in postings:
+            by_partition.setdefault((user_id, term), []).append((query, (
+                user_id, term, message["created_at"], message["id"], message["conversation_id"]
+            )))
+        await asyncio.gather(*(self.partition_write(inserts) for inserts in by_partition.values()))
+
+    async def get_search_postings(self, user_id: int, term: str, limit: int) -> List[Dict[str, Any]]:
+        query = """
+        SELECT conversation_id, message_timestamp, message_id
+        FROM message_search_index
+        WHERE user_id = ? AND term = ?
+        LIMIT ?
+        """
+        rows = await cassandra_client.aexecute(query, (user_id, term, limit), row_factory="tuple")
+        return [
+            {"conversation_id": conversation_id, "created_at": created_at, "id": message_id}
+            for conversation_id, created_at, message_id in rows
+        ]
+
+    async def get_messages_by_reference(self, references: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Resolve references with concurrent single-row reads of their partitions."""
+        if self.bucketed:
+            query = """
+            SELECT conversation_id, message_timestamp, message_id, sender_id, recipient_id, content
+            FROM messages_by_conversation_bucket
+            WHERE conversation_id = ? AND bucket = ? AND message_timestamp = ? AND message_id = ?
+            """
+            params = [
+                (r["conversation_id"], message_bucket(r["created_at"], self.bucket_granularity), r["created_at"], r["id"])
+                for r in references
+            ]
+        else:
+            query = """
+            SELECT conversation_id, message_timestamp, message_id, sender_id, recipient_id, content
+            FROM messages_by_conversation
+            WHERE conversation_id = ? AND message_timestamp = ? AND message_id = ?
+            """
+            params = [(r["conversation_id"], r["created_at"], r["id"]) for r in references]
+
+        results = await asyncio.gather(*(cassandra_client.aexecute(query, p, row_factory="tuple") for p in params))
+        return [message_from_row(rows[0]) if rows else None for rows in results]
+
+    async def get_conversation(self, conversation_id: uuid.UUID) -> Optional[Dict[str, Any]]:
+        query = """
+        SELECT conversation_id, list_of_users, last_message_at, last_message_content
+        FROM user_conversations
+        WHERE conversation_id = ?
+        """
+        rows = await cassandra_client.aexecute(query, (conversation_id,))
+        return rows[0] if rows else None
+
+    async def get_user_conversations(self, user_id: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Read the head of the user's conversations_by_user partition, a
+        single-partition slice already ordered by most recent activity.
+
+        Concurrent sends to the same conversation each delete the same
+        previous inbox row and insert their own, so the older of the new
+        rows is left behind. The first row seen is the most recent, so
+        later duplicates are skipped, deleted (read repair) and paging
+        continues until limit is reached.
+        """
+        query = """
+        SELECT conversation_id, other_user_id, last_message_at, last_message_content
+        FROM conversations_by_user
+        WHERE user_id = ?
+        """
+        conversations = []
+        stale = []
+        seen = set()
+        paging_state = None
+        while True:
+            rows, paging_state = await cassandra_client.aexecute_page(
+                query, (user_id,), fetch_size=limit or 5000, paging_state=paging_state
+            )
+            for row in rows:
+                if row["conversation_id"] in seen:
+                    stale.append(row)
+                    continue
+                seen.add(row["conversation_id"])
+                conversations.append(row)
+            if paging_state is None or (limit is not None and len(conversations) >= limit):
+                await self.delete_inbox_rows(user_id, stale)
+                return conversations[:limit]
+
+    async def get_user_conversations_since(
+        self,
+        user_id: int,
+        since: datetime,
+        limit: int,
+        paging_state: Optional[bytes] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[bytes]]:
+        """
+        Read the inbox rows with activity after since, oldest first, as a
+        reversed slice of the user's conversations_by_user partition.
+
+        Reversed, rows of one timestamp come in descending conversation_id
+        order, so a page resumes at the timestamp of its last row and skips
+        the rows of that timestamp up to the last conversation returned;
+        conversations that share a timestamp across a page boundary are
+        neither skipped nor repeated.
+
+        A left-behind row of a conversation sorts before its newer row, so
+        later rows replace earlier ones of the same conversation and the
+        replaced ones are deleted (read repair).
+        """
+        query = """
+        SELECT conversation_id, other_user_id, last_message_at, last_message_content
+        FROM conversations_by_user
+        WHERE user_id = ? AND last_message_at > ?
+        ORDER BY last_message_at ASC
+        """
+        resume_query = """
+        SELECT conversation_id, other_user_id, last_message_at, last_message_content
+        FROM conversations_by_user
+        WHERE user_id = ? AND last_message_at >= ?
+        ORDER BY last_message_at ASC
+        """
+        resume_at = resume_after = None
+        if paging_state:
+            resume_at, resume_after = decode_inbox_state(paging_state)
+            query = resume_query
+        
+        latest: Dict[uuid.UUID, Dict[str, Any]] = {}
+        stale = []
+        driver_state = None
+        while True:
+            # One row more than the page tells whether another page follows.
+            rows, driver_state = await cassandra_client.aexecute_page(
+                query, (user_id, resume_at or since), fetch_size=limit + 1, paging_state=driver_state
+            )
+            for row in rows:
+                if row["last_message_at"] == resume_at and row["conversation_id"] >= resume_after:
+                    continue
+                previous = latest.get(row["conversation_id"])
+                if previous is not None:
+                    stale.append(previous)
+                latest[row["conversation_id"]] = row
+            if driver_state is None or len(latest) > limit:
+                break
+        await self.delete_inbox_rows(user_id, stale)
+        
+        conversations = sorted(latest.values(), key=lambda row: row["conversation_id"], reverse=True)
+        conversations.sort(key=lambda row: row["last_message_at"])
+        if len(conversations) <= limit:
+            return conversations, None
+        last = conversations[limit - 1]
+        return conversations[:limit], encode_inbox_state(last["last_message_at"], last["conversation_id"])
+
+    async def delete_inbox_rows(self, user_id: int, rows: List[Dict[str, Any]]) -> None:
+        """Delete inbox rows superseded by a newer row of the same conversation."""
+        if not rows:
+            return
+        query = """
+        DELETE FROM conversations_by_user
+        WHERE user_id = ? AND last_message_at = ? AND conversation_id = ?
+        """
+        await self.partition_write([
+            (query, (user_id, row["last_message_at"], row["conversation_id"])) for row in rows
+        ])
+
+    async def get_conversation_id(self, user_low: int, user_high: int) -> Optional[uuid.UUID]:
+        query = """
+        SELECT conversation_id
+        FROM conversations_by_pair
+        WHERE user_low = ? AND user_high = ?
+        """
+        rows = await cassandra_client.aexecute(query, (user_low, user_high))
+        return rows[0]["conversation_id"] if rows else None
+
+    async def claim_conversation(
+        self,
+        user_low: int,
+        user_high: int,
+        conversation_id: uuid.UUID,
+        created_at: datetime,
+    ) -> uuid.UUID:
+        """Claim the pair with a lightweight transaction."""
+        query = """
+            INSERT INTO conversations_by_pair
+            (user_low, user_high, conversation_id, created_at)
+            VALUES (?, ?, ?, ?)
+            IF NOT EXISTS
+        """
+        params = (user_low, user_high, conversation_id, created_at)
+        result = await cassandra_client.aexecute(query, params)
+
+        if result and not result[0]["[applied]"]:
+            return result[0]["conversation_id"]
+        return conversation_id
+
+    async def create_conversation(
+        self,
+        conversation_id: uuid.UUID,
+        users: List[int],
+        created_at: datetime,
+    ) -> None:
+        query = """
+            INSERT INTO user_conversations
+            (conversation_id, list_of_users, created_at, last_message_at)
+            VALUES (?, ?, ?, ?)
+            USING TIMESTAMP ?
+        """
+        params = (conversation_id, users, created_at, created_at, write_timestamp(created_at))
+        statements = [(query, params)]
+        statements.extend(self.inbox_statements(
+            conversation_id, users, None, created_at, None
+        ))
+
+        count_query = """
+            UPDATE conversation_counts
+            SET conversation_count = conversation_count + 1
+            WHERE user_id = ?
+        """
+        await asyncio.gather(
+            cassandra_client.aexecute_batch(statements),
+            *(cassandra_client.aexecute(count_query, (user_id,)) for user_id in set(users)),
+        )
+
+    async def update_conversation(
+        self,
+        conversation_id: uuid.UUID,
+        users: List[int],
+        previous_message_at: Optional[datetime],
+        message: Dict[str, Any],
+    ) -> None:
+        """
+        Update the conversation summary and both inbox rows in one logged
+        batch, so the inbox is never left with the old row deleted but the
+        new one missing.
+
+        Every write carries the message time as its write timestamp, so a
+        send that is applied after a newer one cannot move the summary
+        back, and its delete cannot remove the newer inbox row; the row it
+        inserts is then a stale duplicate, removed on read.
+        """
+        # Update the conversation with the last message details.
+        statements = [(
+            """
+            update user_conversations
+            USING TIMESTAMP ?
+            SET last_message_content = ?,
+            last_message_at = ?
+            where conversation_id = ?
+            """,
+            (write_timestamp(message["created_at"]), message["content"], message["created_at"], conversation_id),
+        )]
+        statements.extend(self.inbox_statements(
+            conversation_id,
+            users,
+            previous_message_at,
+            message["created_at"],
+            message["content"],
+        ))
+        await cassandra_client.aexecute_batch(statements)
+
+    @staticmethod
+    def inbox_statements(
+        conversation_id: uuid.UUID,
+        users: List[int],
+        previous_message_at: Optional[datetime],
+        message_at: datetime,
+        content: Optional[str],
+    ) -> List[Tuple[str, tuple]]:
+        """
+        Build the writes that move a conversation to the top of each
+        participant's inbox.
+
+        last_message_at is a clustering column of conversations_by_user, so
+        the row stored under the previous timestamp is deleted and the new
+        one inserted, both at the write timestamp of message_at. The
+        statements should be applied in a logged batch.
+
+        Cassandra keeps timestamps to the millisecond. When both fall in the
+        same millisecond they are the same row, and a delete at the same
+        write timestamp would win over the insert, so the row is only
+        overwritten.
+        """
+        delete_query = """
+        DELETE FROM conversations_by_user
+        USING TIMESTAMP ?
+        WHERE user_id = ? AND last_message_at = ? AND conversation_id = ?
+        """
+        insert_query = """
+        INSERT INTO conversations_by_user
+        (user_id, last_message_at, conversation_id, other_user_id, last_message_content)
+        VALUES (?, ?, ?, ?, ?)
+        USING TIMESTAMP ?
+        """
+
+        timestamp = write_timestamp(message_at)
+        moved = (
+            previous_message_at is not None
+            and stored_millisecond(previous_message_at) != stored_millisecond(message_at)
+        )
+        statements = []
+        for user_id, other_user_id in ((users[0], users[-1]), (users[-1], users[0])):
+            if moved:
+                statements.append(
+                    (delete_query, (timestamp, user_id, previous_message_at, conversation_id))
+                )
+            statements.append(
+                (insert_query, (user_id, message_at, conversation_id, other_user_id, content, timestamp))
+            )
+        return statements
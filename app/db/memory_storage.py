@@ -0,0 +1,288 @@
+"""
+In-memory storage backend for the Messenger application.
+Used for load testing the API layer and as a fast test harness; nothing
+is persisted and every process has its own data.
+"""
+import uuid
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.db.storage import StorageBackend, naive_utc
+
+MessageKey = Tuple[datetime, uuid.UUID]
+
+# Sorts after every real ID, so (timestamp, MAX_UUID) bounds a timestamp.
+MAX_UUID = uuid.UUID(int=(1 << 128) - 1)
+
+
+def encode_paging_state(key: MessageKey) -> bytes:
+    """Encode the key of the last message returned as a paging state."""
+    return f"{key[0].isoformat()}|{key[1]}".encode("ascii")
+
+
+def decode_paging_state(paging_state: bytes) -> MessageKey:
+    """Decode a paging state produced by encode_paging_state."""
+    try:
+        timestamp, message_id = paging_state.decode("ascii").split("|")
+        return datetime.fromisoformat(timestamp), uuid.UUID(message_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid pagination cursor")
+
+
+class MemoryStorage(StorageBackend):
+    """
+    StorageBackend holding everything in process memory.
+
+    Each conversation keeps its messages sorted by (created_at, id) next to
+    a parallel key list, so appends are O(1) and page lookups are a bisect.
+    Each user's inbox is indexed the same way by (last_message_at,
+    conversation_id). Paging states are keysets, so they stay valid while
+    new messages arrive. Must only be used from the event loop thread.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        """Drop all stored data."""
+        self._messages: Dict[uuid.UUID, List[Dict[str, Any]]] = defaultdict(list)
+        self._message_keys: Dict[uuid.UUID, List[MessageKey]] = defaultdict(list)
+        self._conversations: Dict[uuid.UUID, Dict[str, Any]] = {}
+        self._pairs: Dict[Tuple[int, int], uuid.UUID] = {}
+        self._inbox_rows: Dict[int, Dict[uuid.UUID, Dict[str, Any]]] = defaultdict(dict)
+        self._inbox_keys: Dict[int, List[Tuple[datetime, uuid.UUID]]] = defaultdict(list)
+        self._postings: Dict[Tuple[int, str], List[Tuple[datetime, uuid.UUID, uuid.UUID]]] = defaultdict(list)
+        self._unread: Dict[int, Dict[uuid.UUID, int]] = defaultdict(dict)
+        self._read_markers: Dict[Tuple[int, uuid.UUID], MessageKey] = {}
+
+    async def insert_messages(self, conversation_id: uuid.UUID, messages: List[Dict[str, Any]]) -> None:
+        keys = self._message_keys[conversation_id]
+        rows = self._messages[conversation_id]
+        for message in messages:
+            key = (message["created_at"], message["id"])
+            index = bisect_left(keys, key)
+            if index < len(keys) and keys[index] == key:
+                rows[index] = dict(message)
+                continue
+            keys.insert(index, key)
+            rows.insert(index, dict(message))
+
+    async def count_new_messages(self, conversation_id: uuid.UUID, messages: List[Dict[str, Any]]) -> None:
+        # Message counts are the length of the sorted message list.
+        for message in messages:
+            unread = self._unread[message["receiver_id"]]
+            unread[conversation_id] = unread.get(conversation_id, 0) + 1
+
+    def _message_range_end(
+        self,
+        conversation_id: uuid.UUID,
+        before_timestamp: Optional[datetime],
+        paging_state: Optional[bytes],
+    ) -> int:
+        """Index one past the newest message a page may start from."""
+        keys = self._message_keys.get(conversation_id, [])
+        end = len(keys)
+        if before_timestamp is not None:
+            end = bisect_left(keys, (naive_utc(before_timestamp),))
+        if paging_state:
+            end = min(end, bisect_left(keys, decode_paging_state(paging_state)))
+        return end
+
+    async def get_messages_page(
+        self,
+        conversation_id: uuid.UUID,
+        limit: int,
+        before_timestamp: Optional[datetime] = None,
+        paging_state: Optional[bytes] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[bytes]]:
+        end = self._message_range_end(conversation_id, before_timestamp, paging_state)
+        start = max(0, end - limit)
+        rows = self._messages.get(conversation_id, [])[start:end]
+        rows.reverse()
+
+        next_paging_state = None
+        if start > 0:
+            next_paging_state = encode_paging_state(self._message_keys[conversation_id][start])
+        return rows, next_paging_state
+
+    async def get_messages_after_page(
+        self,
+        conversation_id: uuid.UUID,
+        after_timestamp: datetime,
+        limit: int,
+        paging_state: Optional[bytes] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[bytes]]:
+        keys = self._message_keys.get(conversation_id, [])
+        start = bisect_right(keys, (naive_utc(after_timestamp), MAX_UUID))
+        if paging_state:
+            start = max(start, bisect_right(keys, decode_paging_state(paging_state)))
+        end = min(len(keys), start + limit)
+        rows = self._messages.get(conversation_id, [])[start:end]
+
+        next_paging_state = None
+        if end < len(keys):
+            next_paging_state = encode_paging_state(keys[end - 1])
+        return rows, next_paging_state
+
+    async def count_messages(
+        self,
+        conversation_id: uuid.UUID,
+        before_timestamp: Optional[datetime] = None,
+    ) -> int:
+        return self._message_range_end(conversation_id, before_timestamp, None)
+
+    async def count_user_conversations(self, user_id: int) -> int:
+        return len(self._inbox_rows.get(user_id, {}))
+
+    async def get_unread_counts(self, user_id: int) -> Dict[uuid.UUID, int]:
+        return dict(self._unread.get(user_id, {}))
+
+    async def mark_conversation_read(
+        self,
+        user_id: int,
+        conversation_id: uuid.UUID,
+        message_at: datetime,
+        message_id: uuid.UUID,
+    ) -> Dict[str, Any]:
+        key = (naive_utc(message_at), message_id)
+        marker = self._read_markers.get((user_id, conversation_id))
+        unread = self._unread[user_id]
+        if marker is None or key > marker:
+            marker = self._read_markers[(user_id, conversation_id)] = key
+            keys = self._message_keys.get(conversation_id, [])
+            rows = self._messages.get(conversation_id, [])
+            unread[conversation_id] = sum(
+                1 for row in rows[bisect_right(keys, key):] if row["receiver_id"] == user_id
+            )
+        return {
+            "last_read_at": marker[0],
+            "last_read_message_id": marker[1],
+            "unread_count": unread.get(conversation_id, 0),
+        }
+
+    async def index_messages(self, postings: List[Tuple[int, str, Dict[str, Any]]]) -> None:
+        for user_id, term, message in postings:
+            entry = (message["created_at"], message["id"], message["conversation_id"])
+            entries = self._postings[(user_id, term)]
+            entries.insert(bisect_right(entries, entry), entry)
+
+    async def get_search_postings(self, user_id: int, term: str, limit: int) -> List[Dict[str, Any]]:
+        entries = self._postings.get((user_id, term), [])
+        return [
+            {"conversation_id": conversation_id, "created_at": created_at, "id": message_id}
+            for created_at, message_id, conversation_id in reversed(entries[-limit:])
+        ]
+
+    async def get_messages_by_reference(self, references: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        messages = []
+        for reference in references:
+            key = (naive_utc(reference["created_at"]), reference["id"])
+            keys = self._message_keys.get(reference["conversation_id"], [])
+            index = bisect_left(keys, key)
+            found = index < len(keys) and keys[index] == key
+            messages.append(self._messages[reference["conversation_id"]][index] if found else None)
+        return messages
+
+    async def get_conversation(self, conversation_id: uuid.UUID) -> Optional[Dict[str, Any]]:
+        return self._conversations.get(conversation_id)
+
+    async def get_user_conversations(self, user_id: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        rows = self._inbox_rows.get(user_id, {})
+        keys = self._inbox_keys.get(user_id, [])
+        if limit is not None:
+            keys = keys[-limit:] if limit > 0 else []
+        return [rows[conversation_id] for _, conversation_id in reversed(keys)]
+
+    async def get_user_conversations_since(
+        self,
+        user_id: int,
+        since: datetime,
+        limit: int,
+        paging_state: Optional[bytes] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[bytes]]:
+        rows = self._inbox_rows.get(user_id, {})
+        keys = self._inbox_keys.get(user_id, [])
+        if paging_state:
+            start = bisect_right(keys, decode_paging_state(paging_state))
+        else:
+            start = bisect_right(keys, (naive_utc(since), MAX_UUID))
+        page = keys[start:start + limit]
+        next_state = encode_paging_state(page[-1]) if start + limit < len(keys) else None
+        return [rows[conversation_id] for _, conversation_id in page], next_state
+
+    async def get_conversation_id(self, user_low: int, user_high: int) -> Optional[uuid.UUID]:
+        return self._pairs.get((user_low, user_high))
+
+    async def claim_conversation(
+        self,
+        user_low: int,
+        user_high: int,
+        conversation_id: uuid.UUID,
+        created_at: datetime,
+    ) -> uuid.UUID:
+        return self._pairs.setdefault((user_low, user_high), conversation_id)
+
+    async def create_conversation(
+        self,
+        conversation_id: uuid.UUID,
+        users: List[int],
+        created_at: datetime,
+    ) -> None:
+        self._conversations[conversation_id] = {
+            "conversation_id": conversation_id,
+            "list_of_users": list(users),
+            "last_message_at": created_at,
+            "last_message_content": None,
+        }
+        self._touch_inboxes(conversation_id, users, created_at, None)
+
+    async def update_conversation(
+        self,
+        conversation_id: uuid.UUID,
+        users: List[int],
+        previous_message_at: Optional[datetime],
+        message: Dict[str, Any],
+    ) -> None:
+        """
+        Record message as the latest; previous_message_at is not needed
+        because the inbox index knows where each conversation sits.
+        """
+        current = self._conversations.get(conversation_id)
+        if current is not None and current["last_message_at"] > message["created_at"]:
+            return
+        self._conversations[conversation_id] = {
+            "conversation_id": conversation_id,
+            "list_of_users": list(users),
+            "last_message_at": message["created_at"],
+            "last_message_content": message["content"],
+        }
+        self._touch_inboxes(conversation_id, users, message["created_at"], message["content"])
+
+    def _touch_inboxes(
+        self,
+        conversation_id: uuid.UUID,
+        users: List[int],
+        message_at: datetime,
+        content: Optional[str],
+    ) -> None:
+        for user_id, other_user_id in ((users[0], users[-1]), (users[-1], users[0])):
+            rows = self._inbox_rows[user_id]
+            keys = self._inbox_keys[user_id]
+
+            previous = rows.get(conversation_id)
+            if previous is not None:
+                old_key = (previous["last_message_at"], conversation_id)
+                index = bisect_left(keys, old_key)
+                if index < len(keys) and keys[index] == old_key:
+                    del keys[index]
+
+            new_key = (message_at, conversation_id)
+            keys.insert(bisect_right(keys, new_key), new_key)
+            rows[conversation_id] = {
+                "conversation_id": conversation_id,
+                "other_user_id": other_user_id,
+                "last_message_at": message_at,
+                "last_message_content": content,
+            }
@@ -0,0 +1,226 @@
+"""
+Storage backend interface for the Messenger application.
+MessageModel and ConversationModel talk to a StorageBackend selected with
+the STORAGE_BACKEND environment variable ("cassandra" or "memory").
+"""
+import os
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def naive_utc(timestamp: datetime) -> datetime:
+    """Normalise a timestamp to naive UTC, as stored by build_message."""
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class StorageBackend(ABC):
+    """
+    Storage operations needed by the models.
+
+    Messages are dicts shaped like MessageResponse (id, conversation_id,
+    sender_id, receiver_id, content, created_at). Conversations are dicts
+    with conversation_id, list_of_users, last_message_at and
+    last_message_content; inbox rows replace list_of_users with
+    other_user_id. Returned rows must not be mutated by callers.
+    """
+
+    def connect(self) -> None:
+        """Open connections; called once on application startup."""
+
+    def close(self) -> None:
+        """Release connections; called once on application shutdown."""
+
+    @abstractmethod
+    async def insert_messages(self, conversation_id: uuid.UUID, messages: List[Dict[str, Any]]) -> None:
+        """Store messages of one conversation; storing a message again overwrites it."""
+
+    @abstractmethod
+    async def count_new_messages(self, conversation_id: uuid.UUID, messages: List[Dict[str, Any]]) -> None:
+        """
+        Add stored messages of one conversation to its message count and
+        count them as unread for their receivers. Counter updates are not
+        idempotent, so this must run once per message, never retried.
+        """
+
+    @abstractmethod
+    async def get_messages_page(
+        self,
+        conversation_id: uuid.UUID,
+        limit: int,
+        before_timestamp: Optional[datetime] = None,
+        paging_state: Optional[bytes] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[bytes]]:
+        """
+        Get up to limit messages, newest first.
+
+        Returns:
+            Tuple of (messages, paging state of the next page or None)
+
+        Raises:
+            ValueError: If the paging state was not produced by this backend
+        """
+
+    @abstractmethod
+    async def get_messages_after_page(
+        self,
+        conversation_id: uuid.UUID,
+        after_timestamp: datetime,
+        limit: int,
+        paging_state: Optional[bytes] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[bytes]]:
+        """
+        Get up to limit messages newer than after_timestamp, oldest first.
+
+        Returns:
+            Tuple of (messages, paging state of the next page or None)
+
+        Raises:
+            ValueError: If the paging state was not produced by this backend
+        """
+
+    @abstractmethod
+    async def count_messages(
+        self,
+        conversation_id: uuid.UUID,
+        before_timestamp: Optional[datetime] = None,
+    ) -> Optional[int]:
+        """
+        Count messages in a conversation, optionally before a timestamp.
+        A backend may return None for a count before a timestamp that it
+        cannot answer cheaply.
+        """
+
+    @abstractmethod
+    async def count_user_conversations(self, user_id: int) -> int:
+        """Count the conversations a user takes part in."""
+
+    @abstractmethod
+    async def get_unread_counts(self, user_id: int) -> Dict[uuid.UUID, int]:
+        """Get the number of unread received messages per conversation of a user."""
+
+    @abstractmethod
+    async def mark_conversation_read(
+        self,
+        user_id: int,
+        conversation_id: uuid.UUID,
+        message_at: datetime,
+        message_id: uuid.UUID,
+    ) -> Dict[str, Any]:
+        """
+        Move a user's read marker of a conversation forward to a message and
+        reset the unread count to the received messages after it. Markers
+        never move back.
+
+        Returns:
+            Dict with the resulting last_read_at, last_read_message_id and
+            unread_count
+        """
+
+    @abstractmethod
+    async def index_messages(self, postings: List[Tuple[int, str, Dict[str, Any]]]) -> None:
+        """Add (user_id, term, message) postings to the search index."""
+
+    @abstractmethod
+    async def get_search_postings(self, user_id: int, term: str, limit: int) -> List[Dict[str, Any]]:
+        """
+        Get up to limit of the newest messages of a user containing term,
+        as references with conversation_id, created_at and id.
+        """
+
+    @abstractmethod
+    async def get_messages_by_reference(self, references: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Get the messages for references from get_search_postings, None where missing."""
+
+    @abstractmethod
+    async def get_conversation(self, conversation_id: uuid.UUID) -> Optional[Dict[str, Any]]:
+        """Get a conversation row by ID."""
+
+    @abstractmethod
+    async def get_user_conversations(self, user_id: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Get up to limit of a user's inbox rows, most recent activity first,
+        with one row per conversation.
+        """
+
+    @abstractmethod
+    async def get_user_conversations_since(
+        self,
+        user_id: int,
+        since: datetime,
+        limit: int,
+        paging_state: Optional[bytes] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[bytes]]:
+        """
+        Get up to limit of a user's inbox rows with activity after since,
+        least recent first, with one row per conversation.
+
+        Returns:
+            Tuple of (rows, paging state of the next page or None); the
+            paging state resumes after the last row returned, including
+            among rows with the same last_message_at
+        """
+
+    @abstractmethod
+    async def get_conversation_id(self, user_low: int, user_high: int) -> Optional[uuid.UUID]:
+        """Get the conversation between two users, given in ascending order."""
+
+    @abstractmethod
+    async def claim_conversation(
+        self,
+        user_low: int,
+        user_high: int,
+        conversation_id: uuid.UUID,
+        created_at: datetime,
+    ) -> uuid.UUID:
+        """
+        Atomically map a user pair to conversation_id unless it is mapped.
+
+        Returns:
+            The conversation ID that owns the pair, which is conversation_id
+            only if this call won
+        """
+
+    @abstractmethod
+    async def create_conversation(
+        self,
+        conversation_id: uuid.UUID,
+        users: List[int],
+        created_at: datetime,
+    ) -> None:
+        """Store a new conversation and add it to both users' inboxes."""
+
+    @abstractmethod
+    async def update_conversation(
+        self,
+        conversation_id: uuid.UUID,
+        users: List[int],
+        previous_message_at: Optional[datetime],
+        message: Dict[str, Any],
+    ) -> None:
+        """
+        Record message as the latest of the conversation and move the
+        conversation to the top of both users' inboxes.
+        """
+
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """Get the process-wide storage backend, creating it on first use."""
+    global _storage
+    if _storage is None:
+        backend = os.getenv("STORAGE_BACKEND", "cassandra")
+        if backend == "cassandra":
+            from app.db.cassandra_storage import CassandraStorage
+            _storage = CassandraStorage()
+        elif backend == "memory":
+            from app.db.memory_storage import MemoryStorage
+            _storage = MemoryStorage()
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+    return _storage
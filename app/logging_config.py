@@ -0,0 +1,106 @@
+"""
+Logging configuration for the Messenger application.
+
+Records are handed to a QueueHandler and written by a QueueListener thread,
+so request handlers never block on the stream. Configured through the
+environment:
+
+- LOG_LEVEL: root level (default INFO)
+- LOG_LEVELS: per-logger levels, e.g. "app.models=DEBUG,cassandra=WARNING"
+- LOG_FORMAT: "text" (default) or "json" for one JSON object per line
+- LOG_ROW_SAMPLE_RATE: fraction of reads whose rows are traced at DEBUG
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+from typing import Any, Dict, Optional, Sequence
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Attributes every LogRecord has; anything else came in through extra=.
+# color_message is uvicorn's ANSI-coloured copy of the message.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "color_message",
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_row_sample_rate = 0.0
+
+
+def _extra_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+
+class TextFormatter(logging.Formatter):
+    """Format records with TEXT_FORMAT, followed by fields passed with extra= as key=value."""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        extra = _extra_fields(record)
+        if not extra:
+            return text
+        return text + " " + " ".join(f"{key}={value!r}" for key, value in extra.items())
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON, including fields passed with extra=."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": self.formatTime(record),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging() -> None:
+    """Install the queue-based root handler; safe to call more than once."""
+    global _listener, _row_sample_rate
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler()
+    if os.getenv("LOG_FORMAT", "text") == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter())
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    # Flush whatever is still queued when the process exits.
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    for entry in filter(None, os.getenv("LOG_LEVELS", "").split(",")):
+        name, _, level = entry.partition("=")
+        logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+    _row_sample_rate = float(os.getenv("LOG_ROW_SAMPLE_RATE", "0"))
+
+
+def trace_rows(logger: logging.Logger, message: str, rows: Sequence[Any]) -> None:
+    """
+    Log the rows of a read at DEBUG for a sampled fraction of calls.
+
+    Costs a level check when DEBUG is off, and emits one record per read
+    rather than one per row when it is on.
+    """
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= _row_sample_rate:
+        return
+    logger.debug(message, extra={"row_count": len(rows), "rows": rows})
@@ -1,19 +1,22 @@
 import logging
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 import sys
 import os
 
 from app.api.routes import message_router, conversation_router
 from app.controllers.message_controller import MessageController
 from app.controllers.conversation_controller import ConversationController
-from app.db.cassandra_client import cassandra_client
+from app.db.cache import conversation_cache, conversation_pair_cache
+from app.db.storage import get_storage
+from app.logging_config import configure_logging
+from app.metrics import Counter, Gauge, MetricsMiddleware, registry
+from app.services.message_ingestion import message_ingestion_queue
+from app.services.pubsub import pubsub_hub
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
@@ -30,6 +33,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Dependency injection
 def get_message_controller():
@@ -52,23 +56,56 @@ app.include_router(conversation_router)
 async def root():
     return {"message": "FB Messenger API is running with Cassandra backend"}
 
+def collect_cache_metrics():
+    """Snapshot the in-process cache statistics for /metrics."""
+    caches = {
+        "conversation": conversation_cache.stats(),
+        "conversation_pair": conversation_pair_cache.stats(),
+    }
+    if os.getenv("STORAGE_BACKEND", "cassandra") == "cassandra":
+        from app.db.cassandra_client import cassandra_client
+        caches["prepared_statement"] = cassandra_client.prepared_cache_stats()
+    
+    entries = Gauge("cache_entries", "Entries held in in-process caches", ("cache",))
+    hits = Counter("cache_hits_total", "In-process cache hits", ("cache",))
+    misses = Counter("cache_misses_total", "In-process cache misses", ("cache",))
+    for name, stats in caches.items():
+        entries.set((name,), stats["size"])
+        hits.inc((name,), stats["hits"])
+        misses.inc((name,), stats["misses"])
+    return entries, hits, misses
+
+registry.register_collector(collect_cache_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Expose request, query and cache metrics in the Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup."""
     logger.info("Initializing application...")
     try:
-        # Ensure Cassandra connection is established
-        cassandra_client.get_session()
-        logger.info("Cassandra connection established")
+        # Ensure the storage backend (Cassandra by default) is connected
+        get_storage().connect()
+        logger.info(f"Storage backend {os.getenv('STORAGE_BACKEND', 'cassandra')} ready")
     except Exception as e:
-        logger.error(f"Failed to connect to Cassandra: {str(e)}")
+        logger.error(f"Failed to connect to storage backend: {str(e)}")
         sys.exit(1)
+    
+    if message_ingestion_queue.enabled:
+        message_ingestion_queue.start()
+    await pubsub_hub.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up resources on shutdown."""
     logger.info("Shutting down application...")
-    cassandra_client.close()
+    await pubsub_hub.close()
+    # Flush acknowledged messages before the session goes away.
+    await message_ingestion_queue.drain()
+    get_storage().close()
 
 if __name__ == "__main__":
     import uvicorn
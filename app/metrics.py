@@ -0,0 +1,226 @@
+"""
+In-process metrics for the Messenger application, exposed in the
+Prometheus text format on /metrics.
+
+Metrics are plain counters and histograms guarded by a lock, cheap enough
+to update on every request and query; the Cassandra driver records query
+timings from its I/O threads.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Upper bounds in seconds, from sub-millisecond cache hits to slow queries.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: Labels, extra: str = "") -> str:
+    pairs = [
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Gauge(Counter):
+    """Value that can go up and down per label combination."""
+
+    kind = "gauge"
+
+    def dec(self, labels: Labels = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+    def set(self, labels: Labels, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label combination."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [count per bucket (last one is +Inf), sum]
+        self._values: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, 'le="' + le + '"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    """
+    Metrics rendered together on /metrics.
+
+    Collectors are called at scrape time for values that already live
+    elsewhere, such as cache statistics, and return metrics to render.
+    """
+
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], Iterable]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        metrics = list(self._metrics)
+        for collector in self._collectors:
+            metrics.extend(collector())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "HTTP requests handled", ("method", "route", "status"),
+))
+http_request_duration_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route"),
+))
+http_requests_in_progress = registry.register(Gauge(
+    "http_requests_in_progress", "HTTP requests being handled", ("method",),
+))
+cassandra_query_duration_seconds = registry.register(Histogram(
+    "cassandra_query_duration_seconds", "Cassandra query latency by query template", ("query",),
+))
+cassandra_query_errors_total = registry.register(Counter(
+    "cassandra_query_errors_total", "Failed Cassandra queries by query template", ("query",),
+))
+cassandra_query_rows_total = registry.register(Counter(
+    "cassandra_query_rows_total", "Rows returned by Cassandra queries by query template", ("query",),
+))
+message_ingestion_retries_total = registry.register(Counter(
+    "message_ingestion_retries_total", "Write-behind flushes of a conversation retried after a failure",
+))
+message_ingestion_dropped_total = registry.register(Counter(
+    "message_ingestion_dropped_total", "Acknowledged write-behind messages dropped after the last retry failed",
+))
+message_ingestion_uncounted_total = registry.register(Counter(
+    "message_ingestion_uncounted_total", "Written write-behind messages whose counter updates failed",
+))
+
+_query_labels: Dict[str, str] = {}
+
+
+def query_label(query: str) -> str:
+    """Collapse the whitespace of a CQL string into a one-line label."""
+    label = _query_labels.get(query)
+    if label is None:
+        # Queries are literals with ? placeholders, so this stays bounded by
+        # the number of distinct statements, like the prepared cache.
+        label = _query_labels[query] = " ".join(query.split())
+    return label
+
+
+def record_query(query: str, started: float, rows: int = 0, failed: bool = False) -> None:
+    """Record a finished Cassandra query that was started at started (perf_counter)."""
+    label = (query_label(query),)
+    cassandra_query_duration_seconds.observe(label, time.perf_counter() - started)
+    if failed:
+        cassandra_query_errors_total.inc(label)
+    elif rows:
+        cassandra_query_rows_total.inc(label, rows)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, status and in-flight requests per
+    route. Routes are labelled by their path template, never the raw path,
+    so IDs in URLs do not create new series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_progress.inc((method,))
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_progress.dec((method,))
+            route = scope.get("route")
+            route = getattr(route, "path", "unmatched")
+            http_request_duration_seconds.observe((method, route), time.perf_counter() - started)
+            http_requests_total.inc((method, route, str(status)))
@@ -1,320 +1,541 @@
 """
-Sample models for interacting with Cassandra tables.
-Students should implement these models based on their database schema design.
+Models for messages and conversations.
+Storage goes through the backend returned by app.db.storage.get_storage.
 """
+import asyncio
+import base64
+import os
 import uuid
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Dict, Any, Optional, Sequence, Tuple, Union
 
-from app.db.cassandra_client import cassandra_client
+from app.db.cache import conversation_cache, conversation_pair_cache, message_clock_cache
+from app.db.storage import get_storage
+from app.logging_config import trace_rows
 from app.schemas.message import MessageResponse
+from app.services import search
 import logging
 
 
-# Configure logger
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 
-# Create console handler and set level to debug
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
+# Deepest page offset (page * limit) read without a cursor; an offset page
+# reads and discards every row before it.
+MAX_PAGE_OFFSET = int(os.getenv("MAX_PAGE_OFFSET", "1000"))
 
-# Create formatter and add it to the handler
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
 
-# Add the handler to the logger
-logger.addHandler(console_handler)
+def encode_cursor(paging_state: Optional[bytes]) -> Optional[str]:
+    """Turn a storage paging state into an opaque, URL-safe cursor."""
+    if not paging_state:
+        return None
+    return base64.urlsafe_b64encode(paging_state).decode("ascii")
 
 
-def paginate_messages(all_messages, page, limit):
+def check_page_offset(page: int, limit: int, hint: str) -> None:
+    """Raise ValueError if page * limit is deeper than MAX_PAGE_OFFSET."""
+    if page * limit > MAX_PAGE_OFFSET:
+        raise ValueError(
+            f"page * limit must be at most {MAX_PAGE_OFFSET}; {hint}"
+        )
+
+
+def decode_cursor(cursor: str) -> bytes:
+    """Turn a cursor produced by encode_cursor back into a paging state."""
+    try:
+        paging_state = base64.b64decode(cursor.encode("ascii"), altchars=b"-_", validate=True)
+    except (ValueError, UnicodeEncodeError):
+        raise ValueError("Invalid pagination cursor")
+    if not paging_state:
+        raise ValueError("Invalid pagination cursor")
+    return paging_state
+
+
+async def paginate_messages(conversation_id, before_timestamp, page, limit, cursor=None, include_total=True):
         """
-        Paginate messages based on the page number and limit.
+        Fetch one page of messages using the storage paging state.
+        
+        Only the requested page is read: with a cursor the read resumes
+        where the previous page stopped, otherwise the first page * limit
+        messages are fetched and the last page of them is kept, up to
+        MAX_PAGE_OFFSET messages deep.
         
         Args:
-            messages (List[Dict[str, Any]]): List of messages to paginate.
-            page (int): Page number.
+            conversation_id (uuid.UUID): Conversation to read.
+            before_timestamp (Optional[datetime]): Only read older messages.
+            page (int): Page number, ignored when a cursor is given.
             limit (int): Number of messages per page.
+            cursor (Optional[str]): Cursor returned with the previous page.
+            include_total (bool): Whether to count the messages for total.
         
         Returns:
-            List[Dict[str, Any]]: Paginated list of messages.
+            Dict[str, Any]: Page of messages with the cursor of the next page;
+            the messages are the storage dicts, validated on serialization.
         """
         
+        storage = get_storage()
+        if cursor:
+            read_page = storage.get_messages_page(
+                conversation_id, limit, before_timestamp, decode_cursor(cursor)
+            )
+            skip = 0
+        else:
+            check_page_offset(page, limit, "use next_cursor to read deeper pages")
+            read_page = storage.get_messages_page(
+                conversation_id, page * limit, before_timestamp
+            )
+            skip = (page - 1) * limit
         
-        start = (page - 1) * limit
-        end = start + limit
-        start_index = (page - 1) * limit
-        end_index = start_index + limit
-        paginated_result = all_messages[start_index:end_index]
-        messages = []
-        
-        logger.info("Here ---------")
-        for row in paginated_result:
-            logger.info("Check pagi")
-            logger.info(row)
-            messages.append(
-                MessageResponse(
-                    id=row["message_id"],
-                    conversation_id=row["conversation_id"],
-                    created_at=row["message_timestamp"],
-                    sender_id=row["sender_id"],
-                    receiver_id=row["recipient_id"],
-                    content=row["content"]
-                )
+        if include_total:
+            (rows, paging_state), total = await asyncio.gather(
+                read_page, storage.count_messages(conversation_id, before_timestamp)
             )
-            
-        logger.info("Done with pagi")
+        else:
+            rows, paging_state = await read_page
+            total = None
+        rows = rows[skip:]
+        trace_rows(logger, "Read message page", rows)
+        
         return {
             "page": page,
             "limit": limit,
-            "total": len(all_messages),
-            "data": messages
+            "total": total,
+            "data": rows,
+            "next_cursor": encode_cursor(paging_state),
         }
 
 class MessageModel:
     """
-    Message model for interacting with the messages table.
-    Students will implement this as part of the assignment.
-    
-    They should consider:
-    - How to efficiently store and retrieve messages
-    - How to handle pagination of results
-    - How to filter messages by timestamp
+    Message model: builds, writes and reads messages of conversations
+    through the storage backend, paginated with opaque cursors.
     """
     
+    @staticmethod
+    def build_message(
+        conversation_id: uuid.UUID,
+        sender_id: int,
+        recipient_id: int,
+        content: str) -> Dict[str, Any]:
+        """
+        Assign an ID and timestamp to a new message without writing it.
+        """
+        
+        return {
+            "id": uuid.uuid4(),
+            "sender_id": sender_id,
+            "receiver_id": recipient_id,
+            "content": content,
+            "created_at": MessageModel.next_message_time(conversation_id),
+            "conversation_id": conversation_id,
+        }
     
-
-    
-    # TODO: Implement the following methods
-    
-    
+    @staticmethod
+    def next_message_time(conversation_id: uuid.UUID) -> datetime:
+        """
+        Get the timestamp of the next message of a conversation.
+        
+        Cassandra stores timestamps in milliseconds, so messages of one
+        conversation built within the same millisecond would order by
+        message ID instead of by send order. The timestamp is the current
+        time, moved forward to at least a millisecond after the latest
+        message this process stamped or has cached for the conversation.
+        A burst of messages therefore runs slightly ahead of the clock, but
+        no message is stamped before one sent earlier.
+        """
+        
+        message_at = datetime.utcnow()
+        
+        conversation = conversation_cache.get(conversation_id) or {}
+        previous = [message_clock_cache.get(conversation_id), conversation.get("last_message_at")]
+        previous = [timestamp for timestamp in previous if timestamp is not None]
+        if previous:
+            message_at = max(message_at, max(previous) + timedelta(milliseconds=1))
+        
+        message_clock_cache.set(conversation_id, message_at)
+        return message_at
     
     @staticmethod
-    # async def create_message(*args, **kwargs):
     async def create_message(
         conversation_id: uuid.UUID,
         sender_id: int,
         recipient_id: int,
         content: str):
-        
-        logger.info("Entered create_message method")
         """
         Create a new message.
+        """
         
-        Students should decide what parameters are needed based on their schema design.
+        message = MessageModel.build_message(conversation_id, sender_id, recipient_id, content)
+        
+        logger.debug(f"Creating message with ID: {message['id']}")
+        
+        await MessageModel.write_messages(conversation_id, [message])
+        return message
+    
+    @staticmethod
+    async def build_messages(
+        items: Sequence[Tuple[int, int, str]],
+    ) -> List[Union[Dict[str, Any], Exception]]:
         """
+        Build messages for (sender_id, recipient_id, content) items without
+        writing them.
         
-        message_timestamp = datetime.utcnow()
-        message_id = uuid.uuid4()
+        Each distinct user pair is resolved to its conversation once, all
+        pairs concurrently. Items whose conversation could not be resolved
+        get the exception in their place.
         
-        logger.debug(f"Creating message with ID: {message_id}")
+        Messages of one conversation are stamped in item order, see
+        next_message_time.
+        """
         
+        pairs = list({tuple(sorted((sender_id, recipient_id))) for sender_id, recipient_id, _ in items})
+        resolved = await asyncio.gather(
+            *(ConversationModel.create_or_get_conversation(*pair) for pair in pairs),
+            return_exceptions=True,
+        )
+        conversations = dict(zip(pairs, resolved))
+        
+        messages = []
+        for sender_id, recipient_id, content in items:
+            conversation = conversations[tuple(sorted((sender_id, recipient_id)))]
+            if isinstance(conversation, Exception):
+                messages.append(conversation)
+                continue
+            messages.append(MessageModel.build_message(
+                conversation["conversation_id"], sender_id, recipient_id, content
+            ))
+        return messages
+    
+    @staticmethod
+    async def write_message_batch(messages: Sequence[Dict[str, Any]]) -> List[Optional[Exception]]:
+        """
+        Write messages of any conversations, grouped into one write_messages
+        call per conversation partition, all issued concurrently.
+        
+        Returns:
+            For each message, None if written or the exception of its group
+        """
+        
+        groups: Dict[uuid.UUID, List[int]] = defaultdict(list)
+        for index, message in enumerate(messages):
+            groups[message["conversation_id"]].append(index)
+        
+        outcomes = await asyncio.gather(
+            *(
+                MessageModel.write_messages(conversation_id, [messages[index] for index in indexes])
+                for conversation_id, indexes in groups.items()
+            ),
+            return_exceptions=True,
+        )
+        
+        errors: List[Optional[Exception]] = [None] * len(messages)
+        for indexes, outcome in zip(groups.values(), outcomes):
+            if isinstance(outcome, Exception):
+                for index in indexes:
+                    errors[index] = outcome
+        return errors
+    
+    @staticmethod
+    async def write_messages(conversation_id: uuid.UUID, messages: List[Dict[str, Any]]) -> None:
+        """
+        Write messages of one conversation, as built by build_message: the
+        idempotent writes of store_messages and the counter updates of
+        count_new_messages, issued concurrently. The call fails if any
+        write fails.
+        """
         
         try:
-            query = """
-            insert into messages_by_conversation 
-            (conversation_id, message_timestamp, message_id, sender_id, recipient_id, content)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            params = (conversation_id, message_timestamp, message_id, sender_id, recipient_id, content)
-            cassandra_client.execute(query, params)
-            
+            await asyncio.gather(
+                MessageModel.store_messages(conversation_id, messages),
+                get_storage().count_new_messages(conversation_id, messages),
+            )
         except Exception as e:
-            # Handle exceptions (e.g., log them, raise custom exceptions, etc.)
-            logger.error("Error while inserting message: create_message")
+            logger.error("Error while inserting message: write_messages")
             raise e
+    
+    @staticmethod
+    async def store_messages(conversation_id: uuid.UUID, messages: List[Dict[str, Any]]) -> None:
+        """
+        Write messages of one conversation without counting them.
+        
+        Consistency contract: the message inserts and the conversation
+        update are issued concurrently. The messages are the source of
+        truth; the conversation summary and both participants' inbox rows
+        are updated together, once, to the latest message, and the content
+        is added to both participants' search index. The call fails
+        if either write fails, and a failed conversation update is repaired
+        by the next message in the same conversation. Every write is an
+        overwrite, so a failed call can be retried.
+        """
         
-        try:
-            # Update the conversation with the last message details.
-            update_conversation = """
-            update user_conversations
-            SET last_message_content = %s, 
-            last_message_at = %s
-            where conversation_id = %s
-            """
+        storage = get_storage()
+        latest = max(messages, key=lambda m: m["created_at"])
+        
+        async def update_conversation():
+            # Previous activity timestamp is needed to re-key the inbox rows.
+            # The cached row saves a read on every send; if another process
+            # moved the conversation since, the old inbox row is left behind
+            # as a duplicate, which inbox reads skip and delete.
+            previous = conversation_cache.get(conversation_id)
+            if previous is None:
+                previous = await storage.get_conversation(conversation_id) or {}
+            users = previous.get("list_of_users") or [latest["sender_id"], latest["receiver_id"]]
             
-            params_conversation = (content, message_timestamp, conversation_id)
-            cassandra_client.execute(update_conversation, params_conversation)
+            await storage.update_conversation(
+                conversation_id, users, previous.get("last_message_at"), latest
+            )
             
-        except Exception as e:
-            # Handle exceptions (e.g., log them, raise custom exceptions, etc.)
-            # logger.error("Error while inserting message: create_message")
-            raise e
+            ConversationModel.cache_conversation({
+                "conversation_id": conversation_id,
+                "list_of_users": users,
+                "last_message_at": latest["created_at"],
+                "last_message_content": latest["content"],
+            })
         
+        writes = [storage.insert_messages(conversation_id, messages), update_conversation()]
+        if search.SEARCH_INDEX_ENABLED:
+            writes.append(storage.index_messages(search.message_postings(messages)))
+        await asyncio.gather(*writes)
+    
+    @staticmethod
+    async def search_messages(user_id: int, query: str, page: int = 1, limit: int = 20):
+        """
+        Search the messages a user sent or received, best match first.
+        """
+        
+        results = await search.search_messages(user_id, query, page, limit)
         return {
-            "id": message_id,
-            "sender_id": sender_id,
-            "receiver_id": recipient_id,
-            "content": content,
-            "created_at": message_timestamp,
-            "conversation_id": conversation_id,
+            "query": query,
+            "total": results["total"],
+            "page": page,
+            "limit": limit,
+            "data": [{**message, "score": score} for message, score in results["data"]],
         }
-        
-       
-        # This is a stub - students will implement the actual logic
-        raise NotImplementedError("This method needs to be implemented")
     
     @staticmethod
-    # async def get_conversation_messages(*args, **kwargs):
-    async def get_conversation_messages(
+    async def get_messages_after_timestamp(
         conversation_id: uuid.UUID,
-        page: int = 1,
-        limit: int = 10,
+        after_timestamp: datetime,
+        limit: int = 50,
+        cursor: Optional[str] = None,
     ):
         """
-        Get messages for a conversation with pagination.
+        Get messages newer than a timestamp, oldest first.
         
-        Students should decide what parameters are needed and how to implement pagination.
+        Only the slice after after_timestamp is read, so catching up costs
+        the size of the delta rather than of the history.
         """
         
-        logger.info("S1 - models - get_convo_message")
-        
-        query = """
-        SELECT * 
-        FROM messages_by_conversation 
-        WHERE conversation_id = %s
+        paging_state = decode_cursor(cursor) if cursor else None
+        rows, paging_state = await get_storage().get_messages_after_page(
+            conversation_id, after_timestamp, limit, paging_state
+        )
+        return {
+            "limit": limit,
+            "data": [MessageResponse(**row) for row in rows],
+            "next_cursor": encode_cursor(paging_state),
+        }
+    
+    @staticmethod
+    async def get_latest_messages(conversation_ids: Sequence[uuid.UUID], limit: int = 1):
         """
+        Get the latest limit messages of each conversation, newest first.
         
-        params = (conversation_id,)
-        messages = cassandra_client.execute(query, params)
-        
-        logger.info(messages)
-        
-        logger.info("S2 - models - get_convo_message")
+        Each conversation is one single-partition read; the reads are
+        issued together and merged in the order the IDs were given.
+        """
         
+        conversation_ids = list(dict.fromkeys(conversation_ids))
+        storage = get_storage()
+        pages = await asyncio.gather(*(
+            storage.get_messages_page(conversation_id, limit) for conversation_id in conversation_ids
+        ))
+        return {
+            "limit": limit,
+            "data": [
+                {
+                    "conversation_id": conversation_id,
+                    "messages": [MessageResponse(**row) for row in rows],
+                    "next_cursor": encode_cursor(paging_state),
+                }
+                for conversation_id, (rows, paging_state) in zip(conversation_ids, pages)
+            ],
+        }
+    
+    @staticmethod
+    async def iter_conversation_messages(
+        conversation_id: uuid.UUID,
+        fetch_size: int = 500,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Yield every message of a conversation, newest first, one storage
+        page at a time.
         
-        res = paginate_messages(messages, page, limit)
+        Each page resumes from the previous page's paging state, so the
+        whole history is read once and only one page is held in memory.
+        """
         
-        # return {"total": len(messages), "page": page, "limit": limit, "data": res}
-        return res
+        storage = get_storage()
+        paging_state = None
+        while True:
+            rows, paging_state = await storage.get_messages_page(
+                conversation_id, fetch_size, None, paging_state
+            )
+            if rows:
+                yield rows
+            if paging_state is None:
+                return
     
+    @staticmethod
+    async def get_conversation_messages(
+        conversation_id: uuid.UUID,
+        page: int = 1,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+    ):
+        """
+        Get messages for a conversation with pagination.
         
-        # This is a stub - students will implement the actual logic
-        raise NotImplementedError("This method needs to be implemented")
+        Pages are newest first; pass the returned next_cursor to continue
+        without re-reading earlier pages.
+        """
+        
+        return await paginate_messages(conversation_id, None, page, limit, cursor, include_total)
     
     
     @staticmethod
-    async def get_messages_before_timestamp(conversation_id: uuid.UUID, before_timestamp: datetime, page: int = 1, limit: int = 10):
+    async def get_messages_before_timestamp(
+        conversation_id: uuid.UUID,
+        before_timestamp: datetime,
+        page: int = 1,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+    ):
         """
         Get messages before a timestamp with pagination.
-        
-        Students should decide how to implement filtering by timestamp with pagination.
-        """
-        
-        query = """
-        SELECT *
-        FROM messages_by_conversation 
-        WHERE conversation_id = %s AND message_timestamp < %s
         """
-        params = (conversation_id, before_timestamp)
-        messages = cassandra_client.execute(query, params)
         
-        return paginate_messages(messages, page, limit)
-        
-        # This is a stub - students will implement the actual logic
-        raise NotImplementedError("This method needs to be implemented")
-    
+        return await paginate_messages(conversation_id, before_timestamp, page, limit, cursor, include_total)
     
 
-
 class ConversationModel:
     """
-    Conversation model for interacting with the conversations-related tables.
-    Students will implement this as part of the assignment.
-    
-    They should consider:
-    - How to efficiently store and retrieve conversations for a user
-    - How to handle pagination of results
-    - How to optimize for the most recent conversations
+    Conversation model: resolves user pairs to conversations and reads
+    users' inboxes, most recent activity first, and read markers.
     """
     
-    # TODO: Implement the following methods
-    
     @staticmethod
-    # async def get_user_conversations(*args, **kwargs):
-    async def get_user_conversations(user_id: int, page: int = 1, limit: int = 10):
+    async def get_user_conversations(user_id: int, page: int = 1, limit: int = 10, include_total: bool = True):
         """
         Get conversations for a user with pagination.
         
-        Students should decide what parameters are needed and how to implement pagination.
+        total is None when include_total is False. Pages deeper than
+        MAX_PAGE_OFFSET conversations raise ValueError.
         """
         
-        logger.info("S1 - get_user_c")
-        
-        query = """SELECT *
-        FROM user_conversations
-        WHERE list_of_users CONTAINS %s 
-        ALLOW FILTERING"""
-
-        params = (user_id,)
-        all_messages = cassandra_client.execute(query, params)
-        
-        logger.info("S2 - get_user_c")
-        
-
-        all_messages.sort(key=lambda k: k.get("last_message_at") or datetime.min, reverse=True)
-        
-        start = (page - 1) * limit
-        messages = all_messages[start:start + limit]
-        
-        logger.info("S3 - get_user_c")
+        check_page_offset(page, limit, "use the sync endpoint to follow older activity")
+        
+        # Only the head of the inbox up to this page is read; the total
+        # comes from a maintained count, fetched concurrently.
+        # Unread badges for the whole inbox are one more partition read.
+        storage = get_storage()
+        if include_total:
+            rows, unread, total = await asyncio.gather(
+                storage.get_user_conversations(user_id, page * limit),
+                storage.get_unread_counts(user_id),
+                storage.count_user_conversations(user_id),
+            )
+        else:
+            rows, unread = await asyncio.gather(
+                storage.get_user_conversations(user_id, page * limit),
+                storage.get_unread_counts(user_id),
+            )
+            total = None
         
+        trace_rows(logger, "Read user conversations", rows)
         
         conversations = []
-        for row in messages:
-            logger.info(row)
-            users = row.get("list_of_users", [])
-            
-            if len(users) >= 2:
-                user1, user2 = sorted(users)[:2]
-            elif len(users) == 1:
-                user1 = users[0]
-                user2 = None
-            else:
-                user1 = user2 = None
-                
-            
-
-                
+        for row in rows[(page - 1) * limit:]:
+            user1, user2 = sorted((user_id, row["other_user_id"]))
             conversations.append({
                 "id": row["conversation_id"],
                 "user1_id": user1,
                 "user2_id": user2,
                 "last_message_at": row["last_message_at"],
-                "last_message_content": row["last_message_content"]
+                "last_message_content": row["last_message_content"],
+                "unread_count": max(0, unread.get(row["conversation_id"], 0)),
             })
-    
-        logger.info("S4 - get_user_c")
         
         return {
-            "total": len(all_messages),
+            "total": total,
             "page": page,
             "limit": limit,
-            "data": conversations[start:start + limit]
+            "data": conversations
         }
         
+    
+    @staticmethod
+    async def sync_user_conversations(
+        user_id: int,
+        since: datetime,
+        limit: int = 50,
+        messages_limit: int = 20,
+        cursor: Optional[str] = None,
+    ):
+        """
+        Get the conversations of a user with activity after since, least
+        recent first, each with up to messages_limit of its new messages.
+        
+        The inbox slice and the per-conversation message slices are all
+        bounded by since, and the message reads run concurrently. When more
+        conversations changed than limit, next_cursor continues after the
+        last one returned, with the same since, so conversations sharing a
+        timestamp are not skipped.
+        """
+        
+        storage = get_storage()
+        inbox_state = decode_cursor(cursor) if cursor else None
+        (rows, inbox_state), unread = await asyncio.gather(
+            storage.get_user_conversations_since(user_id, since, limit, inbox_state),
+            storage.get_unread_counts(user_id),
+        )
+        pages = await asyncio.gather(*(
+            storage.get_messages_after_page(row["conversation_id"], since, messages_limit)
+            for row in rows
+        ))
+        
+        conversations = []
+        for row, (messages, paging_state) in zip(rows, pages):
+            user1, user2 = sorted((user_id, row["other_user_id"]))
+            conversations.append({
+                "id": row["conversation_id"],
+                "user1_id": user1,
+                "user2_id": user2,
+                "last_message_at": row["last_message_at"],
+                "last_message_content": row["last_message_content"],
+                "unread_count": max(0, unread.get(row["conversation_id"], 0)),
+                "messages": [MessageResponse(**message) for message in messages],
+                "next_cursor": encode_cursor(paging_state),
+            })
         
-        # This is a stub - students will implement the actual logic
-        raise NotImplementedError("This method needs to be implemented")
+        return {
+            "next_since": rows[-1]["last_message_at"] if rows else since,
+            "has_more": inbox_state is not None,
+            "next_cursor": encode_cursor(inbox_state),
+            "data": conversations,
+        }
     
     @staticmethod
     async def get_conversation(conversation_id: uuid.UUID):
         """
-        Get a conversation by ID.
-        
-        Students should decide what parameters are needed and what data to return.
+        Get a conversation by ID, with its participants in ascending order,
+        or None if it does not exist.
         """
         
-        query = """
-        SELECT *
-        FROM user_conversations
-        WHERE conversation_id = %s
-        """
-        params = (conversation_id,)
-        conversation = cassandra_client.execute(query, params)
+        conversation = await ConversationModel.load_conversation(conversation_id)
         if not conversation:
             return None
-        conversation = conversation[0]
         users = conversation.get("list_of_users", [])
         
         if len(users) >= 2:
@@ -325,7 +546,6 @@ class ConversationModel:
         else:
             user1 = user2 = None
             
-        logger.info("S1 - get_c")
         return {
             "id": conversation.get("conversation_id"),
             "user1_id": user1,
@@ -333,75 +553,126 @@ class ConversationModel:
             "last_message_at": conversation.get("last_message_at"),
             "last_message_content": conversation.get("last_message_content")
         }
-        
-        # This is a stub - students will implement the actual logic
-        raise NotImplementedError("This method needs to be implemented")
     
     @staticmethod
-    # async def create_or_get_conversation(*args, **kwargs):
-    async def create_or_get_conversation(user1: int, user2: int):
-    
-        
+    async def mark_conversation_read(
+        conversation_id: uuid.UUID,
+        user_id: int,
+        message_id: uuid.UUID,
+        created_at: datetime,
+    ) -> Optional[Dict[str, Any]]:
         """
-        Get an existing conversation between two users or create a new one.
+        Mark a conversation read by a participant up to a message.
         
-        Students should decide how to handle this operation efficiently.
+        Returns None if the conversation does not exist or the user does
+        not take part in it. Raises ValueError if the message is not in the
+        conversation, so a marker can only point at a stored message and
+        never past the latest one.
         """
         
-        logger.info("S1 - Entered create_or_get_conversation method")
+        conversation = await ConversationModel.load_conversation(conversation_id)
+        if not conversation or user_id not in conversation.get("list_of_users", []):
+            return None
         
-        # Check if a conversation already exists between the two users
-        query = """
-        SELECT * 
-        FROM user_conversations 
-        WHERE list_of_users CONTAINS %s 
-        ALLOW FILTERING
-        """
-        params = (user1,)
+        storage = get_storage()
+        reference = {"conversation_id": conversation_id, "created_at": created_at, "id": message_id}
+        if (await storage.get_messages_by_reference([reference]))[0] is None:
+            raise ValueError("Message not found in conversation")
         
-        logger.info("S2 - Entered create_or_get_conversation method")
-
-        conversation = cassandra_client.execute(query, params)
+        marker = await storage.mark_conversation_read(user_id, conversation_id, created_at, message_id)
+        return {"conversation_id": conversation_id, "user_id": user_id, **marker}
+    
+    @staticmethod
+    async def load_conversation(conversation_id: uuid.UUID) -> Optional[Dict[str, Any]]:
+        """
+        Get the user_conversations row of a conversation, served from the
+        in-process cache when possible.
+        """
         
-        logger.info("S! - Entered create_or_get_conversation method")
+        conversation = conversation_cache.get(conversation_id)
+        if conversation is not None:
+            return conversation
         
+        conversation = await get_storage().get_conversation(conversation_id)
+        if conversation is not None:
+            ConversationModel.cache_conversation(conversation)
+        return conversation
+    
+    @staticmethod
+    def cache_conversation(conversation: Dict[str, Any]) -> None:
+        """
+        Write a conversation row through to the cache, unless a newer
+        version is already cached.
+        """
         
-        for conv in conversation:
-            logger.info(f"Conversation: {conv}")
-            if user2 in conv.get("list_of_users", []):
-                logger.info("User2 found in conversation")
-                return conv
-            
-        logger.info("S3 - Entered create_or_get_conversation method")
-            
-
+        cached = conversation_cache.get(conversation["conversation_id"])
+        if (
+            cached is not None
+            and cached.get("last_message_at") is not None
+            and conversation.get("last_message_at") is not None
+            and cached["last_message_at"] > conversation["last_message_at"]
+        ):
+            return
+        conversation_cache.set(conversation["conversation_id"], conversation)
+    
+    @staticmethod
+    async def create_or_get_conversation(user1: int, user2: int):
+        """
+        Get an existing conversation between two users or create a new one.
         
+        The pair is looked up in the pair cache, then conversations_by_pair;
+        a new pair is claimed atomically, so concurrent first messages agree
+        on one conversation.
+        """
         
-        # If no conversation exists, create a new one
+        # The pair is stored in ascending order so (a, b) and (b, a) resolve
+        # to the same partition.
+        user_low, user_high = sorted((user1, user2))
+        
+        conversation_id = conversation_pair_cache.get((user_low, user_high))
+        if conversation_id is not None:
+            return {
+                "conversation_id": conversation_id,
+                "list_of_users": [user_low, user_high],
+            }
+        
+        storage = get_storage()
+        conversation_id = await storage.get_conversation_id(user_low, user_high)
+        if conversation_id is not None:
+            conversation_pair_cache.set((user_low, user_high), conversation_id)
+            return {
+                "conversation_id": conversation_id,
+                "list_of_users": [user_low, user_high],
+            }
+        
+        # If no conversation exists, claim the pair atomically; the loser of
+        # a concurrent race adopts the winner's ID.
         conversation_id = uuid.uuid4()
-        message_at = datetime.now()
-        
-        logger.info("S4 - Entered create_or_get_conversation method")
+        message_at = datetime.utcnow()
         
+        owner_id = await storage.claim_conversation(user_low, user_high, conversation_id, message_at)
+        conversation_pair_cache.set((user_low, user_high), owner_id)
         
-        query = """
-            INSERT INTO user_conversations 
-            (conversation_id, list_of_users, created_at, last_message_at)
-            VALUES (%s, %s, %s, %s)
-        """
+        if owner_id != conversation_id:
+            logger.info("Conversation created concurrently, reusing it")
+            return {
+                "conversation_id": owner_id,
+                "list_of_users": [user_low, user_high],
+            }
         
-        params = (conversation_id, [user1, user2], message_at, message_at)
-        cassandra_client.execute(query, params)
+        await storage.create_conversation(conversation_id, [user_low, user_high], message_at)
         
+        ConversationModel.cache_conversation({
+            "conversation_id": conversation_id,
+            "list_of_users": [user_low, user_high],
+            "last_message_at": message_at,
+            "last_message_content": None,
+        })
         
         return {
             "conversation_id": conversation_id,
-            "list_of_users": [user1, user2],
+            "list_of_users": [user_low, user_high],
             "created_at": message_at,
             "last_message_at": message_at,
             "last_message_content": None,
         }
-        
-        
-        # This is a stub - students will implement the actual logic
-        raise NotImplementedError("This method needs to be implemented") 
\ No newline at end of file
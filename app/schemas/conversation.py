@@ -11,16 +11,39 @@ class ConversationResponse(BaseModel):
     user2_id: int = Field(..., description="ID of the second user")
     last_message_at: datetime = Field(..., description="Timestamp of the last message")
     last_message_content: Optional[str] = Field(None, description="Content of the last message")
+    unread_count: Optional[int] = Field(None, description="Messages the requesting user received after their read marker, null without a user context")
 
 class ConversationDetail(ConversationResponse):
     messages: List[MessageResponse] = Field(..., description="List of messages in conversation")
 
+class ConversationDelta(ConversationResponse):
+    messages: List[MessageResponse] = Field(..., description="Messages newer than since, oldest first")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the remaining new messages via /after, null when all are included")
+
+class ConversationSyncResponse(BaseModel):
+    next_since: datetime = Field(..., description="Pass as since in the next sync, once has_more is false")
+    has_more: bool = Field(..., description="Whether more conversations changed than were returned")
+    next_cursor: Optional[str] = Field(None, description="Pass as cursor, with the same since, for the next page of changed conversations; null when has_more is false")
+    data: List[ConversationDelta] = Field(..., description="Conversations with activity since the given time, least recent first")
+
+class ReadMarkerCreate(BaseModel):
+    user_id: int = Field(..., description="ID of the user who read the conversation")
+    message_id: uuid.UUID = Field(..., description="ID of the last message read")
+    created_at: datetime = Field(..., description="Timestamp of the last message read")
+
+class ReadMarkerResponse(BaseModel):
+    conversation_id: uuid.UUID = Field(..., description="ID of the conversation")
+    user_id: int = Field(..., description="ID of the user")
+    last_read_at: datetime = Field(..., description="Timestamp of the last message read; markers never move back")
+    last_read_message_id: uuid.UUID = Field(..., description="ID of the last message read")
+    unread_count: int = Field(..., description="Messages the user received after the marker")
+
 class PaginatedConversationRequest(BaseModel):
     page: int = Field(1, description="Page number for pagination")
     limit: int = Field(20, description="Number of items per page")
 
 class PaginatedConversationResponse(BaseModel):
-    total: int = Field(..., description="Total number of conversations")
+    total: Optional[int] = Field(None, description="Total number of conversations, null when include_total is false")
     page: int = Field(..., description="Current page number")
     limit: int = Field(..., description="Number of items per page")
     data: List[ConversationResponse] = Field(..., description="List of conversations") 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 from typing import Optional, List
 from datetime import datetime
 
@@ -18,13 +18,55 @@ class MessageResponse(MessageBase):
     created_at: datetime = Field(..., description="Timestamp when message was created")
     conversation_id: uuid.UUID = Field(..., description="ID of the conversation")
 
+class ConversationLatestMessages(BaseModel):
+    conversation_id: uuid.UUID = Field(..., description="ID of the conversation")
+    messages: List[MessageResponse] = Field(..., description="Latest messages, newest first")
+    next_cursor: Optional[str] = Field(None, description="Cursor for older messages via the conversation endpoint, null if there are none")
+
+class LatestMessagesResponse(BaseModel):
+    limit: int = Field(..., description="Messages requested per conversation")
+    data: List[ConversationLatestMessages] = Field(..., description="One entry per requested conversation, in request order")
+
+class MessageSearchResult(MessageResponse):
+    score: int = Field(..., description="Number of distinct query terms the message contains")
+
+class MessageSearchResponse(BaseModel):
+    query: str = Field(..., description="The search query")
+    total: int = Field(..., description="Number of matching messages among the most recent postings of each term")
+    page: int = Field(..., description="Current page number")
+    limit: int = Field(..., description="Number of items per page")
+    data: List[MessageSearchResult] = Field(..., description="Matching messages, most query terms first, then newest")
+
+class MessageBatchCreate(BaseModel):
+    messages: List[MessageCreate] = Field(..., min_length=1, max_length=1000, description="Messages to send, at most 1000")
+
+class MessageBatchItemResult(BaseModel):
+    index: int = Field(..., description="Position of the item in the request")
+    status_code: int = Field(..., description="HTTP status the item would have had if sent alone")
+    message: Optional[MessageResponse] = Field(None, description="The created message, if sent")
+    error: Optional[str] = Field(None, description="Why the item was not sent")
+
+class MessageBatchResponse(BaseModel):
+    results: List[MessageBatchItemResult] = Field(..., description="One result per item, in request order")
+
 class PaginatedMessageRequest(BaseModel):
     page: int = Field(1, description="Page number for pagination")
     limit: int = Field(20, description="Number of items per page")
     before_timestamp: Optional[datetime] = Field(None, description="Get messages before this timestamp")
+    cursor: Optional[str] = Field(None, description="Cursor returned with the previous page")
 
 class PaginatedMessageResponse(BaseModel):
-    total: int = Field(..., description="Total number of messages")
+    total: Optional[int] = Field(None, description="Total number of messages, null when include_total is false or the count before a timestamp is too costly")
     page: int = Field(..., description="Current page number")
     limit: int = Field(..., description="Number of items per page")
-    data: List[MessageResponse] = Field(..., description="List of messages") 
\ No newline at end of file
+    data: List[MessageResponse] = Field(..., description="List of messages")
+    next_cursor: Optional[str] = Field(None, description="Opaque cursor for the next page, null on the last page")
+
+# Validates a page built from storage message dicts and encodes it to JSON
+# in one pydantic-core pass, without MessageResponse instances in between.
+paginated_message_adapter = TypeAdapter(PaginatedMessageResponse)
+
+class MessageDeltaResponse(BaseModel):
+    limit: int = Field(..., description="Number of items per page")
+    data: List[MessageResponse] = Field(..., description="Messages newer than after_timestamp, oldest first")
+    next_cursor: Optional[str] = Field(None, description="Opaque cursor for more new messages, null when caught up") 
\ No newline at end of file
@@ -0,0 +1,200 @@
+"""
+Write-behind ingestion queue for the Messenger application.
+Messages are acknowledged once queued and flushed to Cassandra in
+micro-batches grouped by conversation partition.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.db.storage import get_storage
+from app.metrics import (
+    message_ingestion_dropped_total,
+    message_ingestion_retries_total,
+    message_ingestion_uncounted_total,
+)
+from app.models.cassandra_models import MessageModel
+
+logger = logging.getLogger(__name__)
+
+OnWritten = Callable[[], Awaitable[None]]
+
+
+class QueueFullError(Exception):
+    """Raised when a message cannot be queued without exceeding the bound."""
+
+
+class MessageIngestionQueue:
+    """
+    Bounded in-process queue with a background flusher.
+
+    The flusher waits for the first message, then keeps collecting until
+    max_batch_size messages are pending or max_delay has passed, and stores
+    each conversation's messages with one MessageModel.store_messages call.
+
+    A conversation whose write fails is retried up to max_retries times,
+    waiting retry_delay and then twice as long before each further attempt;
+    the flusher waits with it, so a struggling cluster fills the queue and
+    sends are refused with 429. Messages still failing after the last retry
+    are dropped, logged and counted in message_ingestion_dropped_total, as
+    are messages acknowledged but not yet flushed if the process dies
+    without a graceful drain.
+
+    Once written, the messages are counted in a single attempt, since
+    counter updates cannot be retried safely, and their on_written
+    callbacks run.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        max_size: int = 10000,
+        max_batch_size: int = 100,
+        max_delay: float = 0.01,
+        max_retries: int = 3,
+        retry_delay: float = 0.1,
+    ):
+        self.enabled = enabled
+        self.max_size = max_size
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._accepting = False
+
+    def start(self) -> None:
+        """Start the background flusher on the running event loop."""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._accepting = True
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(
+            f"Message ingestion queue started (max_size={self.max_size}, "
+            f"max_batch_size={self.max_batch_size}, max_delay={self.max_delay}s)"
+        )
+
+    def enqueue(self, message: Dict[str, Any], on_written: Optional[OnWritten] = None) -> None:
+        """
+        Queue a message built by MessageModel.build_message.
+
+        Args:
+            message: The message to write
+            on_written: Called once the message is written, never if it is
+                dropped
+
+        Raises:
+            QueueFullError: If the queue is full or draining
+        """
+        if not self._accepting:
+            raise QueueFullError("Message ingestion queue is not accepting messages")
+        try:
+            self._queue.put_nowait((message, on_written))
+        except asyncio.QueueFull:
+            raise QueueFullError("Message ingestion queue is full")
+
+    async def drain(self) -> None:
+        """Stop accepting messages and wait until everything queued is written."""
+        if self._task is None:
+            return
+        self._accepting = False
+        logger.info(f"Draining message ingestion queue ({self._queue.qsize()} pending)")
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("Message ingestion queue drained")
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[Tuple[Dict[str, Any], Optional[OnWritten]]]) -> None:
+        by_conversation: Dict[uuid.UUID, List[Tuple[Dict[str, Any], Optional[OnWritten]]]] = defaultdict(list)
+        for entry in batch:
+            by_conversation[entry[0]["conversation_id"]].append(entry)
+
+        await asyncio.gather(
+            *(
+                self._write(conversation_id, entries)
+                for conversation_id, entries in by_conversation.items()
+            )
+        )
+
+    async def _write(
+        self,
+        conversation_id: uuid.UUID,
+        entries: List[Tuple[Dict[str, Any], Optional[OnWritten]]],
+    ) -> None:
+        """
+        Store one conversation's messages, retrying with exponential
+        backoff, then count them and run their callbacks.
+        """
+        messages = [message for message, _ in entries]
+        for attempt in range(self.max_retries + 1):
+            try:
+                await MessageModel.store_messages(conversation_id, messages)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    message_ingestion_dropped_total.inc((), len(messages))
+                    logger.error(
+                        f"Dropped {len(messages)} messages for conversation {conversation_id} "
+                        f"after {attempt + 1} attempts: {str(e)}"
+                    )
+                    return
+                delay = self.retry_delay * 2 ** attempt
+                message_ingestion_retries_total.inc()
+                logger.warning(
+                    f"Failed to flush {len(messages)} messages for conversation "
+                    f"{conversation_id}, retrying in {delay:.3f}s: {str(e)}"
+                )
+                await asyncio.sleep(delay)
+
+        try:
+            await get_storage().count_new_messages(conversation_id, messages)
+        except Exception as e:
+            message_ingestion_uncounted_total.inc((), len(messages))
+            logger.error(f"Failed to count {len(messages)} messages for conversation {conversation_id}: {str(e)}")
+
+        callbacks = [on_written() for _, on_written in entries if on_written is not None]
+        for outcome in await asyncio.gather(*callbacks, return_exceptions=True):
+            if isinstance(outcome, Exception):
+                logger.warning(f"on_written callback failed for conversation {conversation_id}: {str(outcome)}")
+
+
+# Create a global instance
+message_ingestion_queue = MessageIngestionQueue(
+    enabled=os.getenv("MESSAGE_WRITE_MODE", "sync") == "write_behind",
+    max_size=int(os.getenv("MESSAGE_QUEUE_MAX_SIZE", "10000")),
+    max_batch_size=int(os.getenv("MESSAGE_BATCH_MAX_SIZE", "100")),
+    max_delay=int(os.getenv("MESSAGE_BATCH_MAX_DELAY_MS", "10")) / 1000,
+    max_retries=int(os.getenv("MESSAGE_FLUSH_MAX_RETRIES", "3")),
+    retry_delay=int(os.getenv("MESSAGE_FLUSH_RETRY_DELAY_MS", "100")) / 1000,
+)
@@ -0,0 +1,166 @@
+"""
+Publish/subscribe hub for real-time message delivery.
+
+Messages are published on channels such as "user:42" or
+"conversation:<id>". The hub hands them to a Broker, and the broker
+delivers every message back to the hub on each node, which fans it out to
+the WebSocket subscribers connected locally. LocalBroker delivers in
+process; a cross-node bus implements the same Broker interface.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[str, Dict[str, Any]], None]
+
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def conversation_channel(conversation_id: uuid.UUID) -> str:
+    return f"conversation:{conversation_id}"
+
+
+class Broker(ABC):
+    """
+    Transport between the hubs of all nodes.
+
+    deliver must be called on the event loop thread for every message
+    published on a channel this node subscribed to, including the ones it
+    published itself.
+    """
+
+    async def start(self, deliver: Deliver) -> None:
+        self.deliver = deliver
+
+    async def close(self) -> None:
+        """Release connections; called once on application shutdown."""
+
+    async def subscribe(self, channel: str) -> None:
+        """Start receiving channel; called when its first local subscriber arrives."""
+
+    async def unsubscribe(self, channel: str) -> None:
+        """Stop receiving channel; called when its last local subscriber leaves."""
+
+    @abstractmethod
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        """Send message to every node subscribed to channel."""
+
+
+class LocalBroker(Broker):
+    """Broker for a single process: publishing is delivering."""
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        self.deliver(channel, message)
+
+
+class Subscription:
+    """
+    A subscriber's bounded message queue.
+
+    A subscriber that falls max_size messages behind is closed rather than
+    buffered without limit; it should resync and subscribe again.
+    """
+
+    def __init__(self, channels: Iterable[str], max_size: int):
+        self.channels = set(channels)
+        self.overflowed = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+
+    def offer(self, message: Dict[str, Any]) -> bool:
+        """Queue message; False if this message made the subscriber overflow."""
+        if self.overflowed:
+            return True
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.close()
+            return False
+        return True
+
+    def close(self) -> None:
+        """Wake the reader with the end-of-stream marker."""
+        while True:
+            try:
+                self._queue.put_nowait(None)
+                return
+            except asyncio.QueueFull:
+                self._queue.get_nowait()
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        """Wait for the next message; None once the subscription is closed."""
+        return await self._queue.get()
+
+
+class PubSubHub:
+    """Tracks local subscriptions per channel and fans out delivered messages."""
+
+    def __init__(self, broker: Broker, subscriber_queue_size: int = 1000):
+        self.broker = broker
+        self.subscriber_queue_size = subscriber_queue_size
+        self._subscriptions: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._started = False
+
+    async def start(self) -> None:
+        if self._started:
+            return
+        await self.broker.start(self._deliver)
+        self._started = True
+
+    async def close(self) -> None:
+        """Close every subscription and the broker."""
+        for subscriptions in list(self._subscriptions.values()):
+            for subscription in list(subscriptions):
+                subscription.close()
+        self._subscriptions.clear()
+        if self._started:
+            await self.broker.close()
+            self._started = False
+
+    async def subscribe(self, *channels: str) -> Subscription:
+        subscription = Subscription(channels, self.subscriber_queue_size)
+        for channel in subscription.channels:
+            if not self._subscriptions[channel]:
+                await self.broker.subscribe(channel)
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription) -> None:
+        for channel in subscription.channels:
+            subscriptions = self._subscriptions.get(channel)
+            if subscriptions is None:
+                continue
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[channel]
+                await self.broker.unsubscribe(channel)
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        await self.broker.publish(channel, message)
+
+    def _deliver(self, channel: str, message: Dict[str, Any]) -> None:
+        for subscription in list(self._subscriptions.get(channel, ())):
+            if not subscription.offer(message):
+                logger.warning(f"Dropping subscriber of {channel} that fell behind")
+
+
+def create_broker() -> Broker:
+    """Create the broker selected with the PUBSUB_BROKER environment variable."""
+    broker = os.getenv("PUBSUB_BROKER", "local")
+    if broker == "local":
+        return LocalBroker()
+    raise ValueError(f"Unknown PUBSUB_BROKER: {broker}")
+
+
+pubsub_hub = PubSubHub(
+    create_broker(),
+    subscriber_queue_size=int(os.getenv("PUBSUB_SUBSCRIBER_QUEUE_SIZE", "1000")),
+)
@@ -0,0 +1,102 @@
+"""
+Message search for the Messenger application.
+
+Message content is tokenized when messages are written and every term is
+posted to the inverted index of both participants, (user_id, term) ->
+message references, newest first. A query reads the most recent postings
+of each of its terms, ranks the messages by the number of distinct query
+terms they contain and then by recency, and resolves only the requested
+page to full messages.
+"""
+import asyncio
+import os
+import re
+from typing import Any, Dict, List, Set, Tuple
+
+from app.db.storage import get_storage
+
+# Off by default: every message adds one index write per distinct term for
+# each participant, on top of the message write itself.
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "false").lower() == "true"
+
+# Postings read per query term; bounds the cost of a query on common terms.
+SEARCH_MAX_POSTINGS = int(os.getenv("SEARCH_MAX_POSTINGS", "1000"))
+
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 64
+
+# Every query term is one index partition read.
+MAX_QUERY_TERMS = 8
+
+# Terms this common would make huge, useless index partitions.
+STOP_WORDS = frozenset("""
+    a an and are as at be but by for from had has have he her his i if in into is it its
+    me my no not of on or our she so that the their them they this to was we were what
+    when which who will with you your
+""".split())
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> Set[str]:
+    """Split text into the distinct lowercase terms that are indexed."""
+    return {
+        token
+        for token in _TOKEN.findall(text.lower())
+        if MIN_TERM_LENGTH <= len(token) <= MAX_TERM_LENGTH and token not in STOP_WORDS
+    }
+
+
+def message_postings(messages: List[Dict[str, Any]]) -> List[Tuple[int, str, Dict[str, Any]]]:
+    """Build the (user_id, term, message) postings of messages for both participants."""
+    postings = []
+    for message in messages:
+        users = {message["sender_id"], message["receiver_id"]}
+        for term in tokenize(message["content"]):
+            for user_id in users:
+                postings.append((user_id, term, message))
+    return postings
+
+
+async def search_messages(user_id: int, query: str, page: int = 1, limit: int = 20) -> Dict[str, Any]:
+    """
+    Search a user's messages.
+
+    Returns:
+        Dict with total (matches among the postings read), the page of
+        messages and their scores, best first
+
+    Raises:
+        ValueError: If the query has more than MAX_QUERY_TERMS terms
+    """
+    terms = sorted(tokenize(query))
+    if not terms:
+        return {"total": 0, "data": []}
+    if len(terms) > MAX_QUERY_TERMS:
+        raise ValueError(f"Search queries are limited to {MAX_QUERY_TERMS} terms")
+
+    storage = get_storage()
+    postings = await asyncio.gather(*(
+        storage.get_search_postings(user_id, term, SEARCH_MAX_POSTINGS) for term in terms
+    ))
+
+    scores: Dict[Tuple, int] = {}
+    references: Dict[Tuple, Dict[str, Any]] = {}
+    for term_postings in postings:
+        for reference in term_postings:
+            key = (reference["created_at"], reference["id"])
+            scores[key] = scores.get(key, 0) + 1
+            references[key] = reference
+
+    ranked = sorted(scores, key=lambda key: (scores[key], key[0]), reverse=True)
+    page_keys = ranked[(page - 1) * limit:page * limit]
+    messages = await storage.get_messages_by_reference([references[key] for key in page_keys])
+
+    return {
+        "total": len(ranked),
+        "data": [
+            (message, scores[key])
+            for key, message in zip(page_keys, messages)
+            if message is not None
+        ],
+    }
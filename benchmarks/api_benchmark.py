@@ -0,0 +1,181 @@
+"""
+Load-generation benchmark for the Messenger API.
+
+Seeds a synthetic dataset, then drives app.main:app in-process through
+httpx's ASGI transport and reports throughput and p50/p95/p99 latency per
+endpoint. Runs against the in-memory backend unless STORAGE_BACKEND is set.
+
+Usage:
+    python -m benchmarks.api_benchmark --requests 20000 --concurrency 64
+    python -m benchmarks.api_benchmark --output baseline.json
+    python -m benchmarks.api_benchmark --compare baseline.json --max-regression 0.2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+import httpx
+
+from app.main import app
+from benchmarks.workload import OPERATIONS, Workload
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parse "send=30,inbox=30,history=30,before=10" into weights."""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r}, expected one of {OPERATIONS}")
+        mix[name] = float(weight)
+    return mix
+
+
+async def run(args) -> Dict[str, Dict[str, float]]:
+    workload = Workload(
+        users=args.users,
+        conversations=args.conversations,
+        mean_messages=args.mean_messages,
+        max_messages=args.max_messages,
+        zipf_s=args.zipf_s,
+        mix=args.mix,
+        page_size=args.page_size,
+        seed=args.seed,
+    )
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        seeded = await workload.seed_data()
+        print(
+            f"Seeded {len(workload.seeded)} conversations / {seeded} messages "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            remaining = args.requests
+
+            async def worker():
+                nonlocal remaining
+                while remaining > 0:
+                    remaining -= 1
+                    operation, method, path, kwargs = workload.next_request()
+                    request_started = time.perf_counter()
+                    response = await client.request(method, path, **kwargs)
+                    latencies[operation].append(time.perf_counter() - request_started)
+                    if response.status_code >= 400:
+                        errors[operation] += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+
+    results = {}
+    for operation in sorted(latencies):
+        values = sorted(latencies[operation])
+        results[operation] = {
+            "requests": len(values),
+            "errors": errors[operation],
+            "throughput": len(values) / elapsed,
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+        }
+    results["total"] = {
+        "requests": args.requests,
+        "errors": sum(errors.values()),
+        "throughput": args.requests / elapsed,
+    }
+    return results
+
+
+def report(results: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'endpoint':<10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for operation, stats in results.items():
+        if operation == "total":
+            continue
+        print(
+            f"{operation:<10} {stats['requests']:>9} {stats['errors']:>7} {stats['throughput']:>9.1f} "
+            f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}"
+        )
+    total = results["total"]
+    print(f"{'total':<10} {total['requests']:>9} {total['errors']:>7} {total['throughput']:>9.1f}")
+
+
+def regressions(results, baseline, max_regression: float) -> List[str]:
+    """List endpoints whose p95 grew by more than max_regression."""
+    failures = []
+    for operation, stats in results.items():
+        before = baseline.get(operation, {}).get("p95_ms")
+        if operation == "total" or not before:
+            continue
+        growth = stats["p95_ms"] / before - 1
+        if growth > max_regression:
+            failures.append(
+                f"{operation}: p95 {before:.2f}ms -> {stats['p95_ms']:.2f}ms (+{growth:.0%})"
+            )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10000, help="Requests to issue after seeding")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent in-flight requests")
+    parser.add_argument("--users", type=int, default=1000, help="Distinct users")
+    parser.add_argument("--conversations", type=int, default=2000, help="Conversations to seed")
+    parser.add_argument("--mean-messages", type=int, default=50, help="Mean seeded messages per conversation")
+    parser.add_argument("--max-messages", type=int, default=5000, help="Cap on seeded messages per conversation")
+    parser.add_argument("--zipf-s", type=float, default=1.1, help="Zipf exponent for user and conversation popularity")
+    parser.add_argument("--mix", type=parse_mix, default="send=30,inbox=30,history=30,before=10",
+                        help="Operation weights, e.g. send=30,inbox=30,history=30,before=10")
+    parser.add_argument("--page-size", type=int, default=20, help="limit used by read requests")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for a reproducible workload")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON written by --output to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed p95 growth over the baseline before failing, as a fraction")
+    parser.add_argument("--verbose", action="store_true", help="Keep application INFO logging enabled")
+    args = parser.parse_args()
+
+    if args.conversations > args.users * (args.users - 1) // 2:
+        parser.error("--conversations exceeds the number of distinct user pairs")
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    results = asyncio.run(run(args))
+    report(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            failures = regressions(results, json.load(f), args.max_regression)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Micro-benchmark of serializing a paginated message page.
+
+Compares the per-row cost of the two ways a page from paginate_messages
+can reach the wire:
+
+- model: a MessageResponse per row wrapped in PaginatedMessageResponse,
+  then FastAPI's response_model handling (dump, re-validate, encode), as
+  the message routes did before the fast path
+- fast: message_page_response, one pydantic-core validate and JSON dump
+  of the storage dicts
+
+Both paths run against the same synthetic page and must produce the same
+JSON document.
+
+Usage:
+    python -m benchmarks.serialization --rows 1000 --iterations 200
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+
+from app.api.routes.message_routes import router
+from app.controllers.message_controller import message_page_response
+from app.schemas.message import MessageResponse, PaginatedMessageResponse
+
+
+def build_page(rows: int) -> Dict[str, Any]:
+    """Build a page shaped like paginate_messages' output, newest first."""
+    conversation_id = uuid.uuid4()
+    now = datetime.utcnow()
+    return {
+        "page": 1,
+        "limit": rows,
+        "total": rows * 10,
+        "next_cursor": "AAAAAQ",
+        "data": [
+            {
+                "id": uuid.uuid4(),
+                "conversation_id": conversation_id,
+                "created_at": now - timedelta(seconds=i),
+                "sender_id": 1 + i % 2,
+                "receiver_id": 2 - i % 2,
+                "content": f"Message number {i} of the benchmark conversation",
+            }
+            for i in range(rows)
+        ],
+    }
+
+
+def model_path(route: APIRoute) -> Callable[[Dict[str, Any]], bytes]:
+    """Serialize the way FastAPI handles a model returned for response_model."""
+    loop = asyncio.new_event_loop()
+
+    def serialize(page: Dict[str, Any]) -> bytes:
+        model = PaginatedMessageResponse(**{**page, "data": [MessageResponse(**row) for row in page["data"]]})
+        content = loop.run_until_complete(serialize_response(
+            field=route.response_field, response_content=model, is_coroutine=True
+        ))
+        return JSONResponse(content).body
+
+    return serialize
+
+
+def fast_path(page: Dict[str, Any]) -> bytes:
+    return message_page_response(page).body
+
+
+def per_row_us(serialize: Callable[[Dict[str, Any]], bytes], page: Dict[str, Any], iterations: int) -> float:
+    serialize(page)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        serialize(page)
+    return (time.perf_counter() - started) / iterations / len(page["data"]) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="Messages per page")
+    parser.add_argument("--iterations", type=int, default=200, help="Pages serialized per path")
+    args = parser.parse_args()
+
+    route = next(
+        r for r in router.routes
+        if isinstance(r, APIRoute) and r.path == "/api/messages/conversation/{conversation_id}"
+    )
+    page = build_page(args.rows)
+    paths = {"model": model_path(route), "fast": fast_path}
+
+    if json.loads(paths["model"](page)) != json.loads(paths["fast"](page)):
+        raise SystemExit("The serialization paths disagree")
+
+    results = {name: per_row_us(serialize, page, args.iterations) for name, serialize in paths.items()}
+    print(f"{'path':<6} {'us/row':>8} {'ms/page':>8}")
+    for name, cost in results.items():
+        print(f"{name:<6} {cost:>8.2f} {cost * args.rows / 1000:>8.2f}")
+    print(f"speedup {results['model'] / results['fast']:.1f}x on {args.rows}-message pages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Synthetic messenger workloads for the benchmark suite.
+Users are drawn from a Zipf distribution, conversation sizes from a
+long-tailed Pareto distribution, and requests from a weighted mix.
+"""
+import itertools
+import random
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from app.models.cassandra_models import ConversationModel, MessageModel
+
+OPERATIONS = ("send", "inbox", "history", "before")
+
+
+class ZipfSampler:
+    """Draw ranks 1..n with probability proportional to 1 / rank ** s."""
+
+    def __init__(self, n: int, s: float, rng: random.Random):
+        self.population = list(range(1, n + 1))
+        self.cum_weights = list(itertools.accumulate(1 / rank ** s for rank in self.population))
+        self.rng = rng
+
+    def sample(self) -> int:
+        return self.rng.choices(self.population, cum_weights=self.cum_weights)[0]
+
+
+@dataclass
+class SeededConversation:
+    conversation_id: uuid.UUID
+    users: Tuple[int, int]
+    message_count: int
+    first_message_at: datetime
+    last_message_at: datetime
+
+
+@dataclass
+class Workload:
+    """Seeded dataset plus the request generator that runs against it."""
+
+    users: int = 1000
+    conversations: int = 2000
+    mean_messages: int = 50
+    max_messages: int = 5000
+    zipf_s: float = 1.1
+    mix: Dict[str, float] = field(default_factory=lambda: {
+        "send": 0.3, "inbox": 0.3, "history": 0.3, "before": 0.1,
+    })
+    page_size: int = 20
+    seed: int = 42
+
+    def __post_init__(self):
+        self.rng = random.Random(self.seed)
+        self.user_sampler = ZipfSampler(self.users, self.zipf_s, self.rng)
+        self.seeded: List[SeededConversation] = []
+        self.conversation_sampler = None
+
+    def user_pair(self) -> Tuple[int, int]:
+        sender = self.user_sampler.sample()
+        receiver = self.user_sampler.sample()
+        while receiver == sender:
+            receiver = self.user_sampler.sample()
+        return sender, receiver
+
+    def conversation_size(self) -> int:
+        # Pareto with alpha 1.5 has mean 3; scale it to the requested mean.
+        size = int(self.rng.paretovariate(1.5) * self.mean_messages / 3)
+        return max(1, min(self.max_messages, size))
+
+    async def seed_data(self) -> int:
+        """Write the dataset through the models; returns messages written."""
+        written = 0
+        seen_pairs = set()
+        while len(self.seeded) < self.conversations:
+            sender, receiver = self.user_pair()
+            pair = (min(sender, receiver), max(sender, receiver))
+            if pair in seen_pairs:
+                continue
+            seen_pairs.add(pair)
+
+            conversation = await ConversationModel.create_or_get_conversation(sender, receiver)
+            conversation_id = conversation["conversation_id"]
+
+            messages = []
+            for i in range(self.conversation_size()):
+                from_user, to_user = (sender, receiver) if i % 2 == 0 else (receiver, sender)
+                messages.append(MessageModel.build_message(
+                    conversation_id, from_user, to_user, f"seed message {i}"
+                ))
+            for start in range(0, len(messages), 100):
+                await MessageModel.write_messages(conversation_id, messages[start:start + 100])
+            written += len(messages)
+
+            self.seeded.append(SeededConversation(
+                conversation_id, pair, len(messages), messages[0]["created_at"], messages[-1]["created_at"]
+            ))
+
+        # Rank conversations by size so the Zipf head of history reads lands
+        # on the largest partitions, as it does for busy real threads.
+        self.seeded.sort(key=lambda c: c.message_count, reverse=True)
+        self.conversation_sampler = ZipfSampler(len(self.seeded), self.zipf_s, self.rng)
+        return written
+
+    def next_request(self) -> Tuple[str, str, str, dict]:
+        """Pick the next request as (operation, method, path, kwargs for httpx)."""
+        operation = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+
+        if operation == "send":
+            sender, receiver = self.user_pair()
+            return operation, "POST", "/api/messages/", {"json": {
+                "content": f"bench message {self.rng.random()}",
+                "sender_id": sender,
+                "receiver_id": receiver,
+            }}
+
+        if operation == "inbox":
+            user_id = self.user_sampler.sample()
+            return operation, "GET", f"/api/conversations/user/{user_id}", {
+                "params": {"limit": self.page_size},
+            }
+
+        conversation = self.seeded[self.conversation_sampler.sample() - 1]
+        path = f"/api/messages/conversation/{conversation.conversation_id}"
+        if operation == "history":
+            return operation, "GET", path, {"params": {"limit": self.page_size}}
+
+        before = conversation.first_message_at + (
+            conversation.last_message_at - conversation.first_message_at
+        ) * self.rng.random()
+        return operation, "GET", f"{path}/before", {"params": {
+            "before_timestamp": before.isoformat(),
+            "limit": self.page_size,
+        }}
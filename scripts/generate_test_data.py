@@ -1,141 +1,292 @@
 """
-Cassandra client for the Messenger application.
-This provides a connection to the Cassandra database.
-"""
+Script to generate test data for the Messenger application.
+
+Writes conversations and messages straight to Cassandra with prepared
+statements and the driver's concurrent execution helpers, so production-
+sized datasets can be seeded in minutes rather than through the HTTP API.
 
+Usage:
+    python scripts/generate_test_data.py
+    python scripts/generate_test_data.py --users 100000 --conversations 500000 --messages-per-conversation 20
+"""
+import argparse
 import os
+import random
+import sys
+import time
 import uuid
-from typing import List, Dict, Any, Optional
-from datetime import datetime
 import logging
+from collections import Counter
+from datetime import datetime, timedelta
 
-from cassandra.cluster import Cluster, Session
-from cassandra.auth import PlainTextAuthProvider
-from cassandra.query import SimpleStatement, dict_factory
-from cassandra.policies import DCAwareRoundRobinPolicy
+from cassandra.cluster import Cluster
+from cassandra.concurrent import execute_concurrent, execute_concurrent_with_args
+from cassandra.query import BatchStatement, BatchType
+
+# Run as a file from the repository root, so app is not importable yet.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.cassandra_client import CassandraClient
+from app.services.search import SEARCH_INDEX_ENABLED, tokenize
 
-logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MESSAGE_BUCKET = os.getenv("MESSAGE_BUCKET", "none")
+
+# Same bucket numbers as app.db.cassandra_storage.
+BUCKET_FORMATS = {"day": "%Y%m%d", "month": "%Y%m"}
+
+SAMPLE_MESSAGES = [
+    "Hey, how are you?",
+    "Are we still on for tomorrow?",
+    "Just saw your message, will reply soon.",
+    "Can you send me the notes from the meeting?",
+    "Happy birthday!",
+    "Running a bit late, sorry.",
+    "That sounds great, let's do it.",
+    "Did you watch the game last night?",
+    "Thanks for your help today.",
+    "Call me when you get a chance.",
+]
+
+
+def connect():
+    """
+    Connect to the messenger keyspace with the application's cluster
+    profile: contact points, local DC routing, authentication, protocol
+    version and timeouts all come from the same environment.
+    """
+    client = CassandraClient()
+    cluster = Cluster(execution_profiles=client.execution_profiles(), **client.cluster_options())
+    session = cluster.connect(client.keyspace)
+    logger.info(
+        f"Connected to Cassandra at {','.join(client.hosts)}:{client.port}, keyspace: {client.keyspace}, "
+        f"local DC: {client.local_dc or 'from contact points'}"
+    )
+    return cluster, session
+
+
+def prepare_statements(session):
+    """Prepare every insert used by the generator once."""
+    return {
+        "message": session.prepare("""
+            INSERT INTO messages_by_conversation
+            (conversation_id, message_timestamp, message_id, sender_id, recipient_id, content)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """),
+        "bucketed_message": session.prepare("""
+            INSERT INTO messages_by_conversation_bucket
+            (conversation_id, bucket, message_timestamp, message_id, sender_id, recipient_id, content)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """),
+        "posting": session.prepare("""
+            INSERT INTO message_search_index
+            (user_id, term, message_timestamp, message_id, conversation_id)
+            VALUES (?, ?, ?, ?, ?)
+        """),
+        "bucket": session.prepare("""
+            INSERT INTO message_buckets (conversation_id, bucket)
+            VALUES (?, ?)
+        """),
+        "conversation": session.prepare("""
+            INSERT INTO user_conversations
+            (conversation_id, list_of_users, last_message_content, last_message_at, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """),
+        "inbox": session.prepare("""
+            INSERT INTO conversations_by_user
+            (user_id, last_message_at, conversation_id, other_user_id, last_message_content)
+            VALUES (?, ?, ?, ?, ?)
+        """),
+        "pair": session.prepare("""
+            INSERT INTO conversations_by_pair
+            (user_low, user_high, conversation_id, created_at)
+            VALUES (?, ?, ?, ?)
+        """),
+        "message_count": session.prepare("""
+            UPDATE message_counts
+            SET message_count = message_count + ?
+            WHERE conversation_id = ?
+        """),
+        "conversation_count": session.prepare("""
+            UPDATE conversation_counts
+            SET conversation_count = conversation_count + ?
+            WHERE user_id = ?
+        """),
+        "unread_count": session.prepare("""
+            UPDATE unread_counts
+            SET unread_count = unread_count + ?
+            WHERE user_id = ? AND conversation_id = ?
+        """),
+    }
+
+
+def generate_pairs(rng, users, conversations):
+    """Pick distinct unordered user pairs, returned as (low, high)."""
+    max_pairs = users * (users - 1) // 2
+    if conversations > max_pairs:
+        raise ValueError(f"{users} users only allow {max_pairs} distinct conversations")
+
+    pairs = set()
+    while len(pairs) < conversations:
+        user1, user2 = rng.sample(range(1, users + 1), 2)
+        pairs.add((min(user1, user2), max(user1, user2)))
+    return list(pairs)
+
+
+def message_batches(rng, statements, pairs, mean_messages, days, batch_size, bucket_granularity, search_index,
+                    summaries, buckets):
+    """
+    Yield one unlogged batch per chunk of a conversation's messages.
+
+    Every batch targets a single partition, so it is applied as one
+    mutation; with bucketing, a batch is also cut where the bucket changes
+    and every bucket used is recorded in buckets. The latest message of
+    each conversation is recorded in summaries for the conversation tables.
+    With search_index, the search postings of every message are yielded
+    as single inserts, since each (user, term) is its own partition.
+    """
+    now = datetime.utcnow()
+    span = timedelta(days=days).total_seconds()
+
+    for user_low, user_high in pairs:
+        conversation_id = uuid.uuid4()
+        count = max(1, int(rng.expovariate(1 / mean_messages)))
+        timestamps = sorted(
+            now - timedelta(seconds=rng.random() * span) for _ in range(count)
+        )
+
+        batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+        batch_bucket = None
+        content = None
+        received = Counter()
+        for timestamp in timestamps:
+            sender_id, recipient_id = rng.choice(((user_low, user_high), (user_high, user_low)))
+            received[recipient_id] += 1
+            content = rng.choice(SAMPLE_MESSAGES)
+            message_id = uuid.uuid4()
+            if search_index:
+                for term in tokenize(content):
+                    for user_id in (user_low, user_high):
+                        yield statements["posting"], (user_id, term, timestamp, message_id, conversation_id)
+            if bucket_granularity == "none":
+                batch.add(statements["message"], (
+                    conversation_id, timestamp, message_id, sender_id, recipient_id, content
+                ))
+            else:
+                bucket = int(timestamp.strftime(BUCKET_FORMATS[bucket_granularity]))
+                if bucket != batch_bucket:
+                    if len(batch):
+                        yield batch, ()
+                        batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+                    batch_bucket = bucket
+                    buckets.append((conversation_id, bucket))
+                batch.add(statements["bucketed_message"], (
+                    conversation_id, bucket, timestamp, message_id, sender_id, recipient_id, content
+                ))
+            if len(batch) >= batch_size:
+                yield batch, ()
+                batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+        if len(batch):
+            yield batch, ()
+
+        summaries.append((conversation_id, user_low, user_high, timestamps[0], timestamps[-1], content, received, count))
+
+
+def write_conversations(session, statements, summaries, buckets, concurrency):
+    """
+    Write the conversation, inbox and pair rows for generated conversations,
+    register their message buckets, and add them to the message,
+    conversation and unread counters. Generated messages are all unread.
+    """
+    conversations = []
+    inboxes = []
+    pairs = []
+    message_counts = []
+    unread_counts = []
+    user_counts = Counter()
+    for conversation_id, user_low, user_high, created_at, last_at, content, received, count in summaries:
+        conversations.append((conversation_id, [user_low, user_high], content, last_at, created_at))
+        inboxes.append((user_low, last_at, conversation_id, user_high, content))
+        inboxes.append((user_high, last_at, conversation_id, user_low, content))
+        pairs.append((user_low, user_high, conversation_id, created_at))
+        message_counts.append((count, conversation_id))
+        unread_counts.extend((unread, user_id, conversation_id) for user_id, unread in received.items())
+        user_counts.update((user_low, user_high))
+    conversation_counts = [(count, user_id) for user_id, count in user_counts.items()]
+
+    for name, params in (
+        ("conversation", conversations),
+        ("inbox", inboxes),
+        ("pair", pairs),
+        ("bucket", buckets),
+        ("message_count", message_counts),
+        ("conversation_count", conversation_counts),
+        ("unread_count", unread_counts),
+    ):
+        # Results stream back as requests finish; draining them waits for
+        # the last one without holding every result in memory.
+        for _ in execute_concurrent_with_args(
+            session, statements[name], params, concurrency=concurrency, results_generator=True
+        ):
+            pass
+        logger.info(f"Wrote {len(params)} {name} rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10, help="Number of users, with IDs 1..N")
+    parser.add_argument("--conversations", type=int, default=15, help="Number of conversations between random user pairs")
+    parser.add_argument("--messages-per-conversation", type=int, default=20,
+                        help="Mean messages per conversation (exponentially distributed)")
+    parser.add_argument("--days", type=int, default=30, help="Spread message timestamps over the last N days")
+    parser.add_argument("--concurrency", type=int, default=100, help="Maximum in-flight requests")
+    parser.add_argument("--batch-size", type=int, default=50, help="Messages per single-partition batch")
+    parser.add_argument("--bucket", choices=("none", "day", "month"), default=MESSAGE_BUCKET,
+                        help="Message partition bucketing, matching the application's MESSAGE_BUCKET")
+    parser.add_argument("--search-index", action=argparse.BooleanOptionalAction, default=SEARCH_INDEX_ENABLED,
+                        help="Write message search postings, matching the application's SEARCH_INDEX_ENABLED")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for a reproducible dataset")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pairs = generate_pairs(rng, args.users, args.conversations)
+
+    cluster, session = connect()
+    try:
+        statements = prepare_statements(session)
+        summaries = []
+        buckets = []
+
+        started = time.perf_counter()
+        for _ in execute_concurrent(
+            session,
+            message_batches(
+                rng, statements, pairs, args.messages_per_conversation,
+                args.days, args.batch_size, args.bucket, args.search_index, summaries, buckets,
+            ),
+            concurrency=args.concurrency,
+            raise_on_first_error=True,
+            results_generator=True,
+        ):
+            pass
+        message_elapsed = time.perf_counter() - started
+        messages = sum(summary[-1] for summary in summaries)
+        logger.info(
+            f"Wrote {messages} messages in {message_elapsed:.1f}s "
+            f"({messages / message_elapsed:.0f} messages/s)"
+        )
+
+        write_conversations(session, statements, summaries, buckets, args.concurrency)
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Generated {len(summaries)} conversations and {messages} messages "
+            f"for {args.users} users in {elapsed:.1f}s"
+        )
+    finally:
+        cluster.shutdown()
 
 
-class CassandraClient:
-    """Singleton Cassandra client for the application."""
-
-    _instance = None
-
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(CassandraClient, cls).__new__(cls)
-            cls._instance._initialized = False
-        return cls._instance
-
-    def __init__(self):
-        """Initialize the Cassandra connection."""
-        if self._initialized:
-            return
-
-        self.host = os.getenv("CASSANDRA_HOST", "localhost")
-        self.port = int(os.getenv("CASSANDRA_PORT", "9042"))
-        self.keyspace = os.getenv("CASSANDRA_KEYSPACE", "messenger")
-        self.local_dc = os.getenv("CASSANDRA_LOCAL_DC", "datacenter1")
-
-        self.cluster = None
-        self.session = None
-
-        logger.info("Connecting to Cassandra...")
-        self.connect()
-
-        self._initialized = True
-
-    def connect(self) -> None:
-        """Connect to the Cassandra cluster."""
-        try:
-            # Optional: Use auth if credentials are provided
-            auth_provider = None
-            username = os.getenv("CASSANDRA_USERNAME")
-            password = os.getenv("CASSANDRA_PASSWORD")
-            if username and password:
-                auth_provider = PlainTextAuthProvider(username=username, password=password)
-
-            self.cluster = Cluster(
-                [self.host],
-                port=self.port,
-                auth_provider=auth_provider,
-                load_balancing_policy=DCAwareRoundRobinPolicy(local_dc=self.local_dc),
-                protocol_version=5  # Avoid protocol downgrade warnings
-            )
-
-            # First connect without a keyspace to create it if needed
-            system_session = self.cluster.connect()
-            system_session.execute(f"""
-                CREATE KEYSPACE IF NOT EXISTS {self.keyspace}
-                WITH replication = {{ 'class': 'SimpleStrategy', 'replication_factor': 1 }}
-            """)
-
-            self.session = self.cluster.connect(self.keyspace)
-            self.session.row_factory = dict_factory
-
-            logger.info(f"Connected to Cassandra at {self.host}:{self.port}, keyspace: {self.keyspace}")
-
-        except Exception as e:
-            logger.error(f"Failed to connect to Cassandra: {str(e)}")
-            raise
-
-    def close(self) -> None:
-        """Close the Cassandra connection."""
-        if self.cluster:
-            self.cluster.shutdown()
-            logger.info("Cassandra connection closed")
-
-    def execute(self, query: str, params: dict = None) -> List[Dict[str, Any]]:
-        """
-        Execute a CQL query.
-
-        Args:
-            query: The CQL query string
-            params: The parameters for the query
-
-        Returns:
-            List of rows as dictionaries
-        """
-        if not self.session:
-            self.connect()
-
-        try:
-            statement = SimpleStatement(query)
-            result = self.session.execute(statement, params or {})
-            return list(result)
-        except Exception as e:
-            logger.error(f"Query execution failed: {str(e)}")
-            raise
-
-    def execute_async(self, query: str, params: dict = None):
-        """
-        Execute a CQL query asynchronously.
-
-        Args:
-            query: The CQL query string
-            params: The parameters for the query
-
-        Returns:
-            Async result object
-        """
-        if not self.session:
-            self.connect()
-
-        try:
-            statement = SimpleStatement(query)
-            return self.session.execute_async(statement, params or {})
-        except Exception as e:
-            logger.error(f"Async query execution failed: {str(e)}")
-            raise
-
-    def get_session(self) -> Session:
-        """Get the Cassandra session."""
-        if not self.session:
-            self.connect()
-        return self.session
-
-
-# Create a global instance
-cassandra_client = CassandraClient()
+if __name__ == "__main__":
+    main()
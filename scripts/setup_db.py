@@ -1,11 +1,14 @@
 """
 Script to initialize Cassandra keyspace and tables for the Messenger application.
 """
+import calendar
 import os
 import time
 import logging
 from cassandra.cluster import Cluster
 from cassandra.auth import PlainTextAuthProvider
+from cassandra.concurrent import execute_concurrent_with_args
+from cassandra.query import SimpleStatement
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -36,14 +39,9 @@ def wait_for_cassandra():
 def create_keyspace(session):
     """
     Create the keyspace if it doesn't exist.
-    
-    This is where students will define the keyspace configuration.
     """
     logger.info(f"Creating keyspace {CASSANDRA_KEYSPACE} if it doesn't exist...")
     
-    # TODO: Students should implement keyspace creation
-    # Hint: Consider replication strategy and factor for a distributed database
-    
     session.execute(f"""
         CREATE KEYSPACE IF NOT EXISTS {CASSANDRA_KEYSPACE} 
         WITH REPLICATION = {{ 'class': 'SimpleStrategy', 'replication_factor': 1 }}
@@ -57,18 +55,11 @@ def create_keyspace(session):
 
 def create_tables(session):
     """
-    Create the tables for the application.
-    
-    This is where students will define the table schemas based on the requirements.
+    Create the tables for the application; see SCHEMA.MD for the access
+    pattern each one serves.
     """
     logger.info("Creating tables...")
     
-    # TODO: Students should implement table creation
-    # Hint: Consider:
-    # - What tables are needed to implement the required APIs?
-    # - What should be the primary keys and clustering columns?
-    # - How will you handle pagination and time-based queries?
-    
     # CREATE TABLE IF NOT EXISTS messages_by_conversation 
     session.execute("""CREATE TABLE IF NOT EXISTS messages_by_conversation (
         conversation_id UUID,
@@ -81,6 +72,30 @@ def create_tables(session):
         WITH CLUSTERING ORDER BY (message_timestamp DESC, message_id ASC);
     """)
     
+    # Bucketed alternative to messages_by_conversation, used when
+    # MESSAGE_BUCKET is "day" or "month": one partition per conversation and
+    # bucket (e.g. 202610) keeps partitions bounded for long-lived threads.
+    session.execute("""CREATE TABLE IF NOT EXISTS messages_by_conversation_bucket (
+        conversation_id UUID,
+        bucket INT,
+        message_timestamp TIMESTAMP,
+        message_id UUID,
+        sender_id INT,
+        recipient_id INT,
+        content TEXT,
+        PRIMARY KEY ((conversation_id, bucket), message_timestamp, message_id))
+        WITH CLUSTERING ORDER BY (message_timestamp DESC, message_id ASC);
+    """)
+    
+    # Buckets that hold messages of each conversation, newest first, so reads
+    # can walk them without probing empty buckets.
+    session.execute("""CREATE TABLE IF NOT EXISTS message_buckets (
+        conversation_id UUID,
+        bucket INT,
+        PRIMARY KEY ((conversation_id), bucket))
+        WITH CLUSTERING ORDER BY (bucket DESC);
+    """)
+    
     session.execute("""CREATE TABLE IF NOT EXISTS user_conversations (
         conversation_id UUID PRIMARY KEY,
         list_of_users LIST<INT>,
@@ -90,9 +105,127 @@ def create_tables(session):
     );
     """)
     
+    # Per-user inbox, newest activity first. Rows are re-keyed (delete + insert)
+    # on every message because last_message_at is part of the clustering key.
+    session.execute("""CREATE TABLE IF NOT EXISTS conversations_by_user (
+        user_id INT,
+        last_message_at TIMESTAMP,
+        conversation_id UUID,
+        other_user_id INT,
+        last_message_content TEXT,
+        PRIMARY KEY ((user_id), last_message_at, conversation_id))
+        WITH CLUSTERING ORDER BY (last_message_at DESC, conversation_id ASC);
+    """)
+    
+    # One row per unordered user pair, written with IF NOT EXISTS so two
+    # concurrent first messages agree on a single conversation.
+    session.execute("""CREATE TABLE IF NOT EXISTS conversations_by_pair (
+        user_low INT,
+        user_high INT,
+        conversation_id UUID,
+        created_at TIMESTAMP,
+        PRIMARY KEY ((user_low, user_high))
+    );
+    """)
+    
+    # Per-user inverted index for message search: one partition per user and
+    # term, newest message first. Rows reference messages_by_conversation.
+    session.execute("""CREATE TABLE IF NOT EXISTS message_search_index (
+        user_id INT,
+        term TEXT,
+        message_timestamp TIMESTAMP,
+        message_id UUID,
+        conversation_id UUID,
+        PRIMARY KEY ((user_id, term), message_timestamp, message_id))
+        WITH CLUSTERING ORDER BY (message_timestamp DESC, message_id ASC);
+    """)
+    
+    # Totals for paginated responses, maintained on write so they are read
+    # in O(1) instead of counting the partitions.
+    session.execute("""CREATE TABLE IF NOT EXISTS message_counts (
+        conversation_id UUID PRIMARY KEY,
+        message_count COUNTER
+    );
+    """)
+    
+    session.execute("""CREATE TABLE IF NOT EXISTS conversation_counts (
+        user_id INT PRIMARY KEY,
+        conversation_count COUNTER
+    );
+    """)
+    
+    # Unread messages per user and conversation, one partition per user so a
+    # whole inbox's badges are a single read.
+    session.execute("""CREATE TABLE IF NOT EXISTS unread_counts (
+        user_id INT,
+        conversation_id UUID,
+        unread_count COUNTER,
+        PRIMARY KEY ((user_id), conversation_id)
+    );
+    """)
+    
+    # Last message each user read per conversation, moved with LWTs.
+    session.execute("""CREATE TABLE IF NOT EXISTS read_markers (
+        user_id INT,
+        conversation_id UUID,
+        last_read_at TIMESTAMP,
+        last_read_message_id UUID,
+        PRIMARY KEY ((user_id), conversation_id)
+    );
+    """)
+    
 
     logger.info("Tables created successfully.")
 
+def write_timestamp(timestamp):
+    """Same write timestamps as app.db.cassandra_storage.write_timestamp."""
+    return calendar.timegm(timestamp.utctimetuple()) * 1_000_000 + timestamp.microsecond
+
+def backfill_conversation_lookups(session):
+    """
+    Index conversations written before conversations_by_pair and
+    conversations_by_user existed, so an existing pair keeps its
+    conversation instead of getting a second one on its next message.
+    
+    Safe to re-run: pairs are claimed with IF NOT EXISTS, so a claim made
+    by the application wins, and inbox rows carry the write timestamp of
+    their last_message_at, so a row the application has since re-keyed
+    stays deleted.
+    """
+    logger.info("Backfilling conversation lookup tables...")
+    pair_query = session.prepare("""
+        INSERT INTO conversations_by_pair (user_low, user_high, conversation_id, created_at)
+        VALUES (?, ?, ?, ?)
+        IF NOT EXISTS
+    """)
+    inbox_query = session.prepare("""
+        INSERT INTO conversations_by_user
+        (user_id, last_message_at, conversation_id, other_user_id, last_message_content)
+        VALUES (?, ?, ?, ?, ?)
+        USING TIMESTAMP ?
+    """)
+    
+    pairs = []
+    inbox_rows = []
+    rows = session.execute(SimpleStatement(
+        "SELECT conversation_id, list_of_users, created_at, last_message_at, last_message_content FROM user_conversations",
+        fetch_size=1000,
+    ))
+    for conversation_id, users, created_at, last_message_at, content in rows:
+        if not users or len(set(users)) != 2 or last_message_at is None:
+            continue
+        user_low, user_high = sorted(set(users))
+        pairs.append((user_low, user_high, conversation_id, created_at or last_message_at))
+        for user_id, other_user_id in ((user_low, user_high), (user_high, user_low)):
+            inbox_rows.append((
+                user_id, last_message_at, conversation_id, other_user_id, content,
+                write_timestamp(last_message_at),
+            ))
+    
+    execute_concurrent_with_args(session, pair_query, pairs, concurrency=50, raise_on_first_error=True)
+    execute_concurrent_with_args(session, inbox_query, inbox_rows, concurrency=50, raise_on_first_error=True)
+    logger.info(f"Backfilled {len(pairs)} conversations.")
+
 def main():
     """Initialize the database."""
     logger.info("Starting Cassandra initialization...")
@@ -108,6 +241,7 @@ def main():
         create_keyspace(session)
         session.set_keyspace(CASSANDRA_KEYSPACE)
         create_tables(session)
+        backfill_conversation_lookups(session)
         
         logger.info("Cassandra initialization completed successfully.")
     except Exception as e:
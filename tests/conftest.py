@@ -0,0 +1,48 @@
+"""
+Test fixtures. The API runs on the in-memory storage backend, with fresh
+storage and caches for every test, so no Cassandra cluster is needed.
+"""
+import os
+
+os.environ["STORAGE_BACKEND"] = "memory"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db import storage
+from app.db.cache import conversation_cache, conversation_pair_cache, message_clock_cache
+from app.main import app
+
+
+@pytest.fixture(autouse=True)
+def fresh_storage():
+    storage._storage = None
+    conversation_cache.clear()
+    conversation_pair_cache.clear()
+    message_clock_cache.clear()
+    yield
+    storage._storage = None
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def messages(client):
+    """
+    Ten messages alternating between users 1 and 2, oldest first. They are
+    sent as one batch, so their timestamps are distinct and increasing.
+    """
+    response = client.post("/api/messages/batch", json={
+        "messages": [
+            {"content": f"message {i}", "sender_id": 1 + i % 2, "receiver_id": 2 - i % 2}
+            for i in range(10)
+        ]
+    })
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert all(result["status_code"] == 201 for result in results)
+    return [result["message"] for result in results]
@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from app.models.cassandra_models import ConversationModel
+
+
+def send_batch(client, *items):
+    response = client.post("/api/messages/batch", json={
+        "messages": [
+            {"content": content, "sender_id": sender_id, "receiver_id": receiver_id}
+            for sender_id, receiver_id, content in items
+        ]
+    })
+    assert response.status_code == 200
+    return response.json()["results"]
+
+
+def test_batch_results_are_in_request_order(client):
+    results = send_batch(client, (1, 2, "a"), (3, 4, "b"), (2, 1, "c"))
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert [result["message"]["content"] for result in results] == ["a", "b", "c"]
+    assert results[0]["message"]["conversation_id"] == results[2]["message"]["conversation_id"]
+    assert results[0]["message"]["conversation_id"] != results[1]["message"]["conversation_id"]
+
+
+def test_batch_timestamps_follow_send_order(client, messages):
+    stamps = [datetime.fromisoformat(message["created_at"]) for message in messages]
+    assert stamps == sorted(stamps)
+    assert len(set(stamps)) == len(stamps)
+
+
+def test_message_after_a_batch_is_stamped_after_it(client, messages):
+    response = client.post("/api/messages/", json={"content": "later", "sender_id": 1, "receiver_id": 2})
+    assert datetime.fromisoformat(response.json()["created_at"]) > datetime.fromisoformat(messages[-1]["created_at"])
+
+    after = client.get(
+        f"/api/messages/conversation/{messages[0]['conversation_id']}/after",
+        params={"after_timestamp": messages[-1]["created_at"]},
+    ).json()
+    assert [message["content"] for message in after["data"]] == ["later"]
+
+
+def test_unresolved_pair_fails_only_its_items(client, monkeypatch):
+    create_or_get_conversation = ConversationModel.create_or_get_conversation
+
+    async def failing_for_pair_3_4(user1, user2):
+        if {user1, user2} == {3, 4}:
+            raise RuntimeError("pair claim timed out")
+        return await create_or_get_conversation(user1, user2)
+
+    monkeypatch.setattr(ConversationModel, "create_or_get_conversation", failing_for_pair_3_4)
+    results = send_batch(client, (1, 2, "a"), (3, 4, "b"), (4, 3, "c"), (2, 1, "d"))
+
+    assert [result["status_code"] for result in results] == [201, 500, 500, 201]
+    assert results[1]["message"] is None and results[1]["error"]
+    assert [result["message"]["content"] for result in results if result["message"]] == ["a", "d"]
+
+    conversation_id = results[0]["message"]["conversation_id"]
+    history = client.get(f"/api/messages/conversation/{conversation_id}").json()
+    assert sorted(message["content"] for message in history["data"]) == ["a", "d"]
+    assert client.get("/api/conversations/user/3").json()["total"] == 0
@@ -0,0 +1,77 @@
+import asyncio
+
+from app.db import cache
+from app.db.cache import LRUCache, conversation_cache
+from app.db.storage import get_storage
+from app.models.cassandra_models import ConversationModel, MessageModel
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_least_recently_used_entry_is_evicted():
+    lru = LRUCache(max_size=2, ttl=60)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert (lru.get("a"), lru.get("c")) == (1, 3)
+    assert lru.stats()["size"] == 2
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    lru = LRUCache(max_size=10, ttl=5)
+    lru.set("a", 1)
+    clock.now = 4.9
+    assert lru.get("a") == 1
+    clock.now = 5.0
+    assert lru.get("a") is None
+    assert lru.stats() == {"size": 0, "max_size": 10, "hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_zero_size_cache_stores_nothing():
+    lru = LRUCache(max_size=0, ttl=60)
+    lru.set("a", 1)
+    assert lru.get("a") is None
+
+
+def test_cached_conversation_is_not_replaced_by_an_older_version():
+    conversation = {"conversation_id": "c", "last_message_at": 2}
+    ConversationModel.cache_conversation(conversation)
+    ConversationModel.cache_conversation({"conversation_id": "c", "last_message_at": 1})
+    assert conversation_cache.get("c") is conversation
+
+
+def test_sends_read_the_conversation_from_storage_only_on_a_cache_miss(monkeypatch):
+    storage = get_storage()
+    get_conversation = storage.get_conversation
+    reads = []
+
+    async def counted_get_conversation(conversation_id):
+        reads.append(conversation_id)
+        return await get_conversation(conversation_id)
+
+    monkeypatch.setattr(storage, "get_conversation", counted_get_conversation)
+
+    async def run():
+        conversation = await ConversationModel.create_or_get_conversation(1, 2)
+        conversation_id = conversation["conversation_id"]
+        for i in range(3):
+            await MessageModel.create_message(conversation_id, 1, 2, f"message {i}")
+        cached_reads = len(reads)
+        conversation_cache.clear()
+        await MessageModel.create_message(conversation_id, 2, 1, "after a miss")
+        return cached_reads, len(reads), await storage.get_user_conversations(1)
+
+    cached_reads, total_reads, inbox = asyncio.run(run())
+    assert cached_reads == 0
+    assert total_reads == 1
+    assert [row["last_message_content"] for row in inbox] == ["after a miss"]
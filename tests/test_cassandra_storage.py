@@ -0,0 +1,172 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.db.cassandra_storage import (
+    CassandraStorage, decode_bucket_state, decode_inbox_state, encode_bucket_state, encode_inbox_state,
+    message_bucket, write_timestamp,
+)
+from app.models.cassandra_models import decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize("paging_state", [b"\x00\x01driver state", b"\xff" * 40])
+def test_bucket_state_round_trip(paging_state):
+    assert decode_bucket_state(encode_bucket_state(202610, paging_state)) == (202610, paging_state)
+
+
+@pytest.mark.parametrize("paging_state", [None, b""])
+def test_bucket_state_without_driver_state(paging_state):
+    state = encode_bucket_state(20261018, paging_state)
+    assert len(state) == 4
+    assert decode_bucket_state(state) == (20261018, None)
+
+
+def test_bucket_state_survives_the_cursor_encoding():
+    state = encode_bucket_state(202610, b"driver state")
+    assert decode_bucket_state(decode_cursor(encode_cursor(state))) == (202610, b"driver state")
+
+
+@pytest.mark.parametrize("state", [b"", b"\x00\x01\x02"])
+def test_truncated_bucket_state_is_rejected(state):
+    with pytest.raises(ValueError):
+        decode_bucket_state(state)
+
+
+def test_message_bucket():
+    timestamp = datetime(2026, 10, 18, 23, 59)
+    assert message_bucket(timestamp, "day") == 20261018
+    assert message_bucket(timestamp, "month") == 202610
+
+
+def test_message_bucket_is_the_utc_date():
+    local = datetime(2026, 11, 1, 1, 0, tzinfo=timezone(timedelta(hours=5)))
+    assert message_bucket(local, "day") == 20261031
+    assert message_bucket(local, "month") == 202610
+
+
+def test_write_timestamp_is_microseconds_since_the_epoch():
+    assert write_timestamp(datetime(1970, 1, 1, 0, 0, 1, 5)) == 1_000_005
+    later = datetime(2026, 10, 18, 12, 0, 0, 1)
+    assert write_timestamp(later) - write_timestamp(later - timedelta(milliseconds=1)) == 1000
+
+
+def test_inbox_row_moves_to_the_new_timestamp():
+    conversation_id = uuid.uuid4()
+    previous = datetime(2026, 10, 18, 12, 0, 0, 4_999)
+    message_at = previous + timedelta(microseconds=2)
+    statements = CassandraStorage.inbox_statements(conversation_id, [1, 2], previous, message_at, "hi")
+    deletes = [params for query, params in statements if "DELETE" in query]
+    assert [params[1:3] for params in deletes] == [(1, previous), (2, previous)]
+
+
+def test_inbox_row_in_the_same_millisecond_is_only_overwritten():
+    # A delete and an insert of the same row at one write timestamp would
+    # leave the tombstone, and the conversation would vanish from the inbox.
+    previous = datetime(2026, 10, 18, 12, 0, 0, 5_100)
+    message_at = previous.replace(microsecond=5_900)
+    statements = CassandraStorage.inbox_statements(uuid.uuid4(), [1, 2], previous, message_at, "hi")
+    assert not any("DELETE" in query for query, _ in statements)
+    assert len(statements) == 2
+
+
+class ScriptedClient:
+    """Stands in for cassandra_client, answering queries from a script in order."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.queries = []
+
+    async def aexecute(self, query, params=(), row_factory="dict"):
+        self.queries.append((" ".join(query.split()), params))
+        return self.results.pop(0)
+
+
+def test_read_marker_with_a_timezone_offset(monkeypatch):
+    conversation_id = uuid.uuid4()
+    stored = {"last_read_at": datetime(2026, 10, 18, 9, 0), "last_read_message_id": uuid.uuid4()}
+    client = ScriptedClient([stored], [{"[applied]": True}], [{"unread_count": 3}], [])
+    monkeypatch.setattr("app.db.cassandra_storage.cassandra_client", client)
+    storage = CassandraStorage()
+
+    async def no_messages_after(user_id, conversation_id, after):
+        return 0
+
+    monkeypatch.setattr(storage, "count_received_after", no_messages_after)
+    message_at = datetime(2026, 10, 18, 12, 0, tzinfo=timezone(timedelta(hours=2)))
+    marker = asyncio.run(storage.mark_conversation_read(2, conversation_id, message_at, uuid.uuid4()))
+
+    assert marker["last_read_at"] == datetime(2026, 10, 18, 10, 0)
+    assert marker["unread_count"] == 0
+    update_params = client.queries[1][1]
+    assert update_params[0] == datetime(2026, 10, 18, 10, 0)
+
+
+def test_unread_recount_is_bounded(monkeypatch):
+    monkeypatch.setenv("MESSAGE_COUNT_SCAN_LIMIT", "600")
+    storage = CassandraStorage()
+    pages = []
+
+    async def get_messages_after_page(conversation_id, after, limit, paging_state=None):
+        pages.append(paging_state)
+        return [{"receiver_id": 2}] * limit, b"more"
+
+    monkeypatch.setattr(storage, "get_messages_after_page", get_messages_after_page)
+    assert asyncio.run(storage.count_received_after(2, uuid.uuid4(), datetime(2026, 1, 1))) is None
+    assert len(pages) == 2
+
+
+class InboxPartition:
+    """Stands in for cassandra_client, serving one conversations_by_user partition read in reverse."""
+
+    def __init__(self, rows):
+        # Clustering order is last_message_at DESC, conversation_id ASC.
+        rows = sorted(rows, key=lambda row: row["conversation_id"])
+        self.rows = sorted(rows, key=lambda row: row["last_message_at"], reverse=True)
+
+    async def aexecute_page(self, query, params, fetch_size=20, paging_state=None, row_factory="dict"):
+        user_id, bound = params
+        inclusive = "last_message_at >= ?" in query
+        rows = [
+            row for row in reversed(self.rows)
+            if row["last_message_at"] > bound or (inclusive and row["last_message_at"] == bound)
+        ]
+        start = int(paging_state or 0)
+        end = start + fetch_size
+        return rows[start:end], (str(end).encode() if end < len(rows) else None)
+
+
+def test_inbox_sync_pages_through_equal_timestamps(monkeypatch):
+    message_at = datetime(2026, 10, 18, 12, 0)
+    rows = [
+        {"conversation_id": uuid.uuid4(), "other_user_id": other, "last_message_at": message_at + timedelta(seconds=other // 4),
+         "last_message_content": "hi"}
+        for other in range(2, 12)
+    ]
+    monkeypatch.setattr("app.db.cassandra_storage.cassandra_client", InboxPartition(rows))
+    storage = CassandraStorage()
+
+    pages, paging_state = [], None
+    while True:
+        page, paging_state = asyncio.run(
+            storage.get_user_conversations_since(1, message_at - timedelta(seconds=1), 3, paging_state)
+        )
+        pages.append(page)
+        if paging_state is None:
+            break
+
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    returned = [row["conversation_id"] for page in pages for row in page]
+    assert sorted(returned) == sorted(row["conversation_id"] for row in rows)
+    stamps = [row["last_message_at"] for page in pages for row in page]
+    assert stamps == sorted(stamps)
+
+
+def test_inbox_state_round_trip():
+    conversation_id = uuid.uuid4()
+    message_at = datetime(2026, 10, 18, 12, 0, 0, 5000)
+    state = encode_inbox_state(message_at, conversation_id)
+    assert decode_inbox_state(decode_cursor(encode_cursor(state))) == (message_at, conversation_id)
+    with pytest.raises(ValueError):
+        decode_inbox_state(state[:-1])
@@ -0,0 +1,135 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.db.storage import get_storage
+
+
+def unread_count(client, user_id):
+    conversations = client.get(f"/api/conversations/user/{user_id}").json()["data"]
+    return conversations[0]["unread_count"]
+
+
+def mark_read(client, user_id, message, **overrides):
+    marker = {"user_id": user_id, "message_id": message["id"], "created_at": message["created_at"], **overrides}
+    return client.post(f"/api/conversations/{message['conversation_id']}/read", json=marker)
+
+
+def test_inbox_is_most_recent_first(client, messages):
+    # The batch is stamped a millisecond apart, ahead of the clock.
+    while datetime.utcnow() <= datetime.fromisoformat(messages[-1]["created_at"]):
+        time.sleep(0.001)
+    client.post("/api/messages/", json={"content": "hello 3", "sender_id": 1, "receiver_id": 3})
+    conversations = client.get("/api/conversations/user/1").json()
+    assert conversations["total"] == 2
+    assert [c["last_message_content"] for c in conversations["data"]] == ["hello 3", "message 9"]
+
+
+@pytest.mark.parametrize("params", [{"page": 0}, {"page": -1}, {"limit": 0}, {"limit": 101}])
+def test_page_and_limit_are_validated(client, messages, params):
+    assert client.get("/api/conversations/user/1", params=params).status_code == 422
+
+
+def test_unread_count_starts_at_received_messages(client, messages):
+    # User 2 receives the even-numbered messages.
+    assert unread_count(client, 2) == 5
+    assert unread_count(client, 1) == 5
+
+
+def test_read_marker_clears_unread_count(client, messages):
+    response = mark_read(client, 2, messages[4])
+    assert response.status_code == 200
+    marker = response.json()
+    assert marker["last_read_message_id"] == messages[4]["id"]
+    assert marker["unread_count"] == 2
+    assert unread_count(client, 2) == 2
+
+    assert mark_read(client, 2, messages[9]).json()["unread_count"] == 0
+    assert unread_count(client, 2) == 0
+
+
+def test_read_marker_never_moves_back(client, messages):
+    mark_read(client, 2, messages[6])
+    marker = mark_read(client, 2, messages[2]).json()
+    assert marker["last_read_message_id"] == messages[6]["id"]
+    assert marker["unread_count"] == 1
+
+
+def test_new_messages_count_as_unread_after_the_marker(client, messages):
+    mark_read(client, 2, messages[9])
+    client.post("/api/messages/", json={"content": "one more", "sender_id": 1, "receiver_id": 2})
+    assert unread_count(client, 2) == 1
+
+
+def test_read_marker_requires_a_stored_message(client, messages):
+    assert mark_read(client, 2, messages[4], message_id=str(uuid.uuid4())).status_code == 400
+
+    future = datetime.fromisoformat(messages[4]["created_at"]) + timedelta(days=365)
+    assert mark_read(client, 2, messages[4], created_at=future.isoformat()).status_code == 400
+    assert unread_count(client, 2) == 5
+
+
+def test_read_marker_requires_a_participant(client, messages):
+    assert mark_read(client, 3, messages[4]).status_code == 404
+
+
+def test_read_marker_of_unknown_conversation(client, messages):
+    message = {**messages[4], "conversation_id": str(uuid.uuid4())}
+    assert mark_read(client, 2, message).status_code == 404
+
+
+def test_read_marker_accepts_timezone_offsets(client, messages):
+    naive = datetime.fromisoformat(messages[4]["created_at"])
+    shifted = naive.replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=-3)))
+    response = mark_read(client, 2, messages[4], created_at=shifted.isoformat())
+    assert response.status_code == 200
+    assert response.json()["unread_count"] == 2
+
+
+def test_deep_inbox_pages_are_refused(client, messages):
+    assert client.get("/api/conversations/user/1", params={"page": 11, "limit": 100}).status_code == 400
+    assert client.get("/api/conversations/user/1", params={"page": 10, "limit": 100}).status_code == 200
+
+
+def sync(client, user_id, since, **params):
+    response = client.get(f"/api/conversations/user/{user_id}/sync", params={"since": since, **params})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_sync_returns_changed_conversations_with_their_new_messages(client, messages):
+    delta = sync(client, 2, messages[6]["created_at"])
+    assert not delta["has_more"] and delta["next_cursor"] is None
+    [conversation] = delta["data"]
+    assert [m["content"] for m in conversation["messages"]] == ["message 7", "message 8", "message 9"]
+    assert conversation["unread_count"] == 5
+    assert delta["next_since"] == messages[9]["created_at"]
+
+    assert sync(client, 2, delta["next_since"])["data"] == []
+
+
+def test_sync_pages_through_conversations_sharing_a_timestamp(client):
+    # Equal last_message_at across a page boundary must not be skipped.
+    storage = get_storage()
+    message_at = datetime(2026, 10, 18, 12, 0)
+    created = []
+    for other_user_id in range(2, 9):
+        conversation_id = uuid.uuid4()
+        asyncio.run(storage.create_conversation(conversation_id, [1, other_user_id], message_at))
+        created.append(str(conversation_id))
+
+    since = (message_at - timedelta(seconds=1)).isoformat()
+    pages = [sync(client, 1, since, limit=3)]
+    while pages[-1]["has_more"]:
+        pages.append(sync(client, 1, since, limit=3, cursor=pages[-1]["next_cursor"]))
+
+    assert [len(page["data"]) for page in pages] == [3, 3, 1]
+    assert sorted(c["id"] for page in pages for c in page["data"]) == sorted(created)
+
+
+def test_sync_rejects_an_invalid_cursor(client, messages):
+    response = client.get("/api/conversations/user/1/sync", params={"since": messages[0]["created_at"], "cursor": "!"})
+    assert response.status_code == 400
@@ -0,0 +1,176 @@
+import asyncio
+
+import pytest
+
+from app.db.storage import get_storage
+from app.metrics import (
+    message_ingestion_dropped_total,
+    message_ingestion_retries_total,
+    message_ingestion_uncounted_total,
+)
+from app.models.cassandra_models import ConversationModel, MessageModel
+from app.services.message_ingestion import MessageIngestionQueue, QueueFullError
+
+
+def counter_value(counter):
+    return sum(float(sample.rsplit(" ", 1)[1]) for sample in counter.samples())
+
+
+async def build(count):
+    conversation = await ConversationModel.create_or_get_conversation(1, 2)
+    return [
+        MessageModel.build_message(conversation["conversation_id"], 1, 2, f"message {i}")
+        for i in range(count)
+    ]
+
+
+async def stored_contents(conversation_id):
+    rows, _ = await get_storage().get_messages_page(conversation_id, 100)
+    return sorted(row["content"] for row in rows)
+
+
+def test_drain_writes_every_queued_message():
+    async def run():
+        queue = MessageIngestionQueue(enabled=True, max_batch_size=3)
+        queue.start()
+        messages = await build(10)
+        for message in messages:
+            queue.enqueue(message)
+        await queue.drain()
+        return await stored_contents(messages[0]["conversation_id"])
+
+    assert asyncio.run(run()) == sorted(f"message {i}" for i in range(10))
+
+
+def test_enqueue_is_refused_after_drain():
+    async def run():
+        queue = MessageIngestionQueue(enabled=True)
+        queue.start()
+        await queue.drain()
+        queue.enqueue((await build(1))[0])
+
+    with pytest.raises(QueueFullError):
+        asyncio.run(run())
+
+
+def test_enqueue_is_refused_when_full():
+    async def run():
+        queue = MessageIngestionQueue(enabled=True, max_size=2)
+        queue.start()
+        messages = await build(3)
+        queue.enqueue(messages[0])
+        queue.enqueue(messages[1])
+        try:
+            queue.enqueue(messages[2])
+        finally:
+            await queue.drain()
+
+    with pytest.raises(QueueFullError):
+        asyncio.run(run())
+
+
+def test_failed_flush_is_retried(monkeypatch):
+    store_messages = MessageModel.store_messages
+    failures = [RuntimeError("write timeout")]
+
+    async def flaky_store_messages(conversation_id, messages):
+        # The first attempt writes the messages but still reports failure.
+        await store_messages(conversation_id, messages)
+        if failures:
+            raise failures.pop()
+
+    monkeypatch.setattr(MessageModel, "store_messages", flaky_store_messages)
+    retries = counter_value(message_ingestion_retries_total)
+
+    async def run():
+        queue = MessageIngestionQueue(enabled=True, retry_delay=0.001)
+        queue.start()
+        messages = await build(4)
+        for message in messages:
+            queue.enqueue(message)
+        await queue.drain()
+        conversation_id = messages[0]["conversation_id"]
+        unread = await get_storage().get_unread_counts(2)
+        return await stored_contents(conversation_id), unread[conversation_id]
+
+    contents, unread = asyncio.run(run())
+    assert contents == sorted(f"message {i}" for i in range(4))
+    assert unread == 4
+    assert counter_value(message_ingestion_retries_total) == retries + 1
+
+
+def test_messages_are_published_only_once_written(monkeypatch):
+    store_messages = MessageModel.store_messages
+    events = []
+
+    async def recorded_store_messages(conversation_id, messages):
+        await store_messages(conversation_id, messages)
+        events.extend(f"stored {message['content']}" for message in messages)
+
+    monkeypatch.setattr(MessageModel, "store_messages", recorded_store_messages)
+
+    def published(message):
+        async def on_written():
+            events.append(f"published {message['content']}")
+        return on_written
+
+    async def run():
+        queue = MessageIngestionQueue(enabled=True)
+        queue.start()
+        for message in await build(2):
+            queue.enqueue(message, on_written=published(message))
+        assert events == []
+        await queue.drain()
+
+    asyncio.run(run())
+    assert events == ["stored message 0", "stored message 1", "published message 0", "published message 1"]
+
+
+def test_messages_are_dropped_and_counted_after_the_last_retry(monkeypatch):
+    async def failing_store_messages(conversation_id, messages):
+        raise RuntimeError("write timeout")
+
+    monkeypatch.setattr(MessageModel, "store_messages", failing_store_messages)
+    dropped = counter_value(message_ingestion_dropped_total)
+    published = []
+
+    async def on_written():
+        published.append(True)
+
+    async def run():
+        queue = MessageIngestionQueue(enabled=True, max_retries=2, retry_delay=0.001)
+        queue.start()
+        messages = await build(4)
+        for message in messages:
+            queue.enqueue(message, on_written=on_written)
+        await queue.drain()
+        return await stored_contents(messages[0]["conversation_id"])
+
+    assert asyncio.run(run()) == []
+    assert counter_value(message_ingestion_dropped_total) == dropped + 4
+    assert published == []
+
+
+def test_failed_counter_updates_are_not_retried(monkeypatch):
+    storage = get_storage()
+    attempts = []
+
+    async def failing_count_new_messages(conversation_id, messages):
+        attempts.append(len(messages))
+        raise RuntimeError("counter write timeout")
+
+    monkeypatch.setattr(storage, "count_new_messages", failing_count_new_messages)
+    uncounted = counter_value(message_ingestion_uncounted_total)
+
+    async def run():
+        queue = MessageIngestionQueue(enabled=True, retry_delay=0.001)
+        queue.start()
+        messages = await build(3)
+        for message in messages:
+            queue.enqueue(message)
+        await queue.drain()
+        return await stored_contents(messages[0]["conversation_id"])
+
+    assert asyncio.run(run()) == ["message 0", "message 1", "message 2"]
+    assert attempts == [3]
+    assert counter_value(message_ingestion_uncounted_total) == uncounted + 3
@@ -0,0 +1,183 @@
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+def history_url(message):
+    return f"/api/messages/conversation/{message['conversation_id']}"
+
+
+def contents(page):
+    return [message["content"] for message in page["data"]]
+
+
+def follow_cursor(client, url, **params):
+    """Read every page of url by following next_cursor; returns the pages."""
+    pages = [client.get(url, params=params).json()]
+    while pages[-1]["next_cursor"] is not None:
+        pages.append(client.get(url, params={**params, "cursor": pages[-1]["next_cursor"]}).json())
+    return pages
+
+
+def test_history_is_newest_first(client, messages):
+    page = client.get(history_url(messages[0]), params={"limit": 3}).json()
+    assert contents(page) == ["message 9", "message 8", "message 7"]
+    assert page["total"] == 10
+    assert page["next_cursor"] is not None
+
+
+def test_cursor_round_trip(client, messages):
+    pages = follow_cursor(client, history_url(messages[0]), limit=3)
+    assert [len(page["data"]) for page in pages] == [3, 3, 3, 1]
+    assert sum((contents(page) for page in pages), []) == [f"message {i}" for i in range(9, -1, -1)]
+
+
+def test_cursor_matches_page_numbers(client, messages):
+    url = history_url(messages[0])
+    pages = follow_cursor(client, url, limit=4)
+    for number, page in enumerate(pages, start=1):
+        assert contents(client.get(url, params={"limit": 4, "page": number}).json()) == contents(page)
+
+
+def test_invalid_cursor_is_rejected(client, messages):
+    response = client.get(history_url(messages[0]), params={"cursor": "not a cursor"})
+    assert response.status_code == 400
+
+
+def test_include_total_false(client, messages):
+    page = client.get(history_url(messages[0]), params={"include_total": False}).json()
+    assert page["total"] is None
+    assert len(page["data"]) == 10
+
+
+@pytest.mark.parametrize("suffix", ["", "/before"])
+@pytest.mark.parametrize("params", [{"page": 0}, {"page": -1}, {"limit": 0}, {"limit": 101}])
+def test_page_and_limit_are_validated(client, messages, suffix, params):
+    params = {**params, "before_timestamp": messages[-1]["created_at"]}
+    response = client.get(history_url(messages[0]) + suffix, params=params)
+    assert response.status_code == 422
+
+
+def test_largest_limit_is_accepted(client, messages):
+    response = client.get(history_url(messages[0]), params={"limit": 100})
+    assert response.status_code == 200
+
+
+def test_before_excludes_the_timestamp(client, messages):
+    url = history_url(messages[0]) + "/before"
+    page = client.get(url, params={"before_timestamp": messages[5]["created_at"]}).json()
+    assert contents(page) == [f"message {i}" for i in range(4, -1, -1)]
+    assert page["total"] == 5
+    assert page["next_cursor"] is None
+
+
+def test_before_the_oldest_message_is_empty(client, messages):
+    url = history_url(messages[0]) + "/before"
+    page = client.get(url, params={"before_timestamp": messages[0]["created_at"]}).json()
+    assert page["data"] == []
+    assert page["total"] == 0
+    assert page["next_cursor"] is None
+
+
+def test_before_the_future_returns_everything(client, messages):
+    url = history_url(messages[0]) + "/before"
+    future = datetime.fromisoformat(messages[-1]["created_at"]) + timedelta(days=1)
+    page = client.get(url, params={"before_timestamp": future.isoformat(), "limit": 100}).json()
+    assert len(page["data"]) == 10
+    assert page["total"] == 10
+
+
+def test_before_cursor_round_trip(client, messages):
+    url = history_url(messages[0]) + "/before"
+    pages = follow_cursor(client, url, before_timestamp=messages[7]["created_at"], limit=2)
+    assert [len(page["data"]) for page in pages] == [2, 2, 2, 1]
+    assert sum((contents(page) for page in pages), []) == [f"message {i}" for i in range(6, -1, -1)]
+
+
+def test_before_accepts_timezone_offsets(client, messages):
+    url = history_url(messages[0]) + "/before"
+    naive = datetime.fromisoformat(messages[5]["created_at"])
+    shifted = naive.replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=5)))
+    page = client.get(url, params={"before_timestamp": shifted.isoformat()}).json()
+    assert contents(page) == [f"message {i}" for i in range(4, -1, -1)]
+
+
+def test_after_excludes_the_timestamp(client, messages):
+    url = history_url(messages[0]) + "/after"
+    page = client.get(url, params={"after_timestamp": messages[4]["created_at"]}).json()
+    assert contents(page) == [f"message {i}" for i in range(5, 10)]
+    assert page["next_cursor"] is None
+
+
+def test_after_the_latest_message_is_empty(client, messages):
+    url = history_url(messages[0]) + "/after"
+    page = client.get(url, params={"after_timestamp": messages[-1]["created_at"]}).json()
+    assert page["data"] == []
+    assert page["next_cursor"] is None
+
+
+def test_after_cursor_round_trip(client, messages):
+    url = history_url(messages[0]) + "/after"
+    pages = follow_cursor(client, url, after_timestamp=messages[1]["created_at"], limit=3)
+    assert [len(page["data"]) for page in pages] == [3, 3, 2]
+    assert sum((contents(page) for page in pages), []) == [f"message {i}" for i in range(2, 10)]
+
+
+@pytest.mark.parametrize("page", [51, 10**12])
+def test_deep_offset_pages_are_refused(client, messages, page):
+    response = client.get(history_url(messages[0]), params={"page": page, "limit": 20})
+    assert response.status_code == 400
+    assert "next_cursor" in response.json()["detail"]
+
+
+def test_deep_offset_is_refused_before_a_timestamp(client, messages):
+    params = {"before_timestamp": messages[-1]["created_at"], "page": 11, "limit": 100}
+    assert client.get(f"{history_url(messages[0])}/before", params=params).status_code == 400
+
+
+def test_cursor_is_not_bound_by_the_page_offset(client, messages):
+    first = client.get(history_url(messages[0]), params={"limit": 5}).json()
+    params = {"limit": 5, "page": 10**12, "cursor": first["next_cursor"]}
+    response = client.get(history_url(messages[0]), params=params)
+    assert response.status_code == 200
+    assert contents(response.json()) == [f"message {i}" for i in range(4, -1, -1)]
+
+
+@pytest.mark.parametrize("fetch_size", [1, 3, 500])
+def test_export_streams_the_whole_history_newest_first(client, messages, fetch_size):
+    response = client.get(f"{history_url(messages[0])}/export", params={"fetch_size": fetch_size})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["content"] for line in lines] == [f"message {i}" for i in range(9, -1, -1)]
+    assert lines[0] == messages[-1]
+
+
+def test_export_of_unknown_conversation(client):
+    assert client.get(f"/api/messages/conversation/{uuid.uuid4()}/export").status_code == 404
+
+
+def test_latest_messages_per_conversation_in_request_order(client, messages):
+    other = client.post("/api/messages/", json={"content": "hello 3", "sender_id": 1, "receiver_id": 3}).json()
+    unknown = str(uuid.uuid4())
+    params = [("conversation_id", other["conversation_id"]), ("conversation_id", unknown),
+              ("conversation_id", messages[0]["conversation_id"]), ("limit", 2)]
+    latest = client.get("/api/messages/latest", params=params).json()
+
+    assert [entry["conversation_id"] for entry in latest["data"]] == [
+        other["conversation_id"], unknown, messages[0]["conversation_id"]
+    ]
+    assert [contents({"data": entry["messages"]}) for entry in latest["data"]] == [
+        ["hello 3"], [], ["message 9", "message 8"]
+    ]
+    assert latest["data"][0]["next_cursor"] is None
+
+    older = client.get(history_url(messages[0]), params={"limit": 2, "cursor": latest["data"][2]["next_cursor"]}).json()
+    assert contents(older) == ["message 7", "message 6"]
+
+
+@pytest.mark.parametrize("params", [[], [("conversation_id", str(uuid.uuid4()))] * 101])
+def test_latest_messages_requires_one_to_a_hundred_conversations(client, params):
+    assert client.get("/api/messages/latest", params=params).status_code == 422
@@ -0,0 +1,60 @@
+from app.metrics import Counter, Histogram, Registry, http_requests_total
+
+
+def sample_value(text, sample):
+    for line in text.splitlines():
+        if line.startswith(sample + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(("/a",), value)
+    assert list(histogram.samples()) == [
+        'latency_seconds_bucket{route="/a",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a",le="1.0"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 4.05',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    counter = Counter("queries_total", "Queries", ("query",))
+    counter.inc(('SELECT "x"\n',))
+    assert list(counter.samples()) == ['queries_total{query="SELECT \\"x\\"\\n"} 1']
+
+
+def test_registry_renders_collected_metrics():
+    registry = Registry()
+    registry.register(Counter("sent_total", "Sent")).inc()
+    registry.register_collector(lambda: [Counter("collected_total", "Collected")])
+    assert registry.render().splitlines() == [
+        "# HELP sent_total Sent",
+        "# TYPE sent_total counter",
+        "sent_total 1",
+        "# HELP collected_total Collected",
+        "# TYPE collected_total counter",
+    ]
+
+
+def test_requests_are_counted_by_route_template(client, messages):
+    sample = 'http_requests_total{method="GET",route="/api/messages/conversation/{conversation_id}",status="200"}'
+    before = sample_value("\n".join(http_requests_total.samples()), sample)
+    client.get(f"/api/messages/conversation/{messages[0]['conversation_id']}")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert sample_value(response.text, sample) == before + 1
+    assert messages[0]["conversation_id"] not in response.text
+    assert "http_request_duration_seconds_bucket" in response.text
+
+
+def test_cache_statistics_are_exposed(client, messages):
+    client.post("/api/messages/", json={"content": "again", "sender_id": 1, "receiver_id": 2})
+    text = client.get("/metrics").text
+    assert sample_value(text, 'cache_entries{cache="conversation"}') >= 1
+    assert sample_value(text, 'cache_hits_total{cache="conversation_pair"}') >= 1
@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+from app.services.pubsub import LocalBroker, PubSubHub, pubsub_hub
+
+
+def wait_for_subscriber(channel):
+    # The socket is accepted before it subscribes.
+    deadline = time.monotonic() + 5
+    while not pubsub_hub._subscriptions.get(channel):
+        assert time.monotonic() < deadline, f"nobody subscribed to {channel}"
+        time.sleep(0.001)
+
+
+def send(client, content, sender_id=1, receiver_id=2):
+    response = client.post("/api/messages/", json={"content": content, "sender_id": sender_id, "receiver_id": receiver_id})
+    assert response.status_code == 201
+    return response.json()
+
+
+def test_user_socket_receives_sent_and_received_messages(client):
+    with client.websocket_connect("/api/messages/ws/user/2") as websocket:
+        wait_for_subscriber("user:2")
+        received = send(client, "to 2")
+        sent = send(client, "from 2", sender_id=2, receiver_id=3)
+        assert websocket.receive_json() == received
+        assert websocket.receive_json() == sent
+
+
+def test_conversation_socket_receives_batch_messages_in_order(client, messages):
+    conversation_id = messages[0]["conversation_id"]
+    with client.websocket_connect(f"/api/messages/ws/conversation/{conversation_id}") as websocket:
+        wait_for_subscriber(f"conversation:{conversation_id}")
+        response = client.post("/api/messages/batch", json={
+            "messages": [{"content": f"more {i}", "sender_id": 1, "receiver_id": 2} for i in range(3)]
+        })
+        published = [result["message"] for result in response.json()["results"]]
+        assert [websocket.receive_json() for _ in published] == published
+
+
+def test_closed_socket_unsubscribes(client):
+    with client.websocket_connect("/api/messages/ws/user/5"):
+        wait_for_subscriber("user:5")
+    deadline = time.monotonic() + 5
+    while "user:5" in pubsub_hub._subscriptions:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_subscriber_that_falls_behind_is_closed():
+    async def run():
+        hub = PubSubHub(LocalBroker(), subscriber_queue_size=2)
+        await hub.start()
+        subscription = await hub.subscribe("user:1")
+        for i in range(3):
+            await hub.publish("user:1", {"n": i})
+        return subscription, [await subscription.get() for _ in range(2)]
+
+    subscription, received = asyncio.run(run())
+    assert subscription.overflowed
+    assert received == [{"n": 1}, None]
@@ -0,0 +1,60 @@
+import pytest
+
+from app.services import search
+
+
+@pytest.fixture
+def indexed(client, monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_INDEX_ENABLED", True)
+    sent = []
+    for content, sender_id, receiver_id in [
+        ("Dinner at the Italian place?", 1, 2),
+        ("Italian sounds great", 2, 1),
+        ("Great game last night", 1, 3),
+        ("See you at dinner", 3, 1),
+    ]:
+        response = client.post("/api/messages/", json={"content": content, "sender_id": sender_id, "receiver_id": receiver_id})
+        sent.append(response.json())
+    return sent
+
+
+def search_contents(client, user_id, q, **params):
+    response = client.get("/api/messages/search", params={"user_id": user_id, "q": q, **params})
+    assert response.status_code == 200
+    return [(message["content"], message["score"]) for message in response.json()["data"]]
+
+
+def test_tokenize_drops_stop_words_and_short_terms():
+    assert search.tokenize("See you at the Italian place, OK? x") == {"see", "italian", "place", "ok"}
+
+
+def test_results_rank_by_matching_terms_then_recency(client, indexed):
+    assert search_contents(client, 1, "italian dinner") == [
+        ("Dinner at the Italian place?", 2),
+        ("See you at dinner", 1),
+        ("Italian sounds great", 1),
+    ]
+
+
+def test_search_only_covers_the_users_messages(client, indexed):
+    assert search_contents(client, 2, "dinner") == [("Dinner at the Italian place?", 1)]
+    assert search_contents(client, 4, "dinner") == []
+
+
+def test_search_pages(client, indexed):
+    response = client.get("/api/messages/search", params={"user_id": 1, "q": "italian dinner", "limit": 2, "page": 2})
+    assert response.json()["total"] == 3
+    assert [message["content"] for message in response.json()["data"]] == ["Italian sounds great"]
+
+
+def test_messages_are_not_indexed_when_disabled(client):
+    client.post("/api/messages/", json={"content": "Dinner tonight", "sender_id": 1, "receiver_id": 2})
+    assert search_contents(client, 1, "dinner") == []
+
+
+def test_query_length_and_terms_are_limited(client, indexed):
+    terms = " ".join(f"term{i}" for i in range(search.MAX_QUERY_TERMS))
+    assert client.get("/api/messages/search", params={"user_id": 1, "q": terms}).status_code == 200
+    response = client.get("/api/messages/search", params={"user_id": 1, "q": terms + " more"})
+    assert response.status_code == 400
+    assert client.get("/api/messages/search", params={"user_id": 1, "q": "a" * 257}).status_code == 422